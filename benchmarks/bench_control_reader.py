@@ -0,0 +1,88 @@
+"""Count recv() calls needed to read control channel replies with the old
+byte-at-a-time reader and with the buffered Talker._read_line
+
+usage: python -m benchmarks.bench_control_reader
+"""
+import time
+from unittest import mock
+
+from ftp.response import Response
+from ftp.talker import RESP_REGEX, Talker
+
+REPLIES = {
+    'USER': b'331 Please specify the password.\r\n',
+    'FEAT': (b'211-Features:\r\n EPRT\r\n EPSV\r\n MDTM\r\n PASV\r\n'
+             b' REST STREAM\r\n SIZE\r\n TVFS\r\n UTF8\r\n211 End\r\n'),
+    'HELP': (b'214-The following commands are recognized.\r\n' +
+             b' ABOR ACCT ALLO APPE CDUP CWD  DELE EPRT EPSV FEAT HELP\r\n'
+             * 8 + b'214 Help OK.\r\n'),
+}
+ROUNDS = 1000
+
+
+class FakeSocket:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.position = 0
+        self.recv_calls = 0
+
+    def recv(self, size: int) -> bytes:
+        self.recv_calls += 1
+        chunk = self.data[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+def legacy_get_response(sock) -> Response:
+    """The reader which was used before the control buffer was introduced
+    """
+    lines = []
+    while True:
+        res = bytearray()
+        while True:
+            byte = sock.recv(1)
+            if byte in (b'\n', b''):
+                break
+            res += byte
+        line = res[:-1].decode(errors='ignore')
+        match = RESP_REGEX.fullmatch(line)
+        if match is None:
+            lines.append(line)
+        else:
+            lines.append(match.group('message'))
+            if match.group('delimeter') == ' ':
+                return Response(int(match.group('code')), '\n'.join(lines))
+
+
+def make_buffered_reader():
+    with mock.patch('ftp.talker.socket.socket'):
+        talker = Talker(None, None)
+
+    def buffered_get_response(sock) -> Response:
+        talker._command_socket = sock
+        return talker._get_response()
+    return buffered_get_response
+
+
+def measure(reader, data: bytes):
+    start = time.perf_counter()
+    calls = 0
+    for _ in range(ROUNDS):
+        sock = FakeSocket(data)
+        reader(sock)
+        calls += sock.recv_calls
+    return calls / ROUNDS, (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    print('{:<6}{:>12}{:>12}{:>14}{:>14}'.format(
+        'reply', 'old recv', 'new recv', 'old us', 'new us'))
+    for name, data in REPLIES.items():
+        old_calls, old_time = measure(legacy_get_response, data)
+        new_calls, new_time = measure(make_buffered_reader(), data)
+        print('{:<6}{:>12.0f}{:>12.0f}{:>14.1f}{:>14.1f}'.format(
+            name, old_calls, new_calls, old_time * 1e6, new_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
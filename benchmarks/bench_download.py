@@ -0,0 +1,84 @@
+"""Download throughput against the local FTP server: the old pipeline
+(recv of a new bytes object + reopening the local file for every chunk) and
+Client.download_file (recv_into a reused buffer + single file handle)
+
+usage: python -m benchmarks.bench_download [size in MB] [buffer size in KB]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from ftp.client import Client
+from ftp.ftp_api import FtpApi
+from ftp.mode import Mode
+from ftp.talker import Talker
+from tests.local_server import LocalFtpServer
+
+
+def legacy_download(api: FtpApi, remote_path: str, local_path: str,
+                    buffer_size: int):
+    api.switch_mode(Mode.Binary)
+    api.talker._open_data_connection()
+    api.talker.run_command('RETR', remote_path)
+    sock = api.talker._data_socket
+    while True:
+        chunk = sock.recv(buffer_size)
+        with open(local_path, 'ab') as file:
+            file.write(chunk)
+        if chunk == b'':
+            break
+    sock.close()
+    api.talker._get_response()
+
+
+def new_download(api: FtpApi, remote_path: str, local_path: str,
+                 buffer_size: int):
+    read_data = Talker._read_data
+
+    def read_with_buffer(talker, data_size=None, **kwargs):
+        kwargs['buffer_size'] = buffer_size
+        return read_data(talker, data_size, **kwargs)
+
+    with mock.patch.object(Client, 'ftp', api, create=True), \
+            mock.patch.object(Talker, '_read_data', read_with_buffer), \
+            contextlib.redirect_stdout(io.StringIO()):
+        Client.download_file(remote_path, local_path)
+
+
+def measure(method, port: int, local_path: str, buffer_size: int) -> float:
+    api = FtpApi(Talker('127.0.0.1', port, verbose_input=False))
+    api.talker.passive_mode = True
+    api.login('anonymous', 'pass')
+    if os.path.exists(local_path):
+        os.remove(local_path)
+    start = time.perf_counter()
+    method(api, 'file.bin', local_path, buffer_size)
+    result = time.perf_counter() - start
+    api.quit()
+    return result
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    buffer_size = (int(sys.argv[2]) if len(sys.argv) > 2 else 64) * 1024
+    with tempfile.TemporaryDirectory() as root, \
+            tempfile.TemporaryDirectory() as local:
+        with open(os.path.join(root, 'file.bin'), 'wb') as file:
+            file.write(os.urandom(1024 ** 2) * size)
+        local_path = os.path.join(local, 'file.bin')
+
+        with LocalFtpServer(root) as server:
+            for name, method in (('old', legacy_download),
+                                 ('new', new_download)):
+                result = measure(method, server.port, local_path,
+                                 buffer_size)
+                print('{}: {} MB in {:.2f} secs ({:.1f} MB/s)'.format(
+                    name, size, result, size / result))
+
+
+if __name__ == '__main__':
+    main()
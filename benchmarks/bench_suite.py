@@ -0,0 +1,224 @@
+"""Benchmark suite against the local FTP server on the loopback interface:
+download/upload throughput for several file sizes, control command latency,
+LIST transfer and parsing speed for big directories and recursive transfer
+of many small files. Every case is run in passive (PASV) and active (PORT)
+mode. Results are written as JSON, so runs can be compared
+
+usage: python -m benchmarks.bench_suite [--quick] [--runs N]
+                                        [--modes passive,active]
+                                        [--output results.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import posixpath
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from ftp.client import Client
+from ftp.ftp_api import FtpApi
+from ftp.pool import FtpSessionPool
+from ftp.talker import Talker
+from tests.local_server import FtpHandler, LocalFtpServer
+
+FILE_SIZES_MB = (1, 16, 128)
+LIST_SIZES = (10000, 100000, 1000000)
+LATENCY_COMMANDS = 1000
+SMALL_FILES = (1000, 4096)  # amount, size in bytes
+QUICK = {'file_sizes': (1, 4), 'list_sizes': (10000,),
+         'latency_commands': 200, 'small_files': (100, 4096)}
+LIST_LINE = '-rw-r--r--   1 ftp ftp {:>12} Jan 01 00:00 file{}.bin\r\n'
+
+
+class SyntheticListHandler(FtpHandler):
+    """LIST of "synthetic/<N>" sends N generated entries, so big directories
+    don't have to exist on the disk
+    """
+    def ftp_LIST(self, arg):
+        if posixpath.dirname(arg) != 'synthetic':
+            super().ftp_LIST(arg)
+            return
+        count = int(posixpath.basename(arg))
+        self.reply(150, 'Here comes the directory listing.')
+        with self.open_data_connection() as conn:
+            for start in range(0, count, 10000):
+                conn.sendall(''.join(
+                    LIST_LINE.format(i, i)
+                    for i in range(start, min(start + 10000, count))).encode())
+        self.reply(226, 'Directory send OK.')
+
+
+class Bench:
+    def __init__(self, server: LocalFtpServer, root: str, local: str,
+                 mode: str, runs: int):
+        self.server = server
+        self.root = root
+        self.local = local
+        self.mode = mode
+        self.runs = runs
+
+    def new_session(self) -> FtpApi:
+        api = FtpApi(Talker('127.0.0.1', self.server.port,
+                            verbose_input=False))
+        api.talker.passive_mode = self.mode == 'passive'
+        api.login('anonymous', 'pass')
+        return api
+
+    def timed(self, method, *args) -> float:
+        """Return the best time of "runs" calls of the method
+        """
+        results = []
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            method(*args)
+            results.append(time.perf_counter() - start)
+        return min(results)
+
+    def download(self, size_mb: int) -> dict:
+        name = 'file{}.bin'.format(size_mb)
+        with open(os.path.join(self.root, name), 'wb') as file:
+            file.write(os.urandom(1024 ** 2) * size_mb)
+        api = self.new_session()
+        seconds = self.timed(
+            Client.receive_file, api, name, os.path.join(self.local, name),
+            False, False, size_mb * 1024 ** 2)
+        api.quit()
+        return {'size_mb': size_mb, 'seconds': seconds,
+                'mb_per_sec': size_mb / seconds}
+
+    def upload(self, size_mb: int) -> dict:
+        name = 'upload{}.bin'.format(size_mb)
+        local_path = os.path.join(self.local, name)
+        with open(local_path, 'wb') as file:
+            file.write(os.urandom(1024 ** 2) * size_mb)
+        api = self.new_session()
+        seconds = self.timed(Client.send_file, api, local_path, name, False,
+                             False)
+        api.quit()
+        return {'size_mb': size_mb, 'seconds': seconds,
+                'mb_per_sec': size_mb / seconds}
+
+    def latency(self, commands: int) -> dict:
+        api = self.new_session()
+        results = []
+        for _ in range(commands):
+            start = time.perf_counter()
+            api.talker.run_command('NOOP')
+            results.append(time.perf_counter() - start)
+        api.quit()
+        results.sort()
+        return {'commands': commands,
+                'mean_us': statistics.mean(results) * 1e6,
+                'p50_us': results[len(results) // 2] * 1e6,
+                'p99_us': results[int(len(results) * 0.99)] * 1e6}
+
+    def listing(self, entries: int) -> dict:
+        api = self.new_session()
+        path = 'synthetic/{}'.format(entries)
+        raw = self.timed(api.list_files_raw, path)
+        parsed = self.timed(api.list_entries, path)
+        start = time.perf_counter()
+        files = api.iter_files(path)
+        next(files)
+        first_entry = time.perf_counter() - start
+        for _ in files:
+            pass
+        streamed = time.perf_counter() - start
+        api.quit()
+        return {'entries': entries, 'transfer_seconds': raw,
+                'parse_seconds': parsed,
+                'entries_per_sec': entries / parsed,
+                'streamed_seconds': streamed,
+                'first_entry_ms': first_entry * 1000}
+
+    def recursive(self, amount: int, size: int, jobs: int) -> dict:
+        directory = os.path.join(self.root, 'small')
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+            for i in range(amount):
+                with open(os.path.join(directory, str(i)), 'wb') as file:
+                    file.write(os.urandom(size))
+        api = self.new_session()
+        pool = FtpSessionPool(self.new_session)
+
+        def download():
+            with mock.patch.object(Client, 'ftp', api, create=True), \
+                    mock.patch.object(Client, 'pool', pool), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                Client.download_directory('small', self.local, jobs)
+
+        seconds = self.timed(download)
+        pool.close()
+        api.quit()
+        received = len(os.listdir(os.path.join(self.local, 'small')))
+        if received != amount:
+            # failures of parallel transfers are only printed
+            raise RuntimeError('{} of {} files received'.format(received,
+                                                                amount))
+        return {'files': amount, 'file_size': size, 'jobs': jobs,
+                'seconds': seconds, 'files_per_sec': amount / seconds}
+
+
+def run_case(results: list, name: str, mode: str, method, *args):
+    result = {'name': name, 'mode': mode}
+    try:
+        result.update(method(*args))
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    results.append(result)
+    print(json.dumps(result), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FTP client benchmarks')
+    parser.add_argument('--quick', action='store_true',
+                        help='small sizes for a fast check')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='best of N runs is reported')
+    parser.add_argument('--modes', default='passive,active')
+    parser.add_argument('--output', help='JSON file (stdout by default)')
+    arguments = parser.parse_args()
+
+    settings = {'file_sizes': FILE_SIZES_MB, 'list_sizes': LIST_SIZES,
+                'latency_commands': LATENCY_COMMANDS,
+                'small_files': SMALL_FILES}
+    if arguments.quick:
+        settings.update(QUICK)
+
+    results = []
+    for mode in arguments.modes.split(','):
+        with tempfile.TemporaryDirectory() as root, \
+                tempfile.TemporaryDirectory() as local, \
+                LocalFtpServer(root, handler=SyntheticListHandler) as server:
+            bench = Bench(server, root, local, mode, arguments.runs)
+            for size in settings['file_sizes']:
+                run_case(results, 'download', mode, bench.download, size)
+                run_case(results, 'upload', mode, bench.upload, size)
+            run_case(results, 'latency', mode, bench.latency,
+                     settings['latency_commands'])
+            for entries in settings['list_sizes']:
+                run_case(results, 'list', mode, bench.listing, entries)
+            for jobs in (1, 4):
+                run_case(results, 'recursive_download', mode,
+                         bench.recursive, *settings['small_files'], jobs)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+              'settings': settings, 'runs': arguments.runs,
+              'results': results}
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
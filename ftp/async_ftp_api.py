@@ -0,0 +1,123 @@
+import io
+from typing import AsyncGenerator, AsyncIterable, Iterable, Set, Tuple, Union
+
+from .async_talker import AsyncTalker
+from .errors import WrongResponse
+from .listing import FILE_REGEX
+from .mode import Mode
+
+
+class AsyncFtpApi:
+    """asyncio version of FtpApi. Use "await AsyncFtpApi.connect(...)" to
+    create it
+    """
+    def __init__(self, talker: AsyncTalker):
+        self.talker = talker
+        self.credentials = None
+        self._features = None
+
+    @classmethod
+    async def connect(cls, host, port, **kwargs) -> 'AsyncFtpApi':
+        api = cls(await AsyncTalker.connect(host, port, **kwargs))
+        await api.talker._get_response()
+        return api
+
+    async def login(self, user: str, password: str):
+        await self.talker.run_command('USER', user)
+        await self.talker.run_command('PASS', password)
+        self.credentials = (user, password)
+
+    async def quit(self):
+        await self.talker.run_command("QUIT")
+        await self.talker.close_connection()
+
+    async def features(self) -> Set[str]:
+        if self._features is None:
+            try:
+                message = (await self.talker.run_command('FEAT')).message
+            except WrongResponse:
+                message = ''
+            self._features = set(
+                line.strip().upper() for line in message.split('\n')
+                if line.startswith(' '))
+        return self._features
+
+    async def switch_mode(self, mode: Mode):
+        await self.talker.run_command('TYPE', mode.value[0])
+
+    async def get_file(self, path: str,
+                       offset=0) -> AsyncGenerator[bytes, None]:
+        """Download remote file by chunks. If "offset" is specified the
+        transfer is restarted from this position (REST)
+        """
+        await self.switch_mode(Mode.Binary)
+        await self.talker._start_transfer('RETR', path, offset=offset)
+        async for chunk in self.talker._read_data():
+            yield chunk
+        await self.talker._end_transfer()
+
+    async def upload_file(
+            self, path: str,
+            data: Union[str, bytes, io.IOBase, Iterable[bytes],
+                        AsyncIterable[bytes]]) -> int:
+        """Upload data to the remote path. Data can be local file's path,
+        bytes, binary file object, iterable or asynchronous iterable of
+        chunks. Returns amount of sent bytes
+        """
+        if isinstance(data, str):
+            with open(data, 'rb') as file:
+                return await self.upload_file(path, file)
+
+        await self.switch_mode(Mode.Binary)
+        await self.talker._start_transfer('STOR', path)
+        sent_size = await self.talker._send_data(data)
+        await self.talker._end_transfer()
+        return sent_size
+
+    async def get_current_location(self) -> str:
+        return (await self.talker.run_command('PWD')).message
+
+    async def remove_file(self, path: str):
+        await self.talker.run_command('DELE', path)
+
+    async def rename_file(self, old_name: str, new_name: str):
+        await self.talker.run_command('RNFR', old_name)
+        await self.talker.run_command('RNTO', new_name)
+
+    async def try_get_size(self, path: str) -> int:
+        await self.switch_mode(Mode.Binary)
+        result = (await self.talker.run_command('SIZE', path)).message
+        try:
+            return int(result)
+        except ValueError:
+            return -1
+
+    async def remove_directory(self, path: str):
+        await self.talker.run_command('RMD', path)
+
+    async def change_directory(self, path: str):
+        await self.talker.run_command('CWD', path)
+
+    async def make_directory(self, path: str):
+        await self.talker.run_command('MKD', path)
+
+    async def list_files_raw(self, path='') -> str:
+        await self.talker._start_transfer('LIST', path)
+        chunks = []
+        async for chunk in self.talker._read_data():
+            chunks.append(chunk)
+        await self.talker._get_response()
+        return b''.join(chunks).decode(encoding='utf-8', errors='ignore')
+
+    async def list_files(
+            self, path='') -> AsyncGenerator[Tuple[str, bool], None]:
+        """Yield tuples (<file_name>, <is_file>) as soon as the lines of
+        the listing are received
+        """
+        await self.talker._start_transfer('LIST', path)
+        async for line in self.talker._read_data_lines():
+            line = line.decode(encoding='utf-8', errors='ignore')
+            match = FILE_REGEX.match(line.rstrip('\r\n'))
+            if match is not None:
+                yield match.group('filename'), match.group('dir') == ''
+        await self.talker._get_response()
@@ -0,0 +1,246 @@
+import asyncio
+import io
+from typing import AsyncGenerator, AsyncIterable, Iterable, Union
+
+from .errors import WrongResponse
+from .response import Response
+from .talker import (DATA_SOCK_TIMEOUT, PASV_REGEX, RESP_REGEX, TIMEOUT,
+                     UPLOAD_BLOCK_SIZE)
+
+ASYNC_BUFFER_SIZE = 1024 ** 2  # 1MB
+
+
+class AsyncTalker:
+    """asyncio version of Talker. Use "await AsyncTalker.connect(...)" to
+    create it
+    """
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter, callback=print,
+                 verbose_input=True, verbose_output=False):
+        self.passive_mode = False  # type: bool
+
+        self.callback = callback
+        self.verbose_input = verbose_input
+        self.verbose_output = verbose_output
+
+        self._reader = reader
+        self._writer = writer
+        self._data_reader = None  # type: asyncio.StreamReader
+        self._data_writer = None  # type: asyncio.StreamWriter
+        self._data_server = None  # type: asyncio.AbstractServer
+        self._data_connected = None  # type: asyncio.Future
+
+    @classmethod
+    async def connect(cls, host, port, **kwargs) -> 'AsyncTalker':
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), TIMEOUT)
+        return cls(reader, writer, **kwargs)
+
+    async def close_connection(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def _read_line(self) -> str:
+        """Read one line from the command connection
+        """
+        line = await asyncio.wait_for(self._reader.readline(), TIMEOUT)
+        if not line:
+            raise ConnectionAbortedError('Connection was closed by the server')
+        return line.rstrip(b'\r\n').decode(errors='ignore')
+
+    async def _get_response(self) -> Response:
+        """Get response from the server.
+        """
+        lines = []
+        while True:
+            line = await self._read_line()
+            match = RESP_REGEX.fullmatch(line)
+            if match is None:
+                lines.append(line)
+            else:
+                lines.append(match.group('message'))
+                if match.group('delimeter') == ' ':
+                    return Response(int(match.group('code')), '\n'.join(lines))
+
+    async def _end_transfer(self) -> Response:
+        """Get the reply which ends the transfer. WrongResponse is raised if
+        the transfer failed
+        """
+        result = await self._get_response()
+        if not result.success:
+            raise WrongResponse(result)
+        return result
+
+    async def _send_message(self, message: str):
+        """Send message to the server.
+        """
+        self._writer.write((message + '\r\n').encode('utf-8'))
+        await self._writer.drain()
+
+    async def _open_data_connection(self):
+        """Open connection to retrieve and send data to the server.
+        Connection can be open in two modes: passive and active
+        (depending on "passive_mode" flag)
+        """
+        if self.passive_mode:
+            res = await self.run_command('PASV')
+            match = PASV_REGEX.search(res.message)
+            if not match:
+                raise WrongResponse(res)
+            ip = match.group(1).replace(',', '.')
+            port = 256 * int(match.group(2)) + int(match.group(3))
+            self._data_reader, self._data_writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, port), DATA_SOCK_TIMEOUT)
+        else:
+            loop = asyncio.get_running_loop()
+            self._data_connected = loop.create_future()
+
+            def on_connection(reader, writer):
+                if not self._data_connected.done():
+                    self._data_connected.set_result((reader, writer))
+                else:
+                    writer.close()
+
+            local_ip = self._writer.get_extra_info('sockname')[0]
+            self._data_server = await asyncio.start_server(
+                on_connection, local_ip, 0)
+            local_port = self._data_server.sockets[0].getsockname()[1]
+            await self.run_command(
+                'PORT',
+                '{},{},{}'.format(local_ip.replace('.', ','),
+                                  local_port // 256, local_port % 256))
+
+    async def _accept_data_connection(self):
+        """Wait for the server to connect to the data listener in active mode
+        """
+        if self.passive_mode:
+            return
+        try:
+            self._data_reader, self._data_writer = await asyncio.wait_for(
+                self._data_connected, DATA_SOCK_TIMEOUT)
+        finally:
+            self._data_server.close()
+            self._data_server = None
+
+    async def _start_transfer(self, command: str, *args,
+                              offset=0) -> Response:
+        """Open data connection and send the command which uses it. If
+        "offset" is specified REST is sent between them. If the commands fail
+        the data connection is closed
+        """
+        await self._open_data_connection()
+        try:
+            if offset:
+                await self.run_command('REST', str(offset))
+            return await self.run_command(command, *args)
+        except WrongResponse:
+            if self._data_server is not None:
+                self._data_server.close()
+                self._data_server = None
+            if self._data_writer is not None:
+                await self._close_data_connection()
+            raise
+
+    async def _close_data_connection(self):
+        self._data_writer.close()
+        try:
+            await self._data_writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._data_reader = self._data_writer = None
+
+    async def _read_data(
+            self, buffer_size=ASYNC_BUFFER_SIZE
+    ) -> AsyncGenerator[bytes, None]:
+        """Get data from data connection by chunks
+        """
+        await self._accept_data_connection()
+        try:
+            while True:
+                chunk = await asyncio.wait_for(
+                    self._data_reader.read(buffer_size), DATA_SOCK_TIMEOUT)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await self._close_data_connection()
+
+    async def _read_data_lines(self) -> AsyncGenerator[bytes, None]:
+        """Get data from data connection line by line
+        """
+        await self._accept_data_connection()
+        try:
+            while True:
+                line = await asyncio.wait_for(
+                    self._data_reader.readline(), DATA_SOCK_TIMEOUT)
+                if not line:
+                    break
+                yield line
+        finally:
+            await self._close_data_connection()
+
+    async def _send_data(
+            self, data: Union[bytes, io.IOBase, Iterable[bytes],
+                              AsyncIterable[bytes]]) -> int:
+        """Send data via data connection. Data can be bytes, binary file
+        object, iterable or asynchronous iterable of chunks. Returns amount of
+        sent bytes
+        """
+        await self._accept_data_connection()
+        writer = self._data_writer
+        sent_size = 0
+        try:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                writer.write(data)
+                sent_size = len(data)
+            elif isinstance(data, io.IOBase):
+                while True:
+                    block = data.read(UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+                    writer.write(block)
+                    sent_size += len(block)
+                    await writer.drain()
+            elif hasattr(data, '__aiter__'):
+                async for chunk in data:
+                    writer.write(chunk)
+                    sent_size += len(chunk)
+                    await writer.drain()
+            else:
+                for chunk in data:
+                    writer.write(chunk)
+                    sent_size += len(chunk)
+                    await writer.drain()
+            await writer.drain()
+        finally:
+            await self._close_data_connection()
+        return sent_size
+
+    async def run_command(self, command: str, *args, printin=None,
+                          printout=None) -> Response:
+        """Send command to the server and get response. If response is bad than
+        WrongResponse exception is raised. If there is no exception than print
+        the response to the console.
+        """
+        message = command
+        if len(args) != 0:
+            message += ' ' + ' '.join(args)
+
+        if printin is None:
+            printin = self.verbose_input
+        if printout is None:
+            printout = self.verbose_output
+
+        await self._send_message(message)
+        if printout:
+            if command == 'PASS':
+                self.callback('>> PASS XXXX')
+            else:
+                self.callback('>> {}'.format(message))
+
+        result = await self._get_response()
+        if not result.success:
+            raise WrongResponse(result)
+        if printin:
+            self.callback('<< {}'.format(result))
+        return result
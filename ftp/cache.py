@@ -0,0 +1,72 @@
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Tuple
+
+# kinds of entries which hold listings of directories
+LISTING_KINDS = ('LIST', 'MLSD')
+
+
+class MetadataCache:
+    """Thread-safe LRU cache of remote metadata (listings, sizes). Entries
+    are keyed by (kind, normalized remote path) and expire after "ttl"
+    seconds. At most "max_size" entries are kept
+    """
+    def __init__(self, ttl=30, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # user whose view of the server is cached, the cache is shared by
+        # sessions of this user
+        self.user = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, path: str) -> Tuple[bool, Any]:
+        """Return tuple (<found>, <value>)
+        """
+        key = (kind, path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, kind: str, path: str, value):
+        key = (kind, path)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path: str):
+        """Remove entries of the path, of everything inside it and the
+        listings (of every kind) of its parent directory
+        """
+        parent = posixpath.dirname(path) or '.'
+        prefix = path.rstrip('/') + '/'
+        with self._lock:
+            for key in list(self._entries):
+                kind, entry_path = key
+                if (entry_path == path or entry_path.startswith(prefix) or
+                        (kind in LISTING_KINDS and entry_path == parent)):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return '{} entries, {} hits, {} misses'.format(
+            len(self._entries), self.hits, self.misses)
@@ -0,0 +1,89 @@
+import hashlib
+import io
+import re
+import zlib
+from typing import Generator, Optional
+
+from .talker import UPLOAD_BLOCK_SIZE
+
+# algorithms of the HASH command in the order of preference
+HASH_ALGORITHMS = ('SHA-256', 'SHA-512', 'SHA-1', 'MD5', 'CRC32')
+# non-standard commands and their algorithms in the order of preference
+X_COMMANDS = (('XSHA256', 'SHA-256'), ('XSHA512', 'SHA-512'),
+              ('XSHA1', 'SHA-1'), ('XSHA', 'SHA-1'), ('XMD5', 'MD5'),
+              ('XCRC', 'CRC32'))
+HASHLIB_NAMES = {'SHA-256': 'sha256', 'SHA-512': 'sha512', 'SHA-1': 'sha1',
+                 'MD5': 'md5'}
+HEX_REGEX = re.compile(r'[0-9a-fA-F]+')
+
+
+class Crc32:
+    """CRC32 with the interface of hashlib objects
+    """
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: bytes):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return '{:08x}'.format(self.value)
+
+
+def new_hash(algorithm: str):
+    """Return hash object of the algorithm (name of the HASH command)
+    """
+    if algorithm == 'CRC32':
+        return Crc32()
+    return hashlib.new(HASHLIB_NAMES[algorithm])
+
+
+def parse_digest(algorithm: str, message: str) -> Optional[str]:
+    """Find hex digest in the reply to HASH or X-command. Servers format
+    these replies differently, so the first hex word of the digest's length
+    is taken. CRC32 may be sent without leading zeros
+    """
+    if algorithm == 'CRC32':
+        for word in message.split():
+            if HEX_REGEX.fullmatch(word) and len(word) <= 8:
+                return '{:08x}'.format(int(word, 16))
+        return None
+    length = new_hash(algorithm).digest_size * 2
+    for word in message.split():
+        if len(word) == length and HEX_REGEX.fullmatch(word):
+            return word.lower()
+    return None
+
+
+def update_from_file(digest, file: io.IOBase, size=None):
+    """Add "size" bytes (everything up to the end if None) of the file
+    from its current position to the hash object
+    """
+    while size is None or size > 0:
+        block = file.read(UPLOAD_BLOCK_SIZE if size is None
+                          else min(size, UPLOAD_BLOCK_SIZE))
+        if not block:
+            return
+        digest.update(block)
+        if size is not None:
+            size -= len(block)
+
+
+def file_digest(path: str, algorithm: str) -> str:
+    digest = new_hash(algorithm)
+    with open(path, 'rb') as file:
+        update_from_file(digest, file)
+    return digest.hexdigest()
+
+
+def hashing_reader(file: io.IOBase,
+                   digest) -> Generator[bytes, None, None]:
+    """Read the file by blocks adding them to the hash object, so the data
+    is hashed while it's being sent
+    """
+    while True:
+        block = file.read(UPLOAD_BLOCK_SIZE)
+        if not block:
+            return
+        digest.update(block)
+        yield block
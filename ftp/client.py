@@ -1,19 +1,33 @@
+import fnmatch
 import functools
 import getpass
+import glob
 import json
-import os.path
+import os
+import posixpath
 import readline
 import sys
 import time
-from os import mkdir
 from queue import Queue
 from shlex import split
 from socket import timeout
 
-from .errors import WrongResponse
+from .cache import MetadataCache
+from .checksum import (file_digest, hashing_reader, new_hash,
+                       update_from_file)
+from .errors import ChecksumMismatch, IncompleteTransfer, WrongResponse
 from .ftp_api import FtpApi
-from .parser import Parser
+from .parallel import TaskPool
+from .index import RemoteIndex
+from .keeper import SessionKeeper
+from .metrics import Metrics
+from .mirror import (complete_tree, local_tree, make_plan,
+                     remote_tree)
+from .pool import FtpSessionPool
+from .progress import default_reporter
+from .segmented import download_segmented, preallocate
 from .talker import Talker
+from .walk import Walker, aggregate_sizes, normalize_root
 
 
 def get_func(method):
@@ -28,10 +42,17 @@ with open('config.json') as f:
 
 
 TIMEOUT_CODE = 421
+EXISTS_CODES = (521, 550)
 
 
 class Client:
     # ftp = None
+    pool = None
+    index = None
+    metrics = Metrics()
+    # compare checksums of local and remote files after every transfer
+    verify = False
+    keeper = None
 
     @staticmethod
     def setup(arguments):
@@ -41,25 +62,68 @@ class Client:
                 verbose_output=arguments.verbose)
         except KeyboardInterrupt:
             raise SystemExit(0)
+        talker.listeners.append(Client.metrics)
+        if arguments.no_progress:
+            default_reporter.enabled = False
+        Client.verify = arguments.verify
 
-        Client.ftp = FtpApi(talker)
+        cache = None
+        if arguments.cache_ttl > 0:
+            cache = MetadataCache(arguments.cache_ttl, config['CACHE_SIZE'])
+        Client.ftp = FtpApi(talker, cache, arguments.compress or None)
         if arguments.login is not None:
             username, password = arguments.login.split(':')
             Client.ftp.login(username, password)
 
+        if Client.keeper is not None:
+            Client.keeper.close()
+        Client.keeper = SessionKeeper(Client.ftp, arguments.keepalive,
+                                      config['RECONNECT_ATTEMPTS'])
+
+        if Client.index is not None:
+            Client.index.close()
+            Client.index = None
+        if arguments.index:
+            Client.index = RemoteIndex(
+                arguments.index,
+                '{}:{}'.format(arguments.host, arguments.port))
+
+        if Client.pool is not None:
+            Client.pool.close()
+        Client.pool = FtpSessionPool(
+            Client.new_session, arguments.pool_min, arguments.pool_max,
+            config['POOL_IDLE_TIMEOUT'], prepare=Client.prepare_session)
+
         if hasattr(arguments, 'func'):
             if arguments.func == 'ls':
                 a = ['-l', arguments.path]
-            elif arguments.func == 'get' and arguments.r:
-                a = ['-r', arguments.path1, arguments.path2]
             else:
                 a = [arguments.path1, arguments.path2]
+            if arguments.func in ('get', 'put') and arguments.resume:
+                a.insert(0, '--resume')
+            if arguments.func == 'get' and arguments.skip_identical:
+                a.insert(0, '--skip-identical')
+            if arguments.func == 'mirror':
+                for flag, name in ((arguments.R, '-R'),
+                                   (arguments.delete, '--delete'),
+                                   (arguments.dry_run, '--dry-run')):
+                    if flag:
+                        a.insert(0, name)
+            if arguments.func in ('get', 'put', 'mirror'):
+                if arguments.func != 'mirror' and arguments.r:
+                    a.insert(0, '-r')
+                if arguments.jobs > 1:
+                    a = ['--jobs', str(arguments.jobs)] + a
+            if arguments.func == 'get' and arguments.segments > 1:
+                a = ['--segments', str(arguments.segments)] + a
 
             Client.run_command(arguments.func, a)
+            Client.pool.close()
             raise SystemExit(0)
 
     @staticmethod
     def run():
+        Client.keeper.start()
         while True:
             try:
                 tokens = split(input('ftp: '))
@@ -72,57 +136,204 @@ class Client:
 
     @staticmethod
     def run_command(command, args):
-        """Sending command to the server with handling exceptions
+        """Sending command to the server with handling exceptions. If the
+        connection was lost, the session is restored and the command is
+        repeated once
         """
         if command not in Client.handlers:
             command = None
-        try:
-            Client.handlers[command](args)
-        except WrongResponse as e:
-            print('<<', e.response)
-            if e.response.code == TIMEOUT_CODE:
+        retry = True
+        while True:
+            try:
+                Client.run_handler(command, args)
+                return
+            except WrongResponse as e:
+                print('<<', e.response)
+                if e.response.code != TIMEOUT_CODE:
+                    return
                 print('Trying to reconnect')
-                Client.reconnect()
-        except ValueError:
-            Client.eprint('Wrong arguments. Use "help <command>"')
-        except KeyboardInterrupt:
-            print()
-            pass
-        except timeout:
-            print('Timeout. Trying to reconnect')
-            Client.reconnect()
-        except ConnectionError:
-            print(sys.exc_info()[1])
-            print('Trying to reconnect')
-            Client.reconnect()
-        except SystemExit:
-            raise
-        except:
-            print(sys.exc_info()[1])
+            except ValueError:
+                Client.eprint('Wrong arguments. Use "help <command>"')
+                return
+            except KeyboardInterrupt:
+                print()
+                return
+            except timeout:
+                print('Timeout. Trying to reconnect')
+            except ConnectionError:
+                print(sys.exc_info()[1])
+                print('Trying to reconnect')
+            except SystemExit:
+                raise
+            except:
+                print(sys.exc_info()[1])
+                return
+            if not Client.reconnect() or not retry:
+                return
+            retry = False
 
     @staticmethod
-    def download_file(remote_path, local_path):
-        data_length = 0
+    def run_handler(command, args):
+        """Run handler of the command. The main session is used exclusively,
+        so keepalive isn't sent in the middle of the command
+        """
+        if Client.keeper is None:
+            Client.handlers[command](args)
+            return
+        with Client.keeper.busy() as api:
+            Client.ftp = api
+            Client.handlers[command](args)
+
+    @staticmethod
+    def download_file(remote_path, local_path, segments=1, resume=False,
+                      file_size=None, skip_identical=False):
         start = time.time()
-        for data in Client.ftp.get_file(remote_path):
-            data_length += len(data)
-            try:
-                with open(local_path, 'ab') as file:
-                    file.write(data)
-            except:
-                Client.eprint(sys.exc_info()[1])
-                return
+        if segments > 1:
+            data_length = download_segmented(
+                Client.ftp, Client.get_pool(segments), remote_path,
+                local_path, segments)
+            Client.print_speed(data_length, start, 'received')
+            algorithm = Client.ftp.hash_algorithm() if Client.verify else None
+            if algorithm is not None:
+                # segments are written out of order, so the file is hashed
+                # after the transfer
+                digest = new_hash(algorithm)
+                with open(local_path, 'rb') as file:
+                    update_from_file(digest, file)
+                try:
+                    Client.check_digest(Client.ftp, remote_path, digest)
+                except ChecksumMismatch:
+                    Client.eprint(sys.exc_info()[1])
+            return
+
+        try:
+            data_length = Client.receive_file(
+                Client.ftp, remote_path, local_path, resume=resume,
+                file_size=file_size, skip_identical=skip_identical)
+        except (OSError, ChecksumMismatch):
+            Client.eprint(sys.exc_info()[1])
+            return
+        Client.print_speed(data_length, start, 'received')
+
+    @staticmethod
+    def receive_file(api, remote_path, local_path, show_progress=True,
+                     resume=False, file_size=None, skip_identical=False):
+        """Download remote file through "api" session. Returns amount of
+        received bytes. If "resume" is set and the local file is shorter than
+        the remote one, only the missing part is downloaded. SIZE isn't
+        requested if "file_size" is known (e.g. from MLSD). If
+        "skip_identical" is set and the local file has the same checksum as
+        the remote one, it isn't downloaded
+        """
+        if file_size is None:
+            file_size = api.try_get_size(remote_path)
+        if (skip_identical and os.path.isfile(local_path) and
+                os.path.getsize(local_path) == file_size):
+            remote_hash = Client.get_remote_hash(api, remote_path)
+            if (remote_hash is not None and
+                    file_digest(local_path, remote_hash[0]) == remote_hash[1]):
+                return 0
+        offset = 0
+        if (resume and file_size > 0 and os.path.isfile(local_path) and
+                'REST STREAM' in api.features()):
+            offset = os.path.getsize(local_path)
+            if offset == file_size:
+                return 0
+            if offset > file_size:
+                offset = 0
+
+        algorithm = api.hash_algorithm() if Client.verify else None
+        digest = new_hash(algorithm) if algorithm is not None else None
+        data_length = 0
+        file = None
+        try:
+            # the local file isn't touched until the data arrives, so a
+            # failed RETR doesn't destroy the existing copy
+            for data in api._retrieve(remote_path, file_size,
+                                      show_progress, offset):
+                if file is None:
+                    file = Client.open_local_file(local_path, offset,
+                                                  file_size, digest)
+                data_length += file.write(data)
+                # the data is hashed while it's being written
+                if digest is not None:
+                    digest.update(data)
+            if file is None:
+                file = Client.open_local_file(local_path, offset, 0, digest)
+        finally:
+            if file is not None:
+                # the preallocated tail of an interrupted transfer would be
+                # taken for received data by resume
+                file.truncate(offset + data_length)
+                file.close()
+
+        if resume and file_size >= 0 and offset + data_length != file_size:
+            raise IncompleteTransfer(
+                '{}: {} of {} bytes received'.format(
+                    remote_path, offset + data_length, file_size))
+        if digest is not None:
+            Client.check_digest(api, remote_path, digest)
+        return data_length
 
+    @staticmethod
+    def open_local_file(local_path, offset, file_size, digest=None):
+        """Open local file for writing from the offset. The beginning of the
+        file is added to the digest
+        """
+        file = open(local_path, 'r+b' if offset else 'wb')
+        if digest is not None and offset:
+            update_from_file(digest, file, offset)
+        Client.preallocate(file, file_size)
+        file.seek(offset)
+        return file
+
+    @staticmethod
+    def get_remote_hash(api, remote_path):
+        """Return (<algorithm>, <digest>) of remote file or None if the
+        server can't compute it
+        """
+        try:
+            return api.remote_hash(remote_path)
+        except WrongResponse:
+            return None
+
+    @staticmethod
+    def check_digest(api, remote_path, digest):
+        """Compare checksum of transferred data with the one computed by the
+        server. Raises ChecksumMismatch if they differ
+        """
+        remote_hash = Client.get_remote_hash(api, remote_path)
+        if remote_hash is not None and remote_hash[1] != digest.hexdigest():
+            raise ChecksumMismatch(
+                '{}: {} checksum mismatch ({} != {})'.format(
+                    remote_path, remote_hash[0], digest.hexdigest(),
+                    remote_hash[1]))
+
+    @staticmethod
+    def print_speed(data_length, start, action):
+        """Print amount of transferred data and average speed since "start"
+        """
         result_time = time.time() - start
         speed = round(data_length / (1024 ** 2) / result_time, 4)
-        info_string = '{} bytes received in {} secs ({} MB/s)'.format(
-            data_length, round(result_time, 2), speed)
+        info_string = '{} bytes {} in {} secs ({} MB/s)'.format(
+            data_length, action, round(result_time, 2), speed)
         print(info_string)
 
     @staticmethod
-    def download_directory(remote_path, local_path):
+    def preallocate(file, size):
+        """Reserve disk space for the file if the platform supports it
+        """
+        preallocate(file.fileno(), size)
+
+    @staticmethod
+    def download_directory(remote_path, local_path, jobs=1,
+                           skip_identical=False):
         if remote_path == '.':
             remote_path = ''
+        if jobs > 1:
+            Client.download_directory_parallel(remote_path, local_path, jobs,
+                                               skip_identical)
+            return
 
         dirs = Queue()
         dirs.put(remote_path)
@@ -131,18 +342,57 @@ class Client:
             remote_dir_path = dirs.get()
             local_dir_path = os.path.join(local_path, remote_dir_path)
 
-            mkdir(local_dir_path)
+            os.makedirs(local_dir_path, exist_ok=True)
 
-            files = Client.ftp.list_files(remote_dir_path)
+            entries = Client.ftp.list_entries(remote_dir_path)
 
-            for file, is_file in files:
-                remote_file_path = os.path.join(remote_dir_path, file)
+            for entry in entries:
+                remote_file_path = os.path.join(remote_dir_path, entry.name)
                 local_file_path = os.path.join(local_path, remote_dir_path,
-                                               file)
-                if not is_file:
+                                               entry.name)
+                if entry.is_dir:
                     dirs.put(remote_file_path)
                 else:
-                    Client.download_file(remote_file_path, local_file_path)
+                    Client.download_file(remote_file_path, local_file_path,
+                                         file_size=entry.size,
+                                         skip_identical=skip_identical)
+
+    @staticmethod
+    def download_directory_parallel(remote_path, local_path, jobs,
+                                    skip_identical=False):
+        """Download directory by "jobs" sessions. Directories are listed and
+        files are downloaded concurrently
+        """
+        def list_directory(api, remote_dir_path):
+            os.makedirs(os.path.join(local_path, remote_dir_path),
+                        exist_ok=True)
+            for entry in api.list_entries(remote_dir_path):
+                remote_file_path = posixpath.join(remote_dir_path, entry.name)
+                if entry.is_dir:
+                    pool.submit(remote_file_path, list_directory,
+                                remote_file_path)
+                else:
+                    pool.submit(remote_file_path, download, remote_file_path,
+                                entry.size)
+
+        def download(api, remote_file_path, file_size):
+            return Client.receive_file(
+                api, remote_file_path,
+                os.path.join(local_path, remote_file_path),
+                file_size=file_size, skip_identical=skip_identical)
+
+        with TaskPool(Client.get_pool(jobs), jobs) as pool:
+            pool.submit(remote_path, list_directory, remote_path)
+            pool.join()
+        Client.print_stats(pool.stats)
+
+    @staticmethod
+    def print_stats(stats):
+        """Print results of parallel transfers
+        """
+        for name, error in stats.failures:
+            Client.eprint('{}: {}'.format(name, error))
+        print(stats)
 
     @staticmethod
     def eprint(*args, **kwargs):
@@ -151,19 +401,338 @@ class Client:
         print(*args, file=sys.stderr, **kwargs)
 
     @staticmethod
-    def reconnect():
-        args = Parser.parse_arguments()
-        Client.setup(args)
+    def pop_option(args, name):
+        """Remove option "name" and its value from args and return the value.
+        Returns None if there is no such option
+        """
+        if name not in args:
+            return None
+        index = args.index(name)
+        if index + 1 >= len(args):
+            raise ValueError
+        value = args[index + 1]
+        del args[index:index + 2]
+        return value
+
+    @staticmethod
+    def new_session() -> FtpApi:
+        """Open one more session to the same server with the same credentials
+        and transfer mode as the current one
+        """
+        talker = Talker(Client.ftp.talker.host, Client.ftp.talker.port,
+                        callback=print, verbose_input=False)
+        talker.passive_mode = Client.ftp.talker.passive_mode
+        talker.listeners.extend(Client.ftp.talker.listeners)
+        api = FtpApi(talker, Client.ftp.cache, Client.ftp.compress_level)
+        if Client.ftp.credentials is not None:
+            api.login(*Client.ftp.credentials)
+        return api
+
+    @staticmethod
+    def prepare_session(api: FtpApi):
+        """Bring checked out session in line with the main session: the same
+        user (it may have logged in again since the session was opened),
+        passive mode and working directory, so relative paths mean the same
+        for both
+        """
+        api.talker.passive_mode = Client.ftp.talker.passive_mode
+        if (Client.ftp.credentials is not None and
+                api.credentials != Client.ftp.credentials):
+            api.login(*Client.ftp.credentials)
+        api.set_directory(Client.ftp.state.cwd)
+
+    @staticmethod
+    def get_pool(size) -> FtpSessionPool:
+        """Return the session pool which can hold at least "size" sessions
+        """
+        if size > Client.pool.max_size:
+            Client.pool.resize(size)
+        return Client.pool
+
+    @staticmethod
+    def reconnect() -> bool:
+        """Open new connection with the state of the lost one (credentials,
+        working directory, transfer type and mode). Returns False if it failed
+        """
+        if Client.keeper is None:
+            return False
+        try:
+            Client.ftp = Client.keeper.restore()
+        except (WrongResponse, OSError):
+            Client.eprint('Reconnect failed: {}'.format(sys.exc_info()[1]))
+            return False
+        print('Reconnected')
+        return True
 
     @staticmethod
-    def upload_file(local_path, remote_path):
+    def upload_file(local_path, remote_path, resume=False):
+        start = time.time()
         try:
-            with open(local_path, 'rb') as file:
-                data = file.read()
-        except:
+            data_length = Client.send_file(Client.ftp, local_path,
+                                           remote_path, resume=resume)
+        except (OSError, ChecksumMismatch):
             Client.eprint(sys.exc_info()[1])
+            return
+        Client.print_speed(data_length, start, 'sent')
+
+    @staticmethod
+    def send_file(api, local_path, remote_path, resume=False,
+                  show_progress=True):
+        """Upload local file through "api" session. Returns amount of sent
+        bytes. If "resume" is set and the remote file is shorter than the
+        local one, only the missing part is uploaded
+        """
+        with open(local_path, 'rb') as file:
+            file_size = os.fstat(file.fileno()).st_size
+            offset = 0
+            if resume:
+                offset = Client.get_remote_size(api, remote_path)
+                if offset == file_size:
+                    return 0
+                if offset > file_size or offset < 0:
+                    offset = 0
+            algorithm = api.hash_algorithm() if Client.verify else None
+            digest = new_hash(algorithm) if algorithm is not None else None
+            data = file
+            if digest is not None:
+                # the file is read once: the data is hashed while it's sent
+                update_from_file(digest, file, offset)
+                data = hashing_reader(file, digest)
+            file.seek(offset)
+            data_length = api.upload_file(remote_path, data,
+                                          file_size - offset, offset,
+                                          show_progress)
+
+        if resume:
+            remote_size = Client.get_remote_size(api, remote_path)
+            if remote_size != file_size:
+                raise IncompleteTransfer(
+                    '{}: {} of {} bytes sent'.format(
+                        remote_path, remote_size, file_size))
+        if digest is not None:
+            Client.check_digest(api, remote_path, digest)
+        return data_length
+
+    @staticmethod
+    def upload_directory(local_path, remote_path, jobs=1):
+        """Upload local directory into the remote one. Remote directories are
+        created first (in one ordered pass), then files are sent by "jobs"
+        parallel sessions
+        """
+        local_path = local_path.rstrip(os.sep) or os.sep
+        root = posixpath.join(remote_path, os.path.basename(local_path))
+        directories = [root]
+        files = []
+        stack = [(local_path, root)]
+        while stack:
+            local_dir_path, remote_dir_path = stack.pop()
+            with os.scandir(local_dir_path) as entries:
+                for entry in entries:
+                    remote_entry_path = posixpath.join(remote_dir_path,
+                                                       entry.name)
+                    if entry.is_dir():
+                        directories.append(remote_entry_path)
+                        stack.append((entry.path, remote_entry_path))
+                    elif entry.is_file():
+                        files.append((entry.path, remote_entry_path))
+
+        for directory in directories:
+            Client.make_remote_directory(Client.ftp, directory)
+
+        def upload(api, local_file_path, remote_file_path):
+            return Client.send_file(api, local_file_path, remote_file_path)
+
+        with TaskPool(Client.get_pool(jobs), jobs) as pool:
+            for local_file_path, remote_file_path in files:
+                pool.submit(local_file_path, upload, local_file_path,
+                            remote_file_path)
+            pool.join()
+        Client.print_stats(pool.stats)
+
+    @staticmethod
+    def download_many(pattern, local_path, jobs=1):
+        """Download remote files whose names match the pattern (wildcards
+        are allowed in the file name only) into the local directory. Names
+        are matched against one listing of the directory, then files are
+        downloaded by "jobs" parallel sessions. Returns amount of files
+        """
+        remote_dir, name_pattern = posixpath.split(pattern)
+        entries = [entry for entry in Client.ftp.list_entries(remote_dir)
+                   if not entry.is_dir and
+                   fnmatch.fnmatchcase(entry.name, name_pattern)]
+        if not entries:
+            return 0
+        os.makedirs(local_path, exist_ok=True)
+
+        def download(api, entry):
+            # sizes are known from the listing, SIZE isn't requested
+            return Client.receive_file(
+                api, posixpath.join(remote_dir, entry.name),
+                os.path.join(local_path, entry.name), file_size=entry.size)
+
+        with TaskPool(Client.get_pool(jobs), jobs) as pool:
+            for entry in entries:
+                pool.submit(posixpath.join(remote_dir, entry.name), download,
+                            entry)
+            pool.join()
+        Client.print_stats(pool.stats)
+        return len(entries)
+
+    @staticmethod
+    def upload_many(pattern, remote_path, jobs=1):
+        """Upload local files which match the pattern (glob) into the remote
+        directory by "jobs" parallel sessions. Returns amount of files
+        """
+        files = [path for path in glob.glob(os.path.expanduser(pattern))
+                 if os.path.isfile(path)]
+        if not files:
+            return 0
+
+        def upload(api, local_file_path):
+            return Client.send_file(
+                api, local_file_path,
+                posixpath.join(remote_path, os.path.basename(local_file_path)))
+
+        with TaskPool(Client.get_pool(jobs), jobs) as pool:
+            for local_file_path in sorted(files):
+                pool.submit(local_file_path, upload, local_file_path)
+            pool.join()
+        Client.print_stats(pool.stats)
+        return len(files)
+
+    @staticmethod
+    def mirror(remote_path, local_path, upload=False, delete=False,
+               dry_run=False, jobs=1):
+        """Make local directory the same as the remote one (or vice versa if
+        "upload" is set). Only new and changed files (by size and
+        modification time) are transferred. If the index is on, the remote
+        tree is taken from it after incremental refresh, so only changed
+        directories are listed (files changed in place are found after
+        "index refresh --full")
+        """
+        try:
+            if Client.index is not None:
+                Client.index.refresh(Client.ftp, remote_path)
+                remote = complete_tree(
+                    Client.ftp, remote_path,
+                    Client.index.tree(Client.ftp._normalize(remote_path)))
+            else:
+                remote = remote_tree(Client.ftp, remote_path)
+        except WrongResponse as e:
+            # the target directory is created by the first upload
+            if not upload or e.response.code not in EXISTS_CODES:
+                raise
+            remote = {}
+        local = local_tree(local_path)
+        if upload:
+            plan = make_plan(local, remote, 'put', delete)
+        else:
+            plan = make_plan(remote, local, 'get', delete)
+
+        if dry_run:
+            for action in plan:
+                print(action)
+            print('{} actions'.format(len(plan)))
+            return
+
+        def get(api, path):
+            local_file_path = os.path.join(local_path, path)
+            size = Client.receive_file(
+                api, posixpath.join(remote_path, path), local_file_path,
+                file_size=remote[path].size)
+            if remote[path].modify is not None:
+                os.utime(local_file_path, (remote[path].modify,) * 2)
+            return size
+
+        def put(api, path):
+            return Client.send_file(
+                api, os.path.join(local_path, path),
+                posixpath.join(remote_path, path))
+
+        if upload and not remote:
+            Client.make_remote_directory(Client.ftp, remote_path)
+        elif not upload:
+            os.makedirs(local_path, exist_ok=True)
+        for action in plan:
+            if action.kind != 'mkdir':
+                continue
+            if upload:
+                Client.make_remote_directory(
+                    Client.ftp, posixpath.join(remote_path, action.path))
+            else:
+                os.makedirs(os.path.join(local_path, action.path),
+                            exist_ok=True)
+
+        with TaskPool(Client.get_pool(jobs), jobs) as pool:
+            for action in plan:
+                if action.kind in ('get', 'put'):
+                    pool.submit(action.path, put if upload else get,
+                                action.path)
+            pool.join()
+
+        # all files are removed before directories, directories go deepest
+        # first, so they are empty when removed
+        files = [a.path for a in plan if a.kind == 'delete']
+        directories = [a.path for a in plan if a.kind == 'rmdir']
+        if upload:
+            errors = Client.ftp.delete_many(
+                [posixpath.join(remote_path, path) for path in files])
+            for path, error in errors.items():
+                if error is not None:
+                    pool.stats.fail(path, error)
         else:
-            Client.ftp.upload_file(remote_path, data)
+            for path in files:
+                try:
+                    os.remove(os.path.join(local_path, path))
+                except OSError as e:
+                    pool.stats.fail(path, e)
+        for path in directories:
+            try:
+                if upload:
+                    Client.ftp.remove_directory(
+                        posixpath.join(remote_path, path))
+                else:
+                    os.rmdir(os.path.join(local_path, path))
+            except (OSError, WrongResponse) as e:
+                pool.stats.fail(path, e)
+        Client.print_stats(pool.stats)
+
+    @staticmethod
+    def list_index(args, long_format=False):
+        """Print content of remote directory saved in the index
+        """
+        if Client.index is None:
+            print('Index is off. Use "--index"')
+            return
+        if len(args) > 1:
+            raise ValueError
+        path = Client.ftp._normalize(args[0] if args else '')
+        for entry in Client.index.children(path):
+            if long_format:
+                print('{:<5}{:>12} {}'.format(
+                    'd' if entry.is_dir else '-',
+                    '' if entry.size is None else entry.size, entry.name))
+            else:
+                print(entry.name + ('/' if entry.is_dir else ''))
+
+    @staticmethod
+    def make_remote_directory(api, remote_path):
+        """Create remote directory. It's not an error if it already exists
+        """
+        try:
+            api.make_directory(remote_path)
+        except WrongResponse as e:
+            if e.response.code not in EXISTS_CODES:
+                raise
+
+    @staticmethod
+    def get_remote_size(api, remote_path):
+        """Return size of remote file or 0 if it doesn't exist
+        """
+        try:
+            return api.try_get_size(remote_path)
+        except WrongResponse:
+            return 0
 
     # handlers
 
@@ -189,24 +758,43 @@ class Client:
     @get_func
     @staticmethod
     def download_handler(args):
-        """usage: get [-r] <remote_path> [<local_path>]
+        """usage: get [-r] [--jobs N] [--segments N] [--resume]
+                  [--skip-identical] <remote_path> [<local_path>]
 
         Receive file from the server. If a file already exists then it will be
         overwritten. Also you can specify the directory's path where the file
         will be downloaded. Be sure to specify directory path.
         -r: receive whole directory from the server
+        --jobs: download directory by N parallel sessions
+        --segments: download file by N parallel byte ranges
+        --resume: continue partially downloaded file
+        --skip-identical: don't download files which have the same checksum
+        as the local ones (the server has to support HASH, XSHA1, XMD5, ...)
         """
-        if '-r' in args:
-            method = Client.download_directory
-            args = list(filter(lambda a: a != '-r', args))
+        segments = Client.pop_option(args, '--segments')
+        jobs = Client.pop_option(args, '--jobs')
+        flags = ('-r', '--resume', '--skip-identical')
+        recursive = '-r' in args
+        resume = '--resume' in args
+        skip_identical = '--skip-identical' in args
+        args = list(filter(lambda a: a not in flags, args))
+        if recursive:
+            method = functools.partial(Client.download_directory,
+                                       skip_identical=skip_identical)
+            if jobs is not None:
+                method = functools.partial(method, jobs=int(jobs))
+        elif segments is not None:
+            method = functools.partial(Client.download_file,
+                                       segments=int(segments))
         else:
-            method = Client.download_file
+            method = functools.partial(Client.download_file, resume=resume,
+                                       skip_identical=skip_identical)
 
         if len(args) == 0:
             raise ValueError
         if len(args) == 1:
             new_arg = config['DOWNLOAD_DEFAULT_PATH']
-            if method == Client.download_file:
+            if not recursive:
                 new_arg = os.path.join(new_arg, os.path.split(args[0])[1])
             args.append(new_arg)
         args[1] = os.path.expanduser(args[1])
@@ -217,28 +805,104 @@ class Client:
     @get_func
     @staticmethod
     def upload_handler(args):
-        """usage: put <path1> [<path2>]
+        """usage: put [-r] [--jobs N] [--resume] <path1> [<path2>]
 
         Send file which is located in path1 to the server's path2.
         Path2 should be a directory
+        -r: send whole directory to the server
+        --jobs: send directory by N parallel sessions
+        --resume: continue partially uploaded file
         """
+        jobs = Client.pop_option(args, '--jobs')
+        recursive = '-r' in args
+        resume = '--resume' in args
+        args = list(filter(lambda a: a not in ('-r', '--resume'), args))
         if not args:
             raise ValueError
+        if recursive:
+            Client.upload_directory(args[0], args[1] if len(args) > 1 else '.',
+                                    int(jobs or 1))
+            return
         file_name = os.path.split(args[0])[-1]
         path2 = args[1] if len(args) > 1 else './'
         path2 = os.path.normpath(os.path.join(path2, file_name))
-        Client.upload_file(args[0], path2)
+        Client.upload_file(args[0], path2, resume)
+
+    @get_func
+    @staticmethod
+    def mget_handler(args):
+        """usage: mget [--jobs N] <remote_pattern> [<local_dir>]
+
+        Receive remote files which match the pattern (e.g. "logs/*.csv").
+        The pattern is matched against one listing of the directory, files
+        are downloaded by N parallel sessions
+        """
+        jobs = int(Client.pop_option(args, '--jobs') or
+                   config['POOL_MAX_SIZE'])
+        if len(args) not in (1, 2):
+            raise ValueError
+        local_path = os.path.expanduser(
+            args[1] if len(args) == 2 else config['DOWNLOAD_DEFAULT_PATH'])
+        if not Client.download_many(args[0], local_path, jobs):
+            print('No files match "{}"'.format(args[0]))
+
+    @get_func
+    @staticmethod
+    def mput_handler(args):
+        """usage: mput [--jobs N] <local_pattern> [<remote_dir>]
+
+        Send local files which match the pattern (e.g. "logs/*.gz") by N
+        parallel sessions
+        """
+        jobs = int(Client.pop_option(args, '--jobs') or
+                   config['POOL_MAX_SIZE'])
+        if len(args) not in (1, 2):
+            raise ValueError
+        remote_path = args[1] if len(args) == 2 else ''
+        if not Client.upload_many(args[0], remote_path, jobs):
+            print('No files match "{}"'.format(args[0]))
+
+    @get_func
+    @staticmethod
+    def mirror_handler(args):
+        """usage: mirror [-R] [--delete] [--dry-run] [--jobs N] <remote_dir>
+                  [<local_dir>]
+
+        Make local directory the same as the remote one. Only files which
+        are missing or differ by size or modification time are transferred
+        -R: make remote directory the same as the local one
+        --delete: remove files which don't exist in the source directory
+        --dry-run: only print what would be done
+        --jobs: transfer files by N parallel sessions
+        """
+        jobs = Client.pop_option(args, '--jobs')
+        flags = ('-R', '--delete', '--dry-run')
+        options = {flag: flag in args for flag in flags}
+        args = list(filter(lambda a: a not in flags, args))
+        if len(args) == 1:
+            args.append(config['DOWNLOAD_DEFAULT_PATH'])
+        if len(args) != 2:
+            raise ValueError
+        Client.mirror(args[0], os.path.expanduser(args[1]),
+                      upload=options['-R'], delete=options['--delete'],
+                      dry_run=options['--dry-run'], jobs=int(jobs or 1))
 
     @get_func
     @staticmethod
     def remove_handler(args):
-        """usage: rm <path>
+        """usage: rm <path> [<path> ...]
 
-        Remove file on the remote machine
+        Remove files on the remote machine. Several files are removed by
+        pipelined commands
         """
         if len(args) == 0:
             raise ValueError
-        Client.ftp.remove_file(args[0])
+        if len(args) == 1:
+            Client.ftp.remove_file(args[0])
+            return
+        for path, error in Client.ftp.delete_many(args).items():
+            if error is not None:
+                Client.eprint('{}: {}'.format(path, error.response))
 
     @get_func
     @staticmethod
@@ -284,33 +948,41 @@ class Client:
     @get_func
     @staticmethod
     def ls_handler(args):
-        """usage: ls [-l] [<path>]
+        """usage: ls [-l] [-i] [<path>]
 
         Show content of remote directory
         -l: show content in list form
+        -i: show content saved in the index (without the server)
         """
-        method = (Client.ftp.list_files_raw
-                  if '-l' in args
-                  else Client.ftp.list_files)
+        if '-i' in args:
+            Client.list_index([a for a in args if a not in ('-i', '-l')],
+                              '-l' in args)
+            return
+        long_format = '-l' in args
         args = list(filter(lambda a: a != '-l', args))
         path = args[0] if len(args) == 1 else ''
-        result = method(path)
-        if isinstance(result, list):
-            result = '\n'.join(map(
-                lambda t: t[0] if t[1] else t[0] + '/',
-                result))
-        print(result)
+        if long_format:
+            print(Client.ftp.list_files_raw(path))
+            return
+        # entries are printed while the listing is being received
+        for entry in Client.ftp.iter_files(path):
+            print(entry.name + ('/' if entry.is_dir else ''))
 
     @get_func
     @staticmethod
     def size_handler(args):
-        """usage: size <file_name>
+        """usage: size <file_name> [<file_name> ...]
 
-        Show size of remote file
+        Show size of remote files. Sizes of several files are requested by
+        pipelined commands
         """
         if not args:
             raise ValueError
-        Client.ftp.try_get_size(args[0])
+        if len(args) == 1:
+            print(Client.ftp.try_get_size(args[0]))
+            return
+        for path, size in Client.ftp.size_many(args).items():
+            print('{}\t{}'.format(size, path))
 
     @get_func
     @staticmethod
@@ -334,6 +1006,142 @@ class Client:
                    else 'Active mode is on')
         print(message)
 
+    @get_func
+    @staticmethod
+    def pool_handler(args):
+        """Show state of the session pool which is used by parallel transfers
+        """
+        print(Client.pool)
+
+    @get_func
+    @staticmethod
+    def status_handler(args):
+        """Show transfer type, working directory and user of the session and
+        amount of commands which weren't sent because they were redundant
+        """
+        print(Client.ftp.state)
+
+    @get_func
+    @staticmethod
+    def cache_handler(args):
+        """usage: cache [clear]
+
+        Show statistics of the metadata cache or clear it
+        """
+        if Client.ftp.cache is None:
+            print('Cache is off. Use "--cache-ttl"')
+        elif args and args[0] == 'clear':
+            Client.ftp.cache.clear()
+        else:
+            print(Client.ftp.cache)
+
+    @get_func
+    @staticmethod
+    def index_handler(args):
+        """usage: index refresh [--full] [<path>] | find <pattern> [<path>] |
+                     du [<path>] | clear
+
+        Local index of remote directory trees. "refresh" lists directories
+        which were changed since the last refresh (all with "--full"), other
+        commands are answered without the server
+        """
+        if Client.index is None:
+            print('Index is off. Use "--index"')
+            return
+        if not args:
+            print(Client.index)
+            return
+        command, *args = args
+        full = '--full' in args
+        args = [a for a in args if a != '--full']
+        if command == 'refresh' and len(args) <= 1:
+            listed = Client.index.refresh(Client.ftp, *args, full=full)
+            print('{} directories listed, {}'.format(listed, Client.index))
+        elif command == 'find' and len(args) in (1, 2):
+            root = Client.ftp._normalize(args[1] if len(args) > 1 else '')
+            for path in Client.index.find(args[0], root):
+                print(Client.ftp._command_path(path))
+        elif command == 'du' and len(args) <= 1:
+            root = Client.ftp._normalize(args[0] if args else '')
+            print('{} files, {} bytes'.format(*Client.index.du(root)))
+        elif command == 'clear' and not args:
+            Client.index.clear()
+        else:
+            raise ValueError
+
+    @get_func
+    @staticmethod
+    def du_handler(args):
+        """usage: du [--depth N] [--jobs N] [<path>]
+
+        Show amount of files and total size of remote directory. Directories
+        are listed by N parallel sessions. With "--depth" sizes of
+        subdirectories down to N levels are shown too
+        """
+        depth = int(Client.pop_option(args, '--depth') or 0)
+        jobs = int(Client.pop_option(args, '--jobs') or
+                   config['POOL_MAX_SIZE'])
+        if len(args) > 1:
+            raise ValueError
+        root = normalize_root(args[0] if args else '')
+        walker = Walker(Client.get_pool(jobs), jobs)
+        totals = aggregate_sizes(walker.walk(root), root)
+        for path in sorted(totals):
+            relative = path[len(root):].lstrip('/')
+            if not relative or relative.count('/') < depth:
+                files, size = totals[path]
+                print('{}\t{} files\t{}'.format(size, files, path or '.'))
+        for name, error in walker.failures:
+            Client.eprint('{}: {}'.format(name, error))
+
+    @get_func
+    @staticmethod
+    def find_handler(args):
+        """usage: find [--jobs N] <pattern> [<path>]
+
+        Find remote files and directories whose names match the pattern
+        (wildcards "*", "?", "[...]"). Directories are listed by N parallel
+        sessions, paths are printed as they are found
+        """
+        jobs = int(Client.pop_option(args, '--jobs') or
+                   config['POOL_MAX_SIZE'])
+        if len(args) not in (1, 2):
+            raise ValueError
+        pattern, root = args[0], args[1] if len(args) == 2 else ''
+        walker = Walker(Client.get_pool(jobs), jobs)
+        for path, entry in walker.walk(root):
+            if fnmatch.fnmatchcase(entry.name, pattern):
+                print(path + ('/' if entry.is_dir else ''))
+        for name, error in walker.failures:
+            Client.eprint('{}: {}'.format(name, error))
+
+    @get_func
+    @staticmethod
+    def stats_handler(args):
+        """usage: stats [--json | --prometheus] [<file>] | stats reset
+
+        Show latency of commands and data connections and transfer speed of
+        all sessions. Metrics can be exported as JSON or Prometheus text (to
+        the file if it's specified)
+        """
+        if args == ['reset']:
+            Client.metrics.reset()
+            return
+        if '--json' in args:
+            result = Client.metrics.to_json()
+        elif '--prometheus' in args:
+            result = Client.metrics.to_prometheus()
+        else:
+            result = str(Client.metrics)
+        args = [a for a in args if a not in ('--json', '--prometheus')]
+        if len(args) > 1:
+            raise ValueError
+        if args:
+            with open(os.path.expanduser(args[0]), 'w') as file:
+                file.write(result)
+        else:
+            print(result)
+
     @get_func
     @staticmethod
     def help_handler(args):
@@ -359,6 +1167,11 @@ class Client:
     def exit_handler(args):
         """Terminate ftp session
         """
+        Client.pool.close()
+        if Client.index is not None:
+            Client.index.close()
+        if Client.keeper is not None:
+            Client.keeper.close()
         Client.ftp.quit()
         raise SystemExit(0)
 
@@ -372,6 +1185,9 @@ class Client:
     handlers = {
         'get': download_handler,
         'put': upload_handler,
+        'mget': mget_handler,
+        'mput': mput_handler,
+        'mirror': mirror_handler,
         'user': user_handler,
         'pwd': pwd_handler,
         'rm': remove_handler,
@@ -382,7 +1198,14 @@ class Client:
         'size': size_handler,
         'verbose': verbose_handler,
         'mode': switch_mode_handler,
+        'pool': pool_handler,
         'help': help_handler,
+        'cache': cache_handler,
+        'status': status_handler,
+        'index': index_handler,
+        'du': du_handler,
+        'find': find_handler,
+        'stats': stats_handler,
         'exit': exit_handler,
         None: unknown_command_handler
     }
@@ -0,0 +1,46 @@
+import io
+import zlib
+from typing import Generator, Iterable, Union
+
+from .talker import UPLOAD_BLOCK_SIZE
+
+
+class DeflateStream:
+    """Iterable of deflate compressed blocks (MODE Z) of the data. Data can
+    be bytes, binary file object or iterable of chunks. "size" is amount of
+    uncompressed bytes which were read
+    """
+    def __init__(self, data: Union[bytes, io.IOBase, Iterable[bytes]],
+                 level: int):
+        self.data = data
+        self.level = level
+        self.size = 0
+
+    def _chunks(self) -> Iterable[bytes]:
+        if isinstance(self.data, (bytes, bytearray, memoryview)):
+            return [self.data]
+        if isinstance(self.data, io.IOBase):
+            return iter(lambda: self.data.read(UPLOAD_BLOCK_SIZE), b'')
+        return self.data
+
+    def __iter__(self) -> Generator[bytes, None, None]:
+        compressor = zlib.compressobj(self.level)
+        for chunk in self._chunks():
+            self.size += len(chunk)
+            block = compressor.compress(chunk)
+            if block:
+                yield block
+        yield compressor.flush()
+
+
+def inflate(chunks: Iterable[bytes]) -> Generator[bytes, None, None]:
+    """Decompress MODE Z data chunk by chunk
+    """
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
@@ -5,3 +5,15 @@ class Error(Exception):
 class WrongResponse(Error):
     def __init__(self, response):
         self.response = response
+
+
+class PoolTimeout(Error):
+    pass
+
+
+class IncompleteTransfer(Error):
+    pass
+
+
+class ChecksumMismatch(Error):
+    pass
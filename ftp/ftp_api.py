@@ -1,87 +1,473 @@
-import re
+import codecs
+import io
+import os
+import posixpath
 import socket
-from typing import Generator, List, Tuple
+from typing import (Dict, Generator, Iterable, List, Optional, Sequence, Set,
+                    Tuple, Union)
 
+from .cache import MetadataCache
+from .checksum import HASH_ALGORITHMS, X_COMMANDS, parse_digest
+from .compression import DeflateStream, inflate
+from .errors import WrongResponse
+from .listing import (FILE_REGEX, Entry, parse_list_line, parse_mlsd_line,
+                      parse_modify)
 from .mode import Mode
-from .talker import Talker
+from .session import SessionState
+from .response import Response
+from .talker import PIPELINE_WINDOW, Talker
 
-FILE_REGEX = re.compile(
-    (r'^(?P<dir>d?)(?:.+)(?:(?<= \d{4} )|(?<= \d{2}:\d{2} ))'
-     r'(?P<filename>.+)$'),
-    re.MULTILINE)
+LIST_BUFFER_SIZE = 64 * 1024
 
 
 class FtpApi:
-    def __init__(self, talker: Talker):
+    def __init__(self, talker: Talker, cache: MetadataCache = None,
+                 compress_level=None):
         self.talker = talker
+        self.cache = cache
+        # files are transferred in MODE Z with this deflate level (1-9) if
+        # the server supports it, None turns compression off
+        self.compress_level = compress_level  # type: Optional[int]
+        self.credentials = None
+        self._features = None
+        self._server_level = None
+        self._hash_selected = None
         self.talker._get_response()
 
+    @property
+    def state(self) -> SessionState:
+        return self.talker.state
+
     def login(self, user: str, password: str):
+        if self.state.user == user and self.credentials == (user, password):
+            self.state.commands_saved += 2
+            return
+        self.state.user = None
         self.talker.run_command('USER', user)
         self.talker.run_command('PASS', password)
+        self.credentials = (user, password)
+        self.state.user = user
+        self.state.cwd = ''
+        # other sessions of the same user share the cache
+        if self.cache is not None and self.cache.user != user:
+            self.cache.clear()
+            self.cache.user = user
+
+    def _normalize(self, path: str) -> str:
+        """Return path relative to the login directory (or absolute path).
+        It's used to track the working directory and as a key of the metadata
+        cache
+        """
+        return posixpath.normpath(posixpath.join(self.state.cwd, path or '.'))
+
+    def _command_path(self, path: str) -> str:
+        """Return path which points from the working directory to the
+        normalized "path" (the opposite of "_normalize")
+        """
+        current = self._normalize('')
+        if posixpath.isabs(path) or posixpath.isabs(current):
+            return path
+        return posixpath.relpath(path, current)
+
+    def _invalidate(self, path: str):
+        if self.cache is not None:
+            self.cache.invalidate(self._normalize(path))
+
+    def features(self) -> Set[str]:
+        """Return set of extensions which server announces in the FEAT reply
+        (e.g. "SIZE", "REST STREAM"). The reply is requested only once
+        """
+        if self._features is None:
+            try:
+                message = self.talker.run_command('FEAT').message
+            except WrongResponse:
+                message = ''
+            self._features = set(
+                line.strip().upper() for line in message.split('\n')
+                if line.startswith(' '))
+        return self._features
+
+    def supports_mlst(self) -> bool:
+        return any(f.split()[0] == 'MLST' for f in self.features() if f)
 
     def quit(self):
         self.talker.run_command("QUIT")
         self.talker.close_connection()
 
     def switch_mode(self, mode: Mode):
+        if self.state.transfer_type == mode.value[0]:
+            self.state.commands_saved += 1
+            return
+        self.state.transfer_type = None
         self.talker.run_command('TYPE', mode.value[0])
+        self.state.transfer_type = mode.value[0]
 
-    def get_file(self, path) -> Generator[bytes, None, None]:
-        file_size = self.try_get_size(path)
+    def _set_transfer_mode(self, compressed: bool) -> bool:
+        """Switch to MODE Z if "compressed" is requested, compression is on
+        and the server announces it, to MODE S otherwise. If the server
+        refuses MODE Z compression is turned off. Returns True if the data
+        will be compressed
+        """
+        compressed = (compressed and self.compress_level is not None and
+                      'MODE Z' in self.features())
+        mode = 'Z' if compressed else 'S'
+        if self.state.transfer_mode != mode:
+            self.state.transfer_mode = None
+            try:
+                self.talker.run_command('MODE', mode)
+            except WrongResponse:
+                if not compressed:
+                    raise
+                self.compress_level = None
+                self.state.transfer_mode = 'S'
+                return False
+            self.state.transfer_mode = mode
+        if compressed and self._server_level != self.compress_level:
+            # level of the server's compression (of downloaded data)
+            try:
+                self.talker.run_command(
+                    'OPTS', 'MODE Z LEVEL {}'.format(self.compress_level))
+            except WrongResponse:
+                pass
+            self._server_level = self.compress_level
+        return compressed
+
+    def get_file(self, path, file_size=None, show_progress=True,
+                 offset=0) -> Generator[bytes, None, None]:
+        """Download remote file by chunks. If "offset" is specified the
+        transfer is restarted from this position. Data is compressed during
+        the transfer if "compress_level" is set
+        """
+        for chunk in self._retrieve(path, file_size, show_progress, offset):
+            yield bytes(chunk)
+
+    def _retrieve(self, path, file_size=None, show_progress=True,
+                  offset=0) -> Generator[memoryview, None, None]:
+        """The same as "get_file" but chunks are views of the talker's
+        receive buffer and should be consumed before the next one is requested
+        """
+        if file_size is None:
+            file_size = self.try_get_size(path)
         if file_size == -1:
-            file_size = None  # type: ignore
+            file_size = None
+        elif offset:
+            file_size -= offset
 
         self.switch_mode(Mode.Binary)
+        compressed = self._set_transfer_mode(True)
         self.talker._open_data_connection()
+        if offset:
+            self.talker.run_command('REST', str(offset))
         self.talker.run_command('RETR', path)
-        yield from self.talker._read_data(file_size, show_progress=True)
-        self.talker._get_response()
+        if compressed:
+            # progress of compressed data can't be shown in percents
+            yield from inflate(self.talker._read_data(
+                show_progress=show_progress, name=path))
+        else:
+            yield from self.talker._read_data(file_size,
+                                              show_progress=show_progress,
+                                              name=path)
+        self.talker._end_transfer()
+
+    def get_file_range(self, path: str, offset: int,
+                       length: int) -> Generator[bytes, None, None]:
+        """Download "length" bytes of remote file starting from "offset".
+        Server has to support "REST STREAM"
+        """
+        for chunk in self._retrieve_range(path, offset, length):
+            yield bytes(chunk)
 
-    def upload_file(self, path: str, data: bytes):
+    def _retrieve_range(self, path: str, offset: int,
+                        length: int) -> Generator[memoryview, None, None]:
+        """The same as "get_file_range" but chunks are views of the talker's
+        receive buffer
+        """
         self.switch_mode(Mode.Binary)
+        self._set_transfer_mode(False)
         self.talker._open_data_connection()
-        self.talker.run_command('STOR', path)
-        self.talker._send_data(data)
+        self.talker.run_command('REST', str(offset))
+        self.talker.run_command('RETR', path)
+
+        chunks = self.talker._read_data()
+        for chunk in chunks:
+            yield chunk[:length]
+            length -= len(chunk)
+            if length <= 0:
+                break
+        chunks.close()
+        # 226 or 426 if the transfer was interrupted before the end of file
         self.talker._get_response()
 
+    def upload_file(self, path: str,
+                    data: Union[str, bytes, io.IOBase, Iterable[bytes]],
+                    data_size=None, offset=0, show_progress=True) -> int:
+        """Upload data to the remote path. Data can be local file's path,
+        bytes, binary file object or iterable of chunks. Returns amount of
+        sent bytes. If "offset" is specified the data is written to the
+        remote file from this position (REST + STOR or APPE if the server
+        doesn't support REST). Data should already start from the offset
+        (except local file's path). Data is compressed during the transfer if
+        "compress_level" is set
+        """
+        if isinstance(data, str):
+            with open(data, 'rb') as file:
+                file_size = os.fstat(file.fileno()).st_size
+                file.seek(offset)
+                return self.upload_file(path, file, file_size - offset,
+                                        offset, show_progress)
+
+        self.switch_mode(Mode.Binary)
+        self._invalidate(path)
+        compressed = self._set_transfer_mode(True)
+        self.talker._open_data_connection()
+        if not offset:
+            self.talker.run_command('STOR', path)
+        elif 'REST STREAM' in self.features():
+            self.talker.run_command('REST', str(offset))
+            self.talker.run_command('STOR', path)
+        else:
+            self.talker.run_command('APPE', path)
+        if compressed:
+            stream = DeflateStream(data, self.compress_level)
+            self.talker._send_data(stream, None, show_progress, path)
+            sent_size = stream.size
+        else:
+            sent_size = self.talker._send_data(data, data_size,
+                                               show_progress, path)
+        self.talker._end_transfer()
+        return sent_size
+
     def get_current_location(self) -> str:
         return self.talker.run_command('PWD').message
 
     def remove_file(self, path: str):
+        self._invalidate(path)
         self.talker.run_command('DELE', path)
 
     def rename_file(self, old_name: str, new_name: str):
+        self._invalidate(old_name)
+        self._invalidate(new_name)
         self.talker.run_command('RNFR', old_name)
         self.talker.run_command('RNTO', new_name)
 
     def try_get_size(self, path: str) -> int:
+        if self.cache is not None:
+            found, size = self.cache.get('SIZE', self._normalize(path))
+            if found:
+                return size
+
+        # SIZE is defined only for the binary type. The type isn't switched
+        # back because the following transfer is usually binary too
         self.switch_mode(Mode.Binary)
         result = self.talker.run_command('SIZE', path).message
-        self.switch_mode(Mode.Ascii)
         try:
-            return int(result)
+            size = int(result)
         except ValueError:
-            return -1
+            size = -1
+        if self.cache is not None:
+            self.cache.put('SIZE', self._normalize(path), size)
+        return size
+
+    def _hash_method(self) -> Optional[Tuple[str, str]]:
+        """Return (<command>, <algorithm>) which is used to get checksums of
+        remote files: HASH with the algorithm selected on the server (marked
+        with "*" in FEAT) or the most preferred one, otherwise the most
+        preferred X-command. None if the server announces neither
+        """
+        features = self.features()
+        for feature in features:
+            if not feature.startswith('HASH '):
+                continue
+            names = feature[5:].split(';')
+            if self._hash_selected is None:
+                self._hash_selected = next(
+                    (n[:-1] for n in names if n.endswith('*')), None)
+            if self._hash_selected in HASH_ALGORITHMS:
+                return 'HASH', self._hash_selected
+            for algorithm in HASH_ALGORITHMS:
+                if algorithm in names:
+                    return 'HASH', algorithm
+        for command, algorithm in X_COMMANDS:
+            if command in features:
+                return command, algorithm
+        return None
+
+    def hash_algorithm(self) -> Optional[str]:
+        """Return algorithm of checksums which "remote_hash" returns
+        ("SHA-256", "SHA-1", "MD5", "CRC32", ...) or None
+        """
+        method = self._hash_method()
+        return method[1] if method is not None else None
+
+    def remote_hash(self, path: str) -> Optional[Tuple[str, str]]:
+        """Return (<algorithm>, <hex digest>) of remote file which is
+        computed by the server (HASH or XSHA256/XSHA1/XMD5/XCRC). None if
+        the server can't hash files
+        """
+        method = self._hash_method()
+        if method is None:
+            return None
+        command, algorithm = method
+        if self.cache is not None:
+            found, digest = self.cache.get('HASH', self._normalize(path))
+            if found and digest[0] == algorithm:
+                return digest
+
+        if command == 'HASH' and self._hash_selected != algorithm:
+            self.talker.run_command('OPTS', 'HASH', algorithm)
+            self._hash_selected = algorithm
+        response = self.talker.run_command(command, path)
+        digest = parse_digest(algorithm, response.message)
+        if digest is None:
+            raise WrongResponse(response)
+        if self.cache is not None:
+            self.cache.put('HASH', self._normalize(path), (algorithm, digest))
+        return algorithm, digest
+
+    def batch(self, commands: Sequence[Sequence[str]],
+              window=PIPELINE_WINDOW) -> List[Union[Response, WrongResponse]]:
+        """Send commands which get one reply each (SIZE, MDTM, DELE, ...)
+        back-to-back without waiting for every response. Returns responses in
+        the order of commands, WrongResponse for failed ones
+        """
+        return self.talker.run_pipelined(commands, window)
+
+    def size_many(self, paths: Sequence[str],
+                  window=PIPELINE_WINDOW) -> Dict[str, int]:
+        """Return sizes of remote files. Size is -1 if it can't be got
+        """
+        self.switch_mode(Mode.Binary)
+        results = self.batch([('SIZE', path) for path in paths], window)
+        sizes = {}
+        for path, result in zip(paths, results):
+            try:
+                sizes[path] = int(result.message)
+            except (AttributeError, ValueError):
+                sizes[path] = -1
+            else:
+                if self.cache is not None:
+                    self.cache.put('SIZE', self._normalize(path), sizes[path])
+        return sizes
+
+    def modify_time_many(self, paths: Sequence[str],
+                         window=PIPELINE_WINDOW) -> Dict[str, float]:
+        """Return modification times (UTC timestamps) of remote files (MDTM).
+        Time is None if it can't be got
+        """
+        results = self.batch([('MDTM', path) for path in paths], window)
+        return {path: (None if isinstance(result, WrongResponse)
+                       else parse_modify(result.message))
+                for path, result in zip(paths, results)}
+
+    def delete_many(self, paths: Sequence[str], window=PIPELINE_WINDOW
+                    ) -> Dict[str, Optional[WrongResponse]]:
+        """Remove remote files. Returns dict of paths and errors (None if the
+        file was removed)
+        """
+        for path in paths:
+            self._invalidate(path)
+        results = self.batch([('DELE', path) for path in paths], window)
+        return {path: (result if isinstance(result, WrongResponse) else None)
+                for path, result in zip(paths, results)}
 
     def remove_directory(self, path: str):
+        self._invalidate(path)
         self.talker.run_command('RMD', path)
 
     def change_directory(self, path: str):
+        new_cwd = self._normalize(path)
+        if new_cwd == self._normalize(''):
+            self.state.commands_saved += 1
+            return
         self.talker.run_command('CWD', path)
+        self.state.cwd = new_cwd
+
+    def set_directory(self, cwd: str):
+        """Change the working directory to "cwd" which is relative to the
+        login directory (or absolute) like "state.cwd" of another session of
+        the same user. Nothing is sent if the directory is the same
+        """
+        target = posixpath.normpath(cwd or '.')
+        if (posixpath.isabs(self.state.cwd) and not posixpath.isabs(target)
+                and self.credentials is not None):
+            # the login directory can't be found from an absolute path, it's
+            # restored by logging in again
+            self.state.user = None
+            self.login(*self.credentials)
+        if target == self._normalize(''):
+            self.state.commands_saved += 1
+            return
+        self.talker.run_command('CWD', self._command_path(target))
+        self.state.cwd = target
 
     def make_directory(self, path: str):
+        self._invalidate(path)
         self.talker.run_command('MKD', path)
 
     def list_files_raw(self, path='') -> str:
+        if self.cache is not None:
+            found, listing = self.cache.get('LIST', self._normalize(path))
+            if found:
+                return listing
+
+        self._set_transfer_mode(False)
         self.talker._open_data_connection()
         self.talker.run_command('LIST', path)
 
         chunks = []
         for chunk in self.talker._read_data():
-            chunks.append(chunk.decode(encoding='utf-8', errors='ignore'))
+            chunks.append(str(chunk, encoding='utf-8', errors='ignore'))
         self.talker._get_response()
-        return ''.join(chunks)
+        listing = ''.join(chunks)
+        if self.cache is not None:
+            self.cache.put('LIST', self._normalize(path), listing)
+        return listing
+
+    def iter_files(self, path='') -> Generator[Entry, None, None]:
+        """Return entries of remote directory (LIST) one by one. Lines are
+        decoded and parsed while the listing is being received, so the first
+        entries are available before the end of the transfer and memory usage
+        doesn't depend on the size of directory (unless the metadata cache is
+        on: the whole listing is stored then)
+        """
+        if self.cache is not None:
+            found, listing = self.cache.get('LIST', self._normalize(path))
+            if found:
+                yield from filter(None, map(parse_list_line,
+                                            listing.splitlines()))
+                return
+
+        self._set_transfer_mode(False)
+        self.talker._open_data_connection()
+        self.talker.run_command('LIST', path)
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        parts = [] if self.cache is not None else None
+        tail = ''
+        chunks = self.talker._read_data(buffer_size=LIST_BUFFER_SIZE)
+        try:
+            for chunk in chunks:
+                text = decoder.decode(chunk)
+                if parts is not None:
+                    parts.append(text)
+                # the last line may continue in the next chunk
+                lines = (tail + text).split('\n')
+                tail = lines.pop()
+                for line in lines:
+                    entry = parse_list_line(line.rstrip('\r'))
+                    if entry is not None:
+                        yield entry
+            entry = parse_list_line(
+                (tail + decoder.decode(b'', final=True)).rstrip('\r'))
+            if entry is not None:
+                yield entry
+        finally:
+            chunks.close()
+            # 226 or 426 if the listing was abandoned
+            self.talker._get_response()
+
+        if parts is not None:
+            self.cache.put('LIST', self._normalize(path), ''.join(parts))
 
     def list_files(self, path='') -> List[Tuple[str, bool]]:
         """Returns list of tuples (<file_name>, <is_file>)
@@ -95,3 +481,45 @@ class FtpApi:
             result.append((filename, is_file))
 
         return result
+
+    def list_entries(self, path='') -> List[Entry]:
+        """Return entries of remote directory. MLSD is used if the server
+        supports it, otherwise LIST is parsed (size may be unknown then)
+        """
+        if not self.supports_mlst():
+            return list(self.iter_files(path))
+
+        if self.cache is not None:
+            found, entries = self.cache.get('MLSD', self._normalize(path))
+            if found:
+                return entries
+
+        self._set_transfer_mode(False)
+        self.talker._open_data_connection()
+        self.talker.run_command('MLSD', path)
+        chunks = []
+        for chunk in self.talker._read_data():
+            chunks.append(bytes(chunk))
+        self.talker._get_response()
+        data = b''.join(chunks).decode(encoding='utf-8', errors='ignore')
+        entries = list(filter(None, map(parse_mlsd_line, data.splitlines())))
+
+        if self.cache is not None:
+            self.cache.put('MLSD', self._normalize(path), entries)
+        return entries
+
+    def stat(self, path: str) -> Entry:
+        """Return entry of remote file. MLST is used if the server supports
+        it, otherwise only the size of file is requested
+        """
+        if not self.supports_mlst():
+            return Entry(posixpath.basename(path), 'file',
+                         self.try_get_size(path), None, None)
+
+        response = self.talker.run_command('MLST', path)
+        for line in response.message.split('\n'):
+            if line.startswith(' '):
+                entry = parse_mlsd_line(line[1:])
+                if entry is not None:
+                    return entry._replace(name=posixpath.basename(entry.name))
+        raise WrongResponse(response)
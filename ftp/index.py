@@ -0,0 +1,206 @@
+import fnmatch
+import os
+import posixpath
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from .ftp_api import FtpApi
+from .listing import Entry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    host TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    size INTEGER,
+    modify REAL,
+    PRIMARY KEY (host, path)
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (host, parent);
+"""
+
+
+def _escape_like(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace('%', '\\%')
+            .replace('_', '\\_'))
+
+
+class RemoteIndex:
+    """On-disk (SQLite) index of remote directory trees. Entries are kept
+    per "host" (e.g. "ftp.example.com:21") by remote path relative to the
+    login directory or absolute (FtpApi._normalize), so they don't depend on
+    the working directory. "find" and "du" are answered without the server.
+    Refresh is incremental: a directory is listed again only if its
+    modification time has changed (it's known only when the server supports
+    MLSD, otherwise every directory is listed)
+    """
+    def __init__(self, db_path: str, host: str):
+        self.host = host
+        self.db_path = db_path
+        self._db = sqlite3.connect(os.path.expanduser(db_path))
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    @staticmethod
+    def _row_entry(row) -> Entry:
+        name, kind, size, modify = row
+        return Entry(name, kind, size, modify, None)
+
+    def get(self, path: str) -> Optional[Entry]:
+        row = self._db.execute(
+            'SELECT name, type, size, modify FROM entries '
+            'WHERE host = ? AND path = ?',
+            (self.host, posixpath.normpath(path))).fetchone()
+        return None if row is None else self._row_entry(row)
+
+    def children(self, path: str) -> List[Entry]:
+        """Return indexed entries of the directory sorted by name
+        """
+        rows = self._db.execute(
+            'SELECT name, type, size, modify FROM entries '
+            'WHERE host = ? AND parent = ? ORDER BY name',
+            (self.host, posixpath.normpath(path)))
+        return [self._row_entry(row) for row in rows]
+
+    def _subtree(self, root: str):
+        """Iterate over (path, name, type, size, modify) rows inside the
+        directory
+        """
+        root = posixpath.normpath(root)
+        if root == '.':
+            return self._db.execute(
+                'SELECT path, name, type, size, modify FROM entries '
+                'WHERE host = ? ORDER BY path', (self.host,))
+        return self._db.execute(
+            'SELECT path, name, type, size, modify FROM entries '
+            "WHERE host = ? AND path LIKE ? ESCAPE '\\' ORDER BY path",
+            (self.host, _escape_like(root.rstrip('/')) + '/%'))
+
+    def tree(self, root: str) -> Dict[str, Entry]:
+        """Return indexed entries of the directory tree keyed by the path
+        relative to "root" (the same format as mirror.remote_tree)
+        """
+        root = posixpath.normpath(root)
+        return {posixpath.relpath(path, root) if root != '.' else path:
+                Entry(name, kind, size, modify, None)
+                for path, name, kind, size, modify in self._subtree(root)}
+
+    def find(self, pattern: str, root='.') -> List[str]:
+        """Return paths of indexed entries whose names match the shell
+        pattern
+        """
+        return [path for path, name, *_ in self._subtree(root)
+                if fnmatch.fnmatchcase(name, pattern)]
+
+    def du(self, root='.') -> Tuple[int, int]:
+        """Return amount of files and their total size inside the directory
+        """
+        files = size = 0
+        for _, _, kind, entry_size, _ in self._subtree(root):
+            if kind != 'dir':
+                files += 1
+                size += entry_size or 0
+        return files, size
+
+    def _store_listing(self, directory: str, entries: List[Entry]):
+        """Replace indexed content of the directory by the listing. Subtrees
+        of entries which disappeared are removed
+        """
+        directory = posixpath.normpath(directory)
+        names = {entry.name for entry in entries}
+        for old in self.children(directory):
+            if old.name not in names:
+                path = posixpath.normpath(posixpath.join(directory, old.name))
+                self._db.execute(
+                    'DELETE FROM entries WHERE host = ? AND '
+                    "(path = ? OR path LIKE ? ESCAPE '\\')",
+                    (self.host, path, _escape_like(path) + '/%'))
+        self._db.executemany(
+            'INSERT OR REPLACE INTO entries '
+            '(host, path, parent, name, type, size, modify) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(self.host, posixpath.normpath(
+                posixpath.join(directory, entry.name)), directory,
+              entry.name, entry.type, entry.size, entry.modify)
+             for entry in entries])
+
+    def refresh(self, api: FtpApi, root='', full=False) -> int:
+        """Update the index of the remote directory tree ("root" is relative
+        to the working directory of the session). Directories whose
+        modification time hasn't changed since the last refresh aren't
+        listed unless "full" is set, but their known subdirectories are
+        checked by MLST (a change deeper in the tree doesn't change the
+        parent's time). Files changed in place don't change the time of the
+        directory, they are found by the full refresh only. Returns amount of
+        listed directories
+        """
+        root = api._normalize(root)
+        listed = 0
+        # (<path>, <list it>): directories which aren't listed are checked
+        directories = [(root, full or not api.supports_mlst())]
+        with self._db:
+            while directories:
+                directory, changed = directories.pop()
+                entry = None
+                if not changed:
+                    old = self.get(directory)
+                    entry = api.stat(api._command_path(directory))
+                    changed = (old is None or entry.modify is None or
+                               old.modify != entry.modify)
+                if not changed:
+                    directories.extend(self._known_subdirectories(directory))
+                    continue
+
+                if directory == root and entry is not None:
+                    # the root is checked by MLST on the next refresh
+                    self._store_entry(root, entry)
+                entries = api.list_entries(api._command_path(directory))
+                listed += 1
+                known = {entry.name: entry
+                         for entry in self.children(directory)}
+                self._store_listing(directory, entries)
+                for entry in entries:
+                    if not entry.is_dir:
+                        continue
+                    path = posixpath.normpath(
+                        posixpath.join(directory, entry.name))
+                    old = known.get(entry.name)
+                    if (not full and old is not None and old.is_dir and
+                            entry.modify is not None and
+                            old.modify == entry.modify):
+                        directories.extend(self._known_subdirectories(path))
+                    else:
+                        directories.append((path, True))
+        return listed
+
+    def _store_entry(self, path: str, entry: Entry):
+        if path in ('.', '/') or entry.modify is None:
+            return
+        self._db.execute(
+            'INSERT OR REPLACE INTO entries '
+            '(host, path, parent, name, type, size, modify) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.host, path, posixpath.dirname(path) or '.',
+             posixpath.basename(path), 'dir', entry.size, entry.modify))
+
+    def _known_subdirectories(self, directory: str) -> List[tuple]:
+        return [(posixpath.normpath(posixpath.join(directory, entry.name)),
+                 False)
+                for entry in self.children(directory) if entry.is_dir]
+
+    def clear(self):
+        with self._db:
+            self._db.execute('DELETE FROM entries WHERE host = ?',
+                             (self.host,))
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM entries WHERE host = ?',
+                                (self.host,)).fetchone()[0]
+
+    def __str__(self):
+        return '{}: {} entries in {}'.format(self.host, len(self),
+                                             self.db_path)
@@ -0,0 +1,143 @@
+import contextlib
+import threading
+import time
+from typing import Generator
+
+from .errors import WrongResponse
+from .ftp_api import FtpApi
+from .talker import Talker
+
+KEEPALIVE_INTERVAL = 30  # seconds
+RECONNECT_ATTEMPTS = 5
+BACKOFF_START = 0.5  # seconds
+BACKOFF_MAX = 30  # seconds
+
+
+class SessionKeeper:
+    """Keeps the main session alive. If the session was idle for
+    "keepalive" seconds NOOP is sent from a background thread, so the server
+    doesn't close it (0 turns it off). Commands of the session have to be
+    run inside "busy" block. If the connection is lost "restore" opens a new
+    one and restores host, credentials, working directory, transfer type
+    and passive mode. The restoring commands are pipelined, so it takes one
+    round trip after the greeting. Failed attempts are repeated with
+    exponential backoff
+    """
+    def __init__(self, api: FtpApi, keepalive=KEEPALIVE_INTERVAL,
+                 attempts=RECONNECT_ATTEMPTS, backoff=BACKOFF_START,
+                 max_backoff=BACKOFF_MAX, sleep=time.sleep):
+        self.api = api
+        self.keepalive = keepalive
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.broken = False
+        self.reconnects = 0
+        self._last_use = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None  # type: threading.Thread
+
+    def start(self):
+        if self.keepalive > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextlib.contextmanager
+    def busy(self) -> Generator[FtpApi, None, None]:
+        """Use the session exclusively (keepalive waits for the end of the
+        block). A broken session is restored first
+        """
+        with self._lock:
+            if self.broken:
+                self._restore()
+            try:
+                yield self.api
+            finally:
+                self._last_use = time.monotonic()
+
+    def restore(self) -> FtpApi:
+        """Open new connection with the state of the current session. Raises
+        the last error if all attempts failed
+        """
+        with self._lock:
+            return self._restore()
+
+    def _restore(self) -> FtpApi:
+        self.broken = True
+        delay = self.backoff
+        for attempt in range(self.attempts):
+            try:
+                api = self._reopen()
+            except (WrongResponse, OSError):
+                if attempt == self.attempts - 1:
+                    raise
+                self.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+            else:
+                try:
+                    self.api.talker.close_connection()
+                except OSError:
+                    pass
+                self.api = api
+                self.broken = False
+                self.reconnects += 1
+                self._last_use = time.monotonic()
+                return api
+
+    def _reopen(self) -> FtpApi:
+        old = self.api
+        talker = Talker(old.talker.host, old.talker.port,
+                        callback=old.talker.callback,
+                        verbose_input=old.talker.verbose_input,
+                        verbose_output=old.talker.verbose_output)
+        talker.passive_mode = old.talker.passive_mode
+        talker.listeners.extend(old.talker.listeners)
+        try:
+            api = FtpApi(talker, old.cache, old.compress_level)
+            commands = []
+            if old.credentials is not None:
+                commands.extend((('USER', old.credentials[0]),
+                                 ('PASS', old.credentials[1])))
+            if old.state.cwd not in ('', '.'):
+                commands.append(('CWD', old.state.cwd))
+            if old.state.transfer_type is not None:
+                commands.append(('TYPE', old.state.transfer_type))
+            # the password isn't printed
+            results = talker.run_pipelined(commands, printin=False,
+                                           printout=False)
+            for result in results:
+                if isinstance(result, WrongResponse):
+                    raise result
+        except BaseException:
+            talker.close_connection()
+            raise
+        api.credentials = old.credentials
+        api.state.user = old.state.user
+        api.state.cwd = old.state.cwd
+        api.state.transfer_type = old.state.transfer_type
+        return api
+
+    def _run(self):
+        while not self._stopped.wait(min(self.keepalive, 1)):
+            if (self.broken or
+                    time.monotonic() - self._last_use < self.keepalive):
+                continue
+            if not self._lock.acquire(blocking=False):
+                continue
+            try:
+                self.api.talker.run_command('NOOP', printin=False,
+                                            printout=False)
+            except (WrongResponse, OSError):
+                # the session is restored before the next command
+                self.broken = True
+            finally:
+                self._last_use = time.monotonic()
+                self._lock.release()
@@ -0,0 +1,75 @@
+import calendar
+import re
+from collections import namedtuple
+from typing import Optional
+
+FILE_REGEX = re.compile(
+    (r'^(?P<dir>d?)(?:.+)(?:(?<= \d{4} )|(?<= \d{2}:\d{2} ))'
+     r'(?P<filename>.+)$'),
+    re.MULTILINE)
+MODIFY_REGEX = re.compile(r'^(\d{4})(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\.\d+)?$')
+
+
+class Entry(namedtuple('Entry', ['name', 'type', 'size', 'modify', 'perm'])):
+    """Remote directory entry. "type" is "file" or "dir" (or other value
+    reported by the server, e.g. "OS.unix=symlink"), "size" is in bytes,
+    "modify" is UTC timestamp, "perm" is MLSD permissions string. Fields
+    which are unknown are None
+    """
+    __slots__ = ()
+
+    @property
+    def is_file(self) -> bool:
+        return self.type == 'file'
+
+    @property
+    def is_dir(self) -> bool:
+        return self.type == 'dir'
+
+
+def parse_modify(value: str) -> Optional[float]:
+    """Convert MLSD/MDTM time value (YYYYMMDDHHMMSS[.sss]) to timestamp
+    """
+    match = MODIFY_REGEX.match(value.strip())
+    if match is None:
+        return None
+    timestamp = calendar.timegm(tuple(map(int, match.groups()[:6])))
+    return timestamp + float(match.group(7) or 0)
+
+
+def parse_mlsd_line(line: str) -> Optional[Entry]:
+    """Parse line of MLSD/MLST reply: "fact=value;fact=value; name".
+    Returns None for the current and parent directory entries
+    """
+    facts, _, name = line.partition(' ')
+    if not name:
+        return None
+    values = {}
+    for fact in facts.split(';'):
+        key, _, value = fact.partition('=')
+        if key:
+            values[key.lower()] = value
+
+    kind = values.get('type', '').lower()
+    if kind in ('cdir', 'pdir'):
+        return None
+    size = values.get('size', values.get('sizd'))
+    modify = values.get('modify')
+    return Entry(name, kind or None,
+                 int(size) if size and size.isdigit() else None,
+                 parse_modify(modify) if modify else None,
+                 values.get('perm'))
+
+
+def parse_list_line(line: str) -> Optional[Entry]:
+    """Parse line of LIST reply in unix "ls -l" format. Only name, type and
+    size (if it can be found) are known
+    """
+    match = FILE_REGEX.match(line)
+    if match is None:
+        return None
+    fields = line.split(None, 5)
+    size = fields[4] if len(fields) > 5 else ''
+    return Entry(match.group('filename'),
+                 'file' if match.group('dir') == '' else 'dir',
+                 int(size) if size.isdigit() else None, None, None)
@@ -0,0 +1,170 @@
+import bisect
+import json
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# upper bounds of latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10)
+HISTOGRAM_TITLES = {'ftp_command_latency_seconds': '{}',
+                    'ftp_data_connection_seconds': '{} data connection'}
+
+
+class Histogram:
+    """Cumulative histogram in Prometheus style: "counts[i]" is amount of
+    observations which are not greater than "bounds[i]"
+    """
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i in range(bisect.bisect_left(self.bounds, value),
+                       len(self.bounds)):
+            self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': {str(bound): count
+                            for bound, count in zip(self.bounds, self.counts)}}
+
+
+class Metrics:
+    """Listener of Talker events which keeps counters and latency histograms.
+    Add it to "Talker.listeners" of every session which should be measured.
+    Events:
+    "command" (command) - command was sent
+    "reply" (command, code, latency) - reply was received
+    "data_connection" (mode, latency) - data connection was set up
+    "transfer" (direction, size, seconds) - data transfer was finished
+    """
+    def __init__(self):
+        # (name, labels) -> value, labels is a tuple of (label, value) pairs
+        self.counters = defaultdict(int)  # type: Dict[Tuple, float]
+        self.histograms = {}  # type: Dict[Tuple, Histogram]
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, fields: dict):
+        handler = getattr(self, '_on_' + event, None)
+        if handler is not None:
+            with self._lock:
+                handler(**fields)
+
+    def _observe(self, name: str, labels: tuple, value: float):
+        key = (name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(value)
+
+    def _on_command(self, command):
+        self.counters['ftp_commands_total', (('command', command),)] += 1
+
+    def _on_reply(self, command, code, latency):
+        self.counters['ftp_replies_total', (('code', str(code)),)] += 1
+        self._observe('ftp_command_latency_seconds',
+                      (('command', command),), latency)
+
+    def _on_data_connection(self, mode, latency):
+        self._observe('ftp_data_connection_seconds', (('mode', mode),),
+                      latency)
+
+    def _on_transfer(self, direction, size, seconds):
+        labels = (('direction', direction),)
+        self.counters['ftp_transfers_total', labels] += 1
+        self.counters['ftp_transfer_bytes_total', labels] += size
+        self.counters['ftp_transfer_seconds_total', labels] += seconds
+
+    def throughput(self, direction: str) -> float:
+        """Return average speed of transfers in bytes per second
+        """
+        labels = (('direction', direction),)
+        seconds = self.counters.get(('ftp_transfer_seconds_total', labels))
+        if not seconds:
+            return 0.0
+        return self.counters[('ftp_transfer_bytes_total', labels)] / seconds
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    @staticmethod
+    def _format_name(name: str, labels: tuple) -> str:
+        if not labels:
+            return name
+        return '{}{{{}}}'.format(name, ','.join(
+            '{}="{}"'.format(label, value) for label, value in labels))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'counters': {self._format_name(*key): value
+                             for key, value in sorted(self.counters.items())},
+                'histograms': {self._format_name(*key): histogram.to_dict()
+                               for key, histogram
+                               in sorted(self.histograms.items())},
+                'throughput': {direction: self.throughput(direction)
+                               for direction in ('received', 'sent')}}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=4)
+
+    def to_prometheus(self) -> str:
+        """Return metrics in Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append('# TYPE {} counter'.format(name))
+                for (key_name, labels), value in sorted(
+                        self.counters.items()):
+                    if key_name == name:
+                        lines.append('{} {}'.format(
+                            self._format_name(name, labels), value))
+            names = sorted({name for name, _ in self.histograms})
+            for name in names:
+                lines.append('# TYPE {} histogram'.format(name))
+                for (key_name, labels), histogram in sorted(
+                        self.histograms.items()):
+                    if key_name != name:
+                        continue
+                    for bound, count in zip(histogram.bounds,
+                                            histogram.counts):
+                        lines.append('{} {}'.format(self._format_name(
+                            name + '_bucket', labels + (('le', bound),)),
+                            count))
+                    lines.append('{} {}'.format(self._format_name(
+                        name + '_bucket', labels + (('le', '+Inf'),)),
+                        histogram.count))
+                    lines.append('{} {}'.format(
+                        self._format_name(name + '_sum', labels),
+                        histogram.sum))
+                    lines.append('{} {}'.format(
+                        self._format_name(name + '_count', labels),
+                        histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def __str__(self):
+        lines = []
+        with self._lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if histogram.count:
+                    lines.append('{}: {} times, {} ms on average'.format(
+                        HISTOGRAM_TITLES.get(name, name + ' {}').format(
+                            ' '.join(value for _, value in labels)),
+                        histogram.count,
+                        round(histogram.sum / histogram.count * 1000, 2)))
+            for direction in ('received', 'sent'):
+                labels = (('direction', direction),)
+                size = self.counters.get(('ftp_transfer_bytes_total', labels))
+                if size:
+                    lines.append('{} {} bytes ({} MB/s)'.format(
+                        direction, size,
+                        round(self.throughput(direction) / 1024 ** 2, 4)))
+        return '\n'.join(lines) or 'No metrics yet'
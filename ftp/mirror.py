@@ -0,0 +1,124 @@
+import os
+import posixpath
+from collections import namedtuple
+from typing import Dict, List
+
+from .ftp_api import FtpApi
+from .listing import Entry
+
+# modification times are compared with this tolerance (in seconds) because
+# MDTM and LIST have at most 1 second precision
+MTIME_TOLERANCE = 1
+
+
+class Action(namedtuple('Action', ['kind', 'path', 'size'])):
+    """Step of the mirror plan. "kind" is one of "mkdir", "get", "put",
+    "delete", "rmdir". "path" is relative to the mirrored directories
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        if self.size is None:
+            return '{} {}'.format(self.kind, self.path)
+        return '{} {} ({} bytes)'.format(self.kind, self.path, self.size)
+
+
+def remote_tree(api: FtpApi, root: str) -> Dict[str, Entry]:
+    """Return entries of remote directory tree keyed by the path relative to
+    "root". Sizes and times which are missing in the listing (LIST fallback)
+    are requested by pipelined SIZE/MDTM commands (see "complete_tree")
+    """
+    tree = {}
+    directories = ['']
+    while directories:
+        directory = directories.pop()
+        for entry in api.list_entries(posixpath.join(root, directory)):
+            path = posixpath.join(directory, entry.name)
+            tree[path] = entry
+            if entry.is_dir:
+                directories.append(path)
+    return complete_tree(api, root, tree)
+
+
+def complete_tree(api: FtpApi, root: str,
+                  tree: Dict[str, Entry]) -> Dict[str, Entry]:
+    """Request sizes and times of files which are missing in the tree by
+    pipelined SIZE/MDTM commands
+    """
+    files = [path for path, entry in tree.items() if not entry.is_dir]
+    no_size = [path for path in files if tree[path].size is None]
+    if no_size:
+        sizes = api.size_many([posixpath.join(root, p) for p in no_size])
+        for path in no_size:
+            size = sizes[posixpath.join(root, path)]
+            tree[path] = tree[path]._replace(size=size if size >= 0 else None)
+    no_modify = [path for path in files if tree[path].modify is None]
+    if no_modify:
+        times = api.modify_time_many(
+            [posixpath.join(root, p) for p in no_modify])
+        for path in no_modify:
+            tree[path] = tree[path]._replace(
+                modify=times[posixpath.join(root, path)])
+    return tree
+
+
+def local_tree(root: str) -> Dict[str, Entry]:
+    """Return entries of local directory tree keyed by the path relative to
+    "root" (with "/" as separator)
+    """
+    tree = {}
+    if not os.path.isdir(root):
+        return tree
+    directories = ['']
+    while directories:
+        directory = directories.pop()
+        with os.scandir(os.path.join(root, directory)) as entries:
+            for entry in entries:
+                path = posixpath.join(directory, entry.name)
+                info = entry.stat()
+                if entry.is_dir():
+                    tree[path] = Entry(entry.name, 'dir', None,
+                                       info.st_mtime, None)
+                    directories.append(path)
+                elif entry.is_file():
+                    tree[path] = Entry(entry.name, 'file', info.st_size,
+                                       info.st_mtime, None)
+    return tree
+
+
+def is_changed(source: Entry, target: Entry) -> bool:
+    """Check if the target file differs from the source one: sizes are
+    different or the source is newer. Unknown values aren't compared
+    """
+    if (source.size is not None and target.size is not None and
+            source.size != target.size):
+        return True
+    return (source.modify is not None and target.modify is not None and
+            source.modify > target.modify + MTIME_TOLERANCE)
+
+
+def make_plan(source: Dict[str, Entry], target: Dict[str, Entry],
+              transfer: str, delete=False) -> List[Action]:
+    """Return actions which make the target tree the same as the source one.
+    "transfer" is the kind of copying actions ("get" or "put"). If "delete"
+    is set entries which don't exist in the source are removed from the
+    target
+    """
+    plan = []
+    for path in sorted(source):
+        entry = source[path]
+        existing = target.get(path)
+        if entry.is_dir:
+            if existing is None or not existing.is_dir:
+                plan.append(Action('mkdir', path, None))
+        elif (existing is None or existing.is_dir or
+              is_changed(entry, existing)):
+            plan.append(Action(transfer, path, entry.size))
+
+    if delete:
+        # deepest entries first, so directories are empty when removed
+        for path in sorted(target, reverse=True):
+            if path not in source:
+                kind = 'rmdir' if target[path].is_dir else 'delete'
+                plan.append(Action(kind, path, None))
+    return plan
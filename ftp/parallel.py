@@ -0,0 +1,140 @@
+import sys
+import threading
+import time
+from queue import Empty, Full, Queue
+from typing import Callable, List, Tuple
+
+from .errors import ChecksumMismatch, WrongResponse
+from .ftp_api import FtpApi
+from .pool import FtpSessionPool
+
+
+class TransferStats:
+    """Aggregated results of transfers which are made by several workers
+    """
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.failures = []  # type: List[Tuple[str, Exception]]
+        self.start = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, size: int):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def fail(self, name: str, error: Exception):
+        with self._lock:
+            self.failures.append((name, error))
+
+    def __str__(self):
+        result_time = max(time.time() - self.start, 1e-6)
+        speed = round(self.bytes / (1024 ** 2) / result_time, 4)
+        return '{} files, {} bytes in {} secs ({} MB/s), {} failed'.format(
+            self.files, self.bytes, round(result_time, 2), speed,
+            len(self.failures))
+
+
+class TaskPool:
+    """Run tasks on "jobs" worker threads. Every worker checks out its own
+    session from the session pool. Task is a function which takes the
+    session as the first argument and returns amount of transferred bytes (or
+    None if nothing was transferred). Tasks may submit new tasks. The queue
+    is bounded: if it's full a task submitted by a worker is executed by this
+    worker immediately, so workers never wait for each other. If the "with"
+    block is left by an exception (e.g. KeyboardInterrupt) the pool is
+    cancelled: only the running tasks are finished
+    """
+    def __init__(self, pool: FtpSessionPool, jobs: int, queue_size=None):
+        self.pool = pool
+        self.jobs = max(1, jobs)
+        self.stats = TransferStats()
+        self._queue = Queue(queue_size or self.jobs * 4)
+        self._local = threading.local()
+        self._cancelled = threading.Event()
+        self._workers = []  # type: List[threading.Thread]
+
+    def __enter__(self):
+        for _ in range(self.jobs):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None:
+            self.cancel()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def submit(self, name: str, task: Callable, *args):
+        """Add task to the queue. "name" is used to report failures
+        """
+        if self._cancelled.is_set():
+            return
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            self._queue.put((name, task, args))
+            return
+        try:
+            self._queue.put_nowait((name, task, args))
+        except Full:
+            self._run(api, name, task, args)
+
+    def join(self):
+        """Wait until all submitted tasks are done
+        """
+        self._queue.join()
+
+    def cancel(self):
+        """Drop queued tasks and the tasks which will be submitted. Running
+        tasks aren't interrupted
+        """
+        self._cancelled.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                break
+            self._queue.task_done()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            if self._cancelled.is_set():
+                self._queue.task_done()
+                continue
+            name, task, args = item
+            try:
+                if getattr(self._local, 'api', None) is None:
+                    self._local.api = self.pool.acquire()
+            except Exception:
+                self.stats.fail(name, sys.exc_info()[1])
+            else:
+                self._run(self._local.api, name, task, args)
+            self._queue.task_done()
+
+        api = getattr(self._local, 'api', None)
+        if api is not None:
+            self.pool.release(api)
+
+    def _run(self, api: FtpApi, name: str, task: Callable, args: tuple):
+        try:
+            size = task(api, *args)
+        except (WrongResponse, ChecksumMismatch):
+            self.stats.fail(name, sys.exc_info()[1])
+        except Exception:
+            # the session may be broken in the middle of a transfer
+            self.stats.fail(name, sys.exc_info()[1])
+            if self._local.api is api:
+                self._local.api = None
+                self.pool.discard(api)
+        else:
+            if size is not None:
+                self.stats.add(size)
@@ -17,6 +17,33 @@ class Parser:
         parser.add_argument('--login',
                             help='login credentials (username:password)')
         parser.add_argument('--verbose', help='verbose', action="store_true")
+        parser.add_argument('--pool-min', type=int,
+                            default=config['POOL_MIN_SIZE'],
+                            help='amount of sessions to keep open')
+        parser.add_argument('--pool-max', type=int,
+                            default=config['POOL_MAX_SIZE'],
+                            help='maximum amount of parallel sessions')
+        parser.add_argument('--cache-ttl', type=float,
+                            default=config['CACHE_TTL'],
+                            help='keep listings and sizes for N seconds')
+        parser.add_argument('--compress', type=int, choices=range(10),
+                            default=config['COMPRESS_LEVEL'],
+                            metavar='LEVEL',
+                            help='compress transfers (MODE Z) with the '
+                                 'level 1-9 if the server supports it')
+        parser.add_argument('--no-progress', action='store_true',
+                            help="don't show progress of transfers")
+        parser.add_argument('--index', default=config['INDEX_PATH'],
+                            help='SQLite file of the remote trees index')
+        parser.add_argument('--keepalive', type=float,
+                            default=config['KEEPALIVE_INTERVAL'],
+                            metavar='SECONDS',
+                            help='send NOOP if the session is idle for N '
+                                 'seconds (0 turns it off)')
+        parser.add_argument('--verify', action='store_true',
+                            default=config['VERIFY_CHECKSUMS'],
+                            help='compare checksums of files after transfers '
+                                 'if the server can compute them')
 
         subparsers = parser.add_subparsers(title='commands to execute')
 
@@ -27,18 +54,49 @@ class Parser:
         parser_put.add_argument(
             'path2', nargs='?', default='.',
             help="remote file's path")
+        parser_put.add_argument('-r', action='store_true',
+                                help='recursive upload')
+        parser_put.add_argument('--jobs', type=int, default=1,
+                                help='upload directory by N sessions')
+        parser_put.add_argument('--resume', action='store_true',
+                                help='continue partially uploaded file')
         parser_put.set_defaults(func='put')
 
         parser_get = subparsers.add_parser(
             'get', help='download file from the server')
         parser_get.add_argument('-r', action='store_true',
                                 help='recursive download')
+        parser_get.add_argument('--segments', type=int, default=1,
+                                help='download file by N parallel ranges')
+        parser_get.add_argument('--jobs', type=int, default=1,
+                                help='download directory by N sessions')
+        parser_get.add_argument('--resume', action='store_true',
+                                help='continue partially downloaded file')
+        parser_get.add_argument('--skip-identical', action='store_true',
+                                help="don't download files with the same "
+                                     'checksum as the local ones')
         parser_get.add_argument('path1', help="remote file's path")
         parser_get.add_argument(
             'path2', nargs='?', default=config['DOWNLOAD_DEFAULT_PATH'],
             help="local file's path")
         parser_get.set_defaults(func='get')
 
+        parser_mirror = subparsers.add_parser(
+            'mirror', help='transfer only new and changed files')
+        parser_mirror.add_argument('-R', action='store_true',
+                                   help='mirror local directory to the server')
+        parser_mirror.add_argument('--delete', action='store_true',
+                                   help='remove files missing in the source')
+        parser_mirror.add_argument('--dry-run', action='store_true',
+                                   help='only show what would be done')
+        parser_mirror.add_argument('--jobs', type=int, default=1,
+                                   help='transfer files by N sessions')
+        parser_mirror.add_argument('path1', help="remote directory's path")
+        parser_mirror.add_argument(
+            'path2', nargs='?', default=config['DOWNLOAD_DEFAULT_PATH'],
+            help="local directory's path")
+        parser_mirror.set_defaults(func='mirror')
+
         parser_ls = subparsers.add_parser(
             'ls', help='show content of remote directory')
         parser_ls.add_argument('path', help="remote directory's path")
@@ -0,0 +1,211 @@
+import contextlib
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Generator
+
+from .errors import PoolTimeout, WrongResponse
+from .ftp_api import FtpApi
+
+TIMEOUT_CODE = 421
+
+
+class FtpSessionPool:
+    """Thread-safe pool of logged in sessions. Sessions are created by
+    "session_factory" and reused between checkouts. At least "min_size"
+    sessions are kept warm, at most "max_size" sessions are open at once.
+    Sessions which were idle for more than "check_after" seconds are checked
+    with NOOP before checkout, sessions which were idle for more than
+    "idle_timeout" seconds are closed (unless there are only min_size left).
+    "prepare" is called with every checked out session (e.g. to change its
+    working directory)
+    """
+    def __init__(self, session_factory: Callable[[], FtpApi], min_size=0,
+                 max_size=4, idle_timeout=60, check_after=15,
+                 prepare: Callable[[FtpApi], None] = None):
+        self.session_factory = session_factory
+        self.prepare = prepare
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+
+        self._idle = deque()  # (session, time of the last use)
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self.fill()
+
+    @property
+    def size(self) -> int:
+        """Amount of open sessions (idle and checked out)
+        """
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def fill(self):
+        """Open sessions until there are at least min_size of them
+        """
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            session = self._create()
+            self._put(session)
+
+    def resize(self, max_size: int):
+        with self._condition:
+            self.max_size = max(max_size, self.min_size, 1)
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def session(self, timeout=None) -> Generator[FtpApi, None, None]:
+        """Check out a session for the duration of the "with" block. If the
+        session is broken inside the block it's closed instead of returning
+        to the pool
+        """
+        session = self.acquire(timeout)
+        try:
+            yield session
+        except WrongResponse as e:
+            if e.response.code == TIMEOUT_CODE:
+                self.discard(session)
+            else:
+                self.release(session)
+            raise
+        except BaseException:
+            # the session may be in the middle of a transfer
+            self.discard(session)
+            raise
+        else:
+            self.release(session)
+
+    def acquire(self, timeout=None) -> FtpApi:
+        """Take a session from the pool or open a new one. Raises PoolTimeout
+        if max_size sessions are in use for more than "timeout" seconds
+        """
+        session = self._acquire(timeout)
+        if self.prepare is not None:
+            try:
+                self.prepare(session)
+            except WrongResponse:
+                self.release(session)
+                raise
+            except BaseException:
+                self.discard(session)
+                raise
+        return session
+
+    def _acquire(self, timeout=None) -> FtpApi:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.evict_idle()
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    left = (None if deadline is None
+                            else deadline - time.monotonic())
+                    if left is not None and left <= 0:
+                        raise PoolTimeout(
+                            'All {} sessions are in use'.format(self._size))
+                    self._condition.wait(left)
+                if self._idle:
+                    session, last_use = self._idle.pop()
+                else:
+                    self._size += 1
+                    session = last_use = None
+
+            if session is None:
+                return self._create()
+            if time.monotonic() - last_use < self.check_after:
+                return session
+            if self._check(session):
+                return session
+            self.discard(session)
+
+    def release(self, session: FtpApi):
+        """Return checked out session to the pool
+        """
+        with self._condition:
+            if not self._closed and self._size <= self.max_size:
+                self._idle.append((session, time.monotonic()))
+                self._condition.notify()
+                return
+        self.discard(session)
+
+    def discard(self, session: FtpApi):
+        """Close checked out session instead of returning it to the pool
+        """
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+        self._quit(session)
+
+    def evict_idle(self):
+        """Close sessions which were idle for more than idle_timeout seconds
+        """
+        evicted = []
+        now = time.monotonic()
+        with self._condition:
+            while (self._idle and self._size > self.min_size and
+                   now - self._idle[0][1] > self.idle_timeout):
+                evicted.append(self._idle.popleft()[0])
+                self._size -= 1
+        for session in evicted:
+            self._quit(session)
+
+    def close(self):
+        """Close all idle sessions. Sessions which are checked out are closed
+        when they're returned
+        """
+        with self._condition:
+            self._closed = True
+            sessions = [session for session, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(sessions)
+        for session in sessions:
+            self._quit(session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __str__(self):
+        return '{} sessions open ({} idle, {} in use), max {}'.format(
+            self._size, len(self._idle), self._size - len(self._idle),
+            self.max_size)
+
+    def _create(self) -> FtpApi:
+        try:
+            return self.session_factory()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def _put(self, session: FtpApi):
+        with self._condition:
+            self._idle.append((session, time.monotonic()))
+            self._condition.notify()
+
+    @staticmethod
+    def _check(session: FtpApi) -> bool:
+        try:
+            session.talker.run_command('NOOP', printin=False, printout=False)
+        except (WrongResponse, ConnectionError, socket.timeout):
+            return False
+        return True
+
+    @staticmethod
+    def _quit(session: FtpApi):
+        try:
+            session.quit()
+        except Exception:
+            session.talker.close_connection()
@@ -0,0 +1,128 @@
+import sys
+import threading
+import time
+from typing import List, Optional
+
+REFRESH_INTERVAL = 0.5  # seconds
+
+
+def _format_size(size: float) -> str:
+    return '{:.1f}MB'.format(size / 1024 ** 2)
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return '{}:{:02}:{:02}'.format(seconds // 3600, seconds // 60 % 60,
+                                   seconds % 60)
+
+
+class TransferProgress:
+    """Progress of one transfer. "update" is called from the transfer loop,
+    it only adds the amount of bytes, everything else is done by the reporter
+    """
+    __slots__ = ('name', 'total', 'done', 'start', '_last_done',
+                 '_last_time')
+
+    def __init__(self, name: str, total: Optional[int]):
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.start = self._last_time = time.monotonic()
+        self._last_done = 0
+
+    def update(self, size: int):
+        self.done += size
+
+    def render(self, now: float) -> str:
+        done = self.done
+        speed = (done - self._last_done) / max(now - self._last_time, 1e-6)
+        average = done / max(now - self.start, 1e-6)
+        self._last_done, self._last_time = done, now
+
+        parts = [self.name] if self.name else []
+        if self.total:
+            parts.append('{}%'.format(min(100, done * 100 // self.total)))
+        else:
+            parts.append(_format_size(done))
+        parts.append('{}/s (avg {}/s)'.format(_format_size(speed),
+                                              _format_size(average)))
+        if self.total and average > 0:
+            parts.append('ETA {}'.format(
+                _format_eta(max(0, self.total - done) / average)))
+        return ' '.join(parts)
+
+
+class ProgressReporter:
+    """Shows progress of active transfers in one terminal line. The line is
+    redrawn by a background thread every "interval" seconds, so terminal
+    writes don't slow down transfers. It's disabled if the stream isn't a
+    terminal (unless "enabled" is set explicitly). The stream is sys.stdout
+    at the moment of writing by default
+    """
+    def __init__(self, stream=None, interval=REFRESH_INTERVAL, enabled=None):
+        self._stream = stream
+        self.interval = interval
+        self.enabled = enabled  # type: Optional[bool]
+        self._transfers = []  # type: List[TransferProgress]
+        self._line_width = 0
+        self._lock = threading.Lock()
+        self._thread = None  # type: threading.Thread
+
+    @property
+    def stream(self):
+        return self._stream or sys.stdout
+
+    @property
+    def active(self) -> bool:
+        if self.enabled is not None:
+            return self.enabled
+        isatty = getattr(self.stream, 'isatty', None)
+        return bool(isatty and isatty())
+
+    def start(self, name='', total=None) -> Optional[TransferProgress]:
+        """Register new transfer. Returns None if progress is disabled
+        """
+        if not self.active:
+            return None
+        transfer = TransferProgress(name, total)
+        with self._lock:
+            self._transfers.append(transfer)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+        return transfer
+
+    def finish(self, transfer: Optional[TransferProgress]):
+        if transfer is None:
+            return
+        with self._lock:
+            if transfer in self._transfers:
+                self._transfers.remove(transfer)
+            if not self._transfers:
+                self._write('')
+
+    def _write(self, line: str):
+        """Redraw the progress line. Must be called with the lock held
+        """
+        if not line and not self._line_width:
+            return
+        padding = ' ' * max(0, self._line_width - len(line))
+        self.stream.write('\r' + line + padding + ('\r' if not line else ''))
+        self.stream.flush()
+        self._line_width = len(line)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._transfers:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                self._write(' | '.join(transfer.render(now)
+                                       for transfer in self._transfers))
+
+
+# reporter which is used by sessions by default
+default_reporter = ProgressReporter()
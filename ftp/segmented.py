@@ -0,0 +1,141 @@
+import os
+import threading
+from typing import List
+
+from .ftp_api import FtpApi
+from .pool import FtpSessionPool
+
+
+def split_ranges(size: int, segments: int) -> List[tuple]:
+    """Split "size" bytes into at most "segments" ranges (offset, length)
+    """
+    segments = max(1, min(segments, size))
+    length = size // segments
+    ranges = []
+    for i in range(segments):
+        offset = i * length
+        if i == segments - 1:
+            length = size - offset
+        ranges.append((offset, length))
+    return ranges
+
+
+def preallocate(fd: int, size: int):
+    """Reserve disk space for the file if the platform supports it
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        pass
+
+
+class LocalFile:
+    """Local file which is written by several threads with os.pwrite. It's
+    created (and preallocated) when the first data arrives, so a failed
+    download doesn't destroy the existing copy
+    """
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self.fd = None  # type: int
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            if self.fd is None:
+                self.fd = os.open(self.path,
+                                  os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                                  0o666)
+                preallocate(self.fd, self.size)
+
+    def pwrite(self, data: bytes, position: int) -> int:
+        if self.fd is None:
+            self.open()
+        return os.pwrite(self.fd, data, position)
+
+    def truncate(self, size: int):
+        if self.fd is not None:
+            os.ftruncate(self.fd, size)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def download_segmented(api: FtpApi, pool: FtpSessionPool, remote_path: str,
+                       local_path: str, segments: int) -> int:
+    """Download remote file over several sessions from the pool. Every
+    session retrieves its own byte range (REST + RETR) and writes it with
+    os.pwrite into the preallocated local file. If the size is unknown or the
+    server doesn't support REST the file is downloaded over the single stream
+    of "api". Returns amount of received bytes
+    """
+    file_size = api.try_get_size(remote_path)
+    file = LocalFile(local_path, file_size)
+    try:
+        if (segments <= 1 or file_size <= 0 or
+                'REST STREAM' not in api.features()):
+            return _download_stream(api, remote_path, file, file_size)
+
+        errors = []
+        ranges = split_ranges(file_size, segments)
+        # end of the written data of every segment
+        positions = {offset: offset for offset, _ in ranges}
+
+        def download_range(offset, length):
+            try:
+                with pool.session() as session:
+                    position = offset
+                    for chunk in session._retrieve_range(
+                            remote_path, offset, length):
+                        position += file.pwrite(chunk, position)
+                        positions[offset] = position
+                if position != offset + length:
+                    raise ConnectionError(
+                        'Segment {}-{} is incomplete'.format(
+                            offset, offset + length))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=download_range, args=r)
+                   for r in ranges]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            # keep only the received beginning of the file, so the holes
+            # aren't taken for data by resume
+            file.truncate(_received_prefix(ranges, positions))
+            raise errors[0]
+        return file_size
+    finally:
+        file.close()
+
+
+def _received_prefix(ranges: List[tuple], positions: dict) -> int:
+    """Return length of the beginning of the file which was received
+    without gaps
+    """
+    end = 0
+    for offset, length in ranges:
+        end = positions[offset]
+        if end != offset + length:
+            break
+    return end
+
+
+def _download_stream(api: FtpApi, remote_path: str, file: LocalFile,
+                     file_size: int) -> int:
+    position = 0
+    try:
+        for chunk in api._retrieve(remote_path, file_size):
+            position += file.pwrite(chunk, position)
+    finally:
+        # the preallocated tail of an interrupted transfer isn't data
+        file.truncate(position)
+    file.open()
+    return position
@@ -0,0 +1,19 @@
+class SessionState:
+    """State of the control connection which is known to the client:
+    transfer type, transfer mode (stream "S" or compressed "Z"), working
+    directory (relative to the login directory) and logged in user. None
+    means that the value is unknown. "commands_saved" counts commands which
+    weren't sent because they wouldn't change anything
+    """
+    def __init__(self):
+        self.transfer_type = None
+        self.transfer_mode = 'S'
+        self.cwd = ''
+        self.user = None
+        self.commands_saved = 0
+
+    def __str__(self):
+        return ('type: {}, mode: {}, cwd: {}, user: {}, '
+                'commands saved: {}').format(
+            self.transfer_type, self.transfer_mode, self.cwd or '.',
+            self.user, self.commands_saved)
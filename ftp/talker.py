@@ -1,43 +1,99 @@
+import io
 import re
 import socket
-from typing import Generator
+import time
+from typing import Callable, Generator, Iterable, List, Sequence, Union
 
 from .errors import WrongResponse
+from .progress import default_reporter
 from .response import Response
+from .session import SessionState
 
 BUFFER_SIZE = 1024 ** 2 * 20  # 20MB
+CONTROL_BUFFER_SIZE = 8192
+UPLOAD_BLOCK_SIZE = 1024 ** 2 * 8  # 8MB
+PIPELINE_WINDOW = 32
 TIMEOUT = 60
 DATA_SOCK_TIMEOUT = 15
 RESP_REGEX = re.compile(r'^(?P<code>\d+?)(?P<delimeter> |-)(?P<message>.+)$')
+PASV_REGEX = re.compile(r'\((\d+,\d+,\d+,\d+),(\d+),(\d+)\)')
+EPSV_REGEX = re.compile(r'\((.)\1\1(\d+)\1\)')
+# replies to EPSV/EPRT which mean that the server doesn't support them
+UNSUPPORTED_CODES = (500, 501, 502, 522)
+LISTEN_BACKLOG = 1
 
 
 class Talker:
     def __init__(self, host, port, callback=print, verbose_input=True,
                  verbose_output=False):
+        self.host = host
+        self.port = port
         self.passive_mode = False  # type: bool
+        self.state = SessionState()
 
         self.callback = callback
         self.verbose_input = verbose_input
         self.verbose_output = verbose_output
+        # instrumentation: every listener is called as listener(event,
+        # fields), see metrics.Metrics for the list of events
+        self.listeners = []  # type: List[Callable[[str, dict], None]]
+        self.progress = default_reporter
 
-        self._command_socket = socket.socket(socket.AF_INET,
+        self._control_buffer = bytearray()
+        self._data_buffer = bytearray()
+        # EPSV/EPRT are used until the server rejects them
+        self._use_epsv = True
+        self._use_eprt = True
+        self._local_address = None  # type: str
+        # listener of active mode is reused by transfers unless the previous
+        # transfer didn't accept its connection
+        self._listener = None  # type: socket.socket
+        self._listener_used = True
+        self._family = (socket.AF_INET6 if ':' in str(host)
+                        else socket.AF_INET)
+        self._command_socket = socket.socket(self._family,
                                              socket.SOCK_STREAM)
         self._command_socket.settimeout(TIMEOUT)
         self._command_socket.connect((host, port))
 
     def close_connection(self):
+        self._close_listener()
         self._command_socket.close()
 
+    def _close_listener(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def _emit(self, event: str, **fields):
+        for listener in self.listeners:
+            listener(event, fields)
+
     def _read_line(self) -> str:
-        """Read from the command socket
+        """Read one line from the command socket. Data is received by blocks
+        of CONTROL_BUFFER_SIZE bytes and kept in the buffer until the next call
         """
-        res = bytearray()
+        buffer = self._control_buffer
+        start = 0
         while True:
-            byte = self._command_socket.recv(1)
-            if byte in (b'\n', b''):
+            end = buffer.find(b'\n', start)
+            if end != -1:
+                break
+            start = len(buffer)
+            block = self._command_socket.recv(CONTROL_BUFFER_SIZE)
+            if not block:
+                if not buffer:
+                    raise ConnectionAbortedError(
+                        'Connection was closed by the server')
+                end = len(buffer)
                 break
-            res += byte
-        return res[:-1].decode(errors='ignore')
+            buffer += block
+
+        line = bytes(buffer[:end])
+        del buffer[:end + 1]
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        return line.decode(errors='ignore')
 
     def _get_response(self) -> Response:
         """Get response from the server.
@@ -53,6 +109,15 @@ class Talker:
                 if match.group('delimeter') == ' ':
                     return Response(int(match.group('code')), '\n'.join(lines))
 
+    def _end_transfer(self) -> Response:
+        """Get the reply which ends the transfer. WrongResponse is raised if
+        the transfer failed (e.g. 426, 451, 552)
+        """
+        result = self._get_response()
+        if not result.success:
+            raise WrongResponse(result)
+        return result
+
     def _send_message(self, message: str):
         """Send message to the server.
         """
@@ -61,71 +126,184 @@ class Talker:
     def _open_data_connection(self):
         """Open connection to retrieve and send data to the server.
         Connection can be open in two modes: passive and active
-        (depending on "passive_mode" flag)
+        (depending on "passive_mode" flag). EPSV/EPRT are preferred, PASV/PORT
+        are used if the server doesn't support them
         """
-        self._data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._data_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self._data_socket.settimeout(DATA_SOCK_TIMEOUT)
-
+        start = time.perf_counter()
         if self.passive_mode:
-            regex = re.compile(r'\((\d+,\d+,\d+,\d+),(\d+),(\d+)\)')
-            res = self.run_command('PASV')
-            match = regex.search(res.message)
-            if not match:
-                raise WrongResponse(res)
-            ip = ''.join(map(lambda x: '.' if x == ',' else x, match.group(1)))
-            port = 256 * int(match.group(2)) + int(match.group(3))
-            self._data_socket.connect((ip, port))
+            address = self._passive_address()
+            self._data_socket = socket.socket(self._family,
+                                              socket.SOCK_STREAM)
+            self._data_socket.settimeout(DATA_SOCK_TIMEOUT)
+            self._data_socket.connect(address)
         else:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("google.com", 80))
-            local_ip = ''.join(map(
-                lambda x: ',' if x == '.' else x,
-                s.getsockname()[0]))
-            local_port = int(s.getsockname()[1])
-
-            self.run_command(
-                'PORT',
-                '{},{},{}'.format(
-                    local_ip, local_port // 256, local_port % 256))
-            self._data_socket.bind(('', local_port))
-            self._data_socket.listen(100)
+            self._send_active_address()
+        if self.listeners:
+            self._emit('data_connection',
+                       mode='passive' if self.passive_mode else 'active',
+                       latency=time.perf_counter() - start)
+
+    def _passive_address(self):
+        """Ask the server to listen for the data connection (EPSV or PASV)
+        and return its address
+        """
+        res = None
+        if self._use_epsv:
+            try:
+                res = self.run_command('EPSV')
+            except WrongResponse as e:
+                if e.response.code not in UNSUPPORTED_CODES:
+                    raise
+                self._use_epsv = False
+        if res is None:
+            res = self.run_command('PASV')
+
+        match = EPSV_REGEX.search(res.message)
+        if match:
+            return (self._command_socket.getpeername()[0],
+                    int(match.group(2)))
+        match = PASV_REGEX.search(res.message)
+        if not match:
+            raise WrongResponse(res)
+        return (match.group(1).replace(',', '.'),
+                256 * int(match.group(2)) + int(match.group(3)))
+
+    def _send_active_address(self):
+        """Listen for the data connection and send the address to the
+        server (EPRT or PORT). Local address is taken from the control
+        connection once
+        """
+        if self._local_address is None:
+            self._local_address = self._command_socket.getsockname()[0]
+        if not self._listener_used:
+            # the server could connect to it after the command had failed
+            self._close_listener()
+        if self._listener is None:
+            self._listener = socket.socket(self._family, socket.SOCK_STREAM)
+            self._listener.settimeout(DATA_SOCK_TIMEOUT)
+            self._listener.bind((self._local_address, 0))
+            self._listener.listen(LISTEN_BACKLOG)
+        self._listener_used = False
+        port = self._listener.getsockname()[1]
+
+        if self._use_eprt:
+            try:
+                self.run_command('EPRT', '|{}|{}|{}|'.format(
+                    2 if self._family == socket.AF_INET6 else 1,
+                    self._local_address, port))
+                return
+            except WrongResponse as e:
+                if e.response.code not in UNSUPPORTED_CODES:
+                    raise
+                self._use_eprt = False
+        self.run_command('PORT', '{},{},{}'.format(
+            self._local_address.replace('.', ','), port // 256, port % 256))
+
+    def _accept_data_connection(self) -> socket.socket:
+        """Return the data connection: the connected socket in passive mode
+        or the accepted connection in active mode
+        """
+        if self.passive_mode:
+            return self._data_socket
+        conn = self._listener.accept()[0]
+        conn.settimeout(DATA_SOCK_TIMEOUT)
+        self._listener_used = True
+        return conn
 
     def _read_data(self, data_size=None, buffer_size=BUFFER_SIZE,
-                   show_progress=False) -> Generator[bytes, None, None]:
-        """Get data from data connection socket. The amount of data can't be
-        bigger than MAX_SIZE
+                   show_progress=False,
+                   name='') -> Generator[memoryview, None, None]:
+        """Get data from data connection socket. Data is received into the
+        buffer which is reused between chunks, so every yielded chunk is valid
+        only until the next one is requested. Progress is reported to
+        "self.progress" under the "name"
         """
         downloaded_size = 0
-        if self.passive_mode:
-            sock = self._data_socket
-        else:
-            sock = self._data_socket.accept()[0]
-            sock.settimeout(DATA_SOCK_TIMEOUT)
+        start = time.perf_counter()
+        sock = self._accept_data_connection()
 
-        while True:
-            chunk = sock.recv(buffer_size)
-            downloaded_size += len(chunk)
-            yield chunk
-            if show_progress:
-                if data_size is None:
-                    print('{}MB'.format(downloaded_size // 1024 >> 10),
-                          end='\r')
-                else:
-                    percents = str(round(downloaded_size / data_size * 100))
-                    print(percents + '%', end='\r')
-            if chunk == b'':
-                break
+        if len(self._data_buffer) < buffer_size:
+            self._data_buffer = bytearray(buffer_size)
+        view = memoryview(self._data_buffer)[:buffer_size]
+        progress = (self.progress.start(name, data_size)
+                    if show_progress else None)
+        try:
+            while True:
+                size = sock.recv_into(view)
+                if size == 0:
+                    break
+                downloaded_size += size
+                yield view[:size]
+                if progress is not None:
+                    progress.update(size)
+        finally:
+            view.release()
+            sock.close()
+            self.progress.finish(progress)
+            if self.listeners:
+                self._emit('transfer', direction='received',
+                           size=downloaded_size,
+                           seconds=time.perf_counter() - start)
 
-    def _send_data(self, data: bytes):
-        """Send data via data connection socket
+    def _send_data(self, data: Union[bytes, io.IOBase, Iterable[bytes]],
+                   data_size=None, show_progress=False, name='') -> int:
+        """Send data via data connection socket. Data can be bytes, binary
+        file object or iterable of chunks. Files are sent by blocks so memory
+        usage doesn't depend on the file size. Returns amount of sent bytes
         """
-        if self.passive_mode:
-            conn = self._data_socket
-        else:
-            conn, _ = self._data_socket.accept()
-        conn.sendall(data)
-        conn.close()
+        start = time.perf_counter()
+        conn = self._accept_data_connection()
+
+        sent_size = 0
+        progress = (self.progress.start(name, data_size)
+                    if show_progress else None)
+        try:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                conn.sendall(data)
+                sent_size = len(data)
+            elif isinstance(data, io.IOBase):
+                for size in self._send_file(conn, data):
+                    sent_size += size
+                    if progress is not None:
+                        progress.update(size)
+            else:
+                for chunk in data:
+                    conn.sendall(chunk)
+                    sent_size += len(chunk)
+                    if progress is not None:
+                        progress.update(len(chunk))
+        finally:
+            conn.close()
+            self.progress.finish(progress)
+            if self.listeners:
+                self._emit('transfer', direction='sent', size=sent_size,
+                           seconds=time.perf_counter() - start)
+        return sent_size
+
+    @staticmethod
+    def _send_file(conn: socket.socket,
+                   file: io.IOBase) -> Generator[int, None, None]:
+        """Send file by blocks of UPLOAD_BLOCK_SIZE bytes. Regular files are
+        sent with socket.sendfile (os.sendfile on Linux, so data doesn't pass
+        through user space), other file objects are read block by block
+        """
+        try:
+            file.fileno()
+        except (AttributeError, OSError):
+            while True:
+                block = file.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    return
+                conn.sendall(block)
+                yield len(block)
+
+        offset = file.tell()
+        while True:
+            size = conn.sendfile(file, offset, UPLOAD_BLOCK_SIZE)
+            if size == 0:
+                return
+            offset += size
+            yield size
 
     def run_command(self, command: str, *args, printin=None,
                     printout=None) -> Response:
@@ -142,8 +320,11 @@ class Talker:
         if printout is None:
             printout = self.verbose_output
 
+        start = time.perf_counter()
         if message is not None:
             self._send_message(message)
+            if self.listeners:
+                self._emit('command', command=command)
             if printout:
                 if command == 'PASS':
                     self.callback('>> PASS XXXX')
@@ -151,8 +332,56 @@ class Talker:
                     self.callback('>> {}'.format(message))
 
         result = self._get_response()
+        if self.listeners:
+            self._emit('reply', command=command, code=result.code,
+                       latency=time.perf_counter() - start)
         if not result.success:
             raise WrongResponse(result)
         if printin:
             self.callback('<< {}'.format(result))
         return result
+
+    def run_pipelined(
+            self, commands: Sequence[Sequence[str]], window=PIPELINE_WINDOW,
+            printin=None, printout=None
+    ) -> List[Union[Response, WrongResponse]]:
+        """Send commands without waiting for the responses: up to "window"
+        commands are in flight at once. Commands are tuples (<command>,
+        <arg>, ...) which must get exactly one reply each (e.g. SIZE, MDTM,
+        DELE). Returns list of responses in the order of commands; failed
+        commands get WrongResponse instead of raising it
+        """
+        if printin is None:
+            printin = self.verbose_input
+        if printout is None:
+            printout = self.verbose_output
+
+        messages = [' '.join(command) for command in commands]
+        results = []  # type: List[Union[Response, WrongResponse]]
+        sent_times = []  # type: List[float]
+        sent = 0
+        while len(results) < len(messages):
+            # keep the window full: send everything which fits in one write
+            batch = messages[sent:len(results) + window]
+            if batch:
+                self._command_socket.sendall(
+                    ''.join(m + '\r\n' for m in batch).encode('utf-8'))
+                sent_times.extend([time.perf_counter()] * len(batch))
+                for command in commands[sent:sent + len(batch)]:
+                    self._emit('command', command=command[0])
+                sent += len(batch)
+                if printout:
+                    for message in batch:
+                        self.callback('>> {}'.format(message))
+
+            result = self._get_response()
+            if self.listeners:
+                self._emit('reply', command=commands[len(results)][0],
+                           code=result.code,
+                           latency=time.perf_counter() -
+                           sent_times[len(results)])
+            if printin:
+                self.callback('<< {}'.format(result))
+            results.append(result if result.success
+                           else WrongResponse(result))
+        return results
@@ -0,0 +1,104 @@
+import posixpath
+import threading
+from queue import Full, Queue
+from typing import Dict, Generator, Iterable, List, Tuple
+
+from .listing import Entry
+from .parallel import TaskPool
+from .pool import FtpSessionPool
+
+WALK_QUEUE_SIZE = 1024
+
+
+def normalize_root(root: str) -> str:
+    """Remove trailing slashes, the working directory is ""
+    """
+    root = root.rstrip('/') or root
+    return '' if root == '.' else root
+
+
+class Walker:
+    """Lists remote directory tree by several sessions concurrently. At most
+    "frontier" directories wait in the queue, the rest are listed by the
+    worker which found them (see TaskPool). Entries are yielded as soon as
+    they are found, directories which couldn't be listed are in "failures"
+    after the walk
+    """
+    def __init__(self, pool: FtpSessionPool, jobs=4, frontier=None):
+        self.pool = pool
+        self.jobs = jobs
+        self.frontier = frontier
+        self.directories = 0
+        self.failures = []  # type: List[Tuple[str, Exception]]
+
+    def walk(self, root='') -> Generator[Tuple[str, Entry], None, None]:
+        """Yield (<path>, <entry>) for every entry inside the root directory
+        in the order they are found. Paths are joined with the root
+        """
+        root = normalize_root(root)
+        output = Queue(WALK_QUEUE_SIZE)
+        cancelled = threading.Event()
+        done = object()
+        lock = threading.Lock()
+
+        def put(item):
+            # the consumer may stop the walk while the queue is full
+            while not cancelled.is_set():
+                try:
+                    output.put(item, timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        def list_directory(api, path):
+            if cancelled.is_set():
+                return
+            entries = api.list_entries(path)
+            with lock:
+                self.directories += 1
+            for entry in entries:
+                entry_path = posixpath.join(path, entry.name)
+                put((entry_path, entry))
+                if entry.is_dir:
+                    tasks.submit(entry_path, list_directory, entry_path)
+
+        def run():
+            tasks.submit(root, list_directory, root)
+            tasks.join()
+            put(done)
+
+        with TaskPool(self.pool, self.jobs, self.frontier) as tasks:
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            try:
+                while True:
+                    item = output.get()
+                    if item is done:
+                        break
+                    yield item
+            finally:
+                cancelled.set()
+                thread.join()
+        self.failures = tasks.stats.failures
+
+
+def aggregate_sizes(entries: Iterable[Tuple[str, Entry]],
+                    root='') -> Dict[str, List[int]]:
+    """Return [<amount of files>, <total size>] of every directory of the
+    tree (including the root) keyed by path. Unknown sizes count as 0
+    """
+    root = normalize_root(root)
+    totals = {root: [0, 0]}
+    for path, entry in entries:
+        if entry.is_dir:
+            totals.setdefault(path, [0, 0])
+            continue
+        directory = posixpath.dirname(path)
+        while True:
+            total = totals.setdefault(directory, [0, 0])
+            total[0] += 1
+            total[1] += entry.size or 0
+            if directory == root or directory == posixpath.dirname(directory):
+                break
+            directory = posixpath.dirname(directory)
+    return totals
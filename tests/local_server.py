@@ -0,0 +1,343 @@
+"""Minimal FTP server which serves a local directory on the loopback
+interface. It's used by the tests and the benchmarks as a stand-in for a real
+server
+"""
+import hashlib
+import os
+import posixpath
+import shutil
+import socket
+import socketserver
+import stat
+import threading
+import time
+import zlib
+
+
+class FtpHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        # replies are written by several small writes (e.g. "150" and "226"
+        # around a transfer), Nagle's algorithm would delay them until the
+        # client's delayed ACK
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.cwd = '/'
+        self.data_listener = None
+        self.data_address = None
+        self.rest = 0
+        self.mode = 'S'
+        self.level = 6
+        self.hash = 'SHA-1'
+        self.rename_from = None
+        self.user = None
+
+    def handle(self):
+        self.reply(220, 'Local FTP server ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            line = line.decode(errors='ignore').rstrip('\r\n')
+            command, _, arg = line.partition(' ')
+            command = command.upper()
+            self.server.commands.append(command)
+            handler = getattr(self, 'ftp_' + command, None)
+            if handler is None:
+                self.reply(502, 'Command not implemented')
+                continue
+            try:
+                handler(arg)
+            except OSError as e:
+                self.reply(550, str(e))
+            if command == 'QUIT':
+                break
+        if self.data_listener is not None:
+            self.data_listener.close()
+
+    def reply(self, code: int, message: str):
+        lines = message.split('\n')
+        data = ''.join(
+            (line if line.startswith(' ') else '{}-{}'.format(code, line)) +
+            '\r\n' for line in lines[:-1])
+        data += '{} {}\r\n'.format(code, lines[-1])
+        self.wfile.write(data.encode())
+
+    def real_path(self, path: str) -> str:
+        virtual = posixpath.normpath(posixpath.join(self.cwd, path or '.'))
+        return os.path.join(self.server.root, virtual.lstrip('/'))
+
+    def open_data_connection(self) -> socket.socket:
+        if self.data_listener is not None:
+            conn = self.data_listener.accept()[0]
+            self.data_listener.close()
+            self.data_listener = None
+        else:
+            conn = socket.create_connection(self.data_address)
+        return conn
+
+    def ftp_USER(self, arg):
+        # the new user starts in the login directory
+        self.user = arg
+        self.cwd = '/'
+        self.reply(331, 'Please specify the password.')
+
+    def ftp_PASS(self, arg):
+        self.reply(230, 'Login successful.')
+
+    def ftp_SYST(self, arg):
+        self.reply(215, 'UNIX Type: L8')
+
+    def ftp_NOOP(self, arg):
+        self.reply(200, 'NOOP ok.')
+
+    def ftp_QUIT(self, arg):
+        self.reply(221, 'Goodbye.')
+
+    def ftp_FEAT(self, arg):
+        features = ['Features:'] + [' ' + f for f in self.server.features]
+        self.reply(211, '\n'.join(features + ['End']))
+
+    def ftp_TYPE(self, arg):
+        self.reply(200, 'Type set to {}.'.format(arg))
+
+    def ftp_MODE(self, arg):
+        arg = arg.upper()
+        if arg == 'S' or (arg == 'Z' and 'MODE Z' in self.server.features):
+            self.mode = arg
+            self.reply(200, 'Mode set to {}.'.format(arg))
+        else:
+            self.reply(504, 'Bad MODE command.')
+
+    def ftp_OPTS(self, arg):
+        words = arg.upper().split()
+        if words[:1] == ['HASH'] and len(words) == 2:
+            self.hash = words[1]
+            self.reply(200, words[1])
+            return
+        if words[:3] != ['MODE', 'Z', 'LEVEL'] or len(words) != 4:
+            self.reply(501, 'Option not understood.')
+            return
+        self.level = int(words[3])
+        self.reply(200, 'MODE Z LEVEL set to {}.'.format(self.level))
+
+    def ftp_PWD(self, arg):
+        self.reply(257, '"{}" is the current directory'.format(self.cwd))
+
+    def ftp_CWD(self, arg):
+        if not os.path.isdir(self.real_path(arg)):
+            self.reply(550, 'Failed to change directory.')
+            return
+        self.cwd = posixpath.normpath(posixpath.join(self.cwd, arg))
+        self.reply(250, 'Directory successfully changed.')
+
+    def ftp_SIZE(self, arg):
+        path = self.real_path(arg)
+        if not os.path.isfile(path):
+            self.reply(550, 'Could not get file size.')
+            return
+        self.reply(213, str(os.path.getsize(path)))
+
+    def ftp_MDTM(self, arg):
+        path = self.real_path(arg)
+        if not os.path.isfile(path):
+            self.reply(550, 'Could not get file modification time.')
+            return
+        self.reply(213, time.strftime(
+            '%Y%m%d%H%M%S', time.gmtime(os.path.getmtime(path))))
+
+    def file_digest(self, arg, algorithm):
+        with open(self.real_path(arg), 'rb') as file:
+            data = file.read()
+        if algorithm == 'CRC32':
+            # without leading zeros like some servers do
+            return '{:X}'.format(zlib.crc32(data))
+        return hashlib.new(algorithm.replace('-', '').lower(),
+                           data).hexdigest()
+
+    def ftp_HASH(self, arg):
+        if not os.path.isfile(self.real_path(arg)):
+            self.reply(550, 'No such file.')
+            return
+        self.reply(213, '{} 0-{} {} {}'.format(
+            self.hash, os.path.getsize(self.real_path(arg)),
+            self.file_digest(arg, self.hash), arg))
+
+    def ftp_XMD5(self, arg):
+        self.reply(250, self.file_digest(arg, 'MD5'))
+
+    def ftp_XSHA1(self, arg):
+        self.reply(250, self.file_digest(arg, 'SHA-1'))
+
+    def ftp_XCRC(self, arg):
+        self.reply(250, self.file_digest(arg, 'CRC32'))
+
+    def ftp_PASV(self, arg):
+        self.data_listener = socket.socket()
+        self.data_listener.bind(('127.0.0.1', 0))
+        self.data_listener.listen(1)
+        port = self.data_listener.getsockname()[1]
+        self.reply(227, 'Entering Passive Mode (127,0,0,1,{},{}).'.format(
+            port // 256, port % 256))
+
+    def ftp_EPSV(self, arg):
+        self.data_listener = socket.socket()
+        self.data_listener.bind(('127.0.0.1', 0))
+        self.data_listener.listen(1)
+        self.reply(229, 'Entering Extended Passive Mode (|||{}|).'.format(
+            self.data_listener.getsockname()[1]))
+
+    def ftp_EPRT(self, arg):
+        _, protocol, host, port, _ = arg.split(arg[0])
+        if protocol != '1':
+            self.reply(522, 'Network protocol not supported, use (1)')
+            return
+        self.data_address = (host, int(port))
+        self.reply(200, 'EPRT command successful.')
+
+    def ftp_PORT(self, arg):
+        numbers = arg.split(',')
+        self.data_address = ('.'.join(numbers[:4]),
+                             int(numbers[4]) * 256 + int(numbers[5]))
+        self.reply(200, 'PORT command successful.')
+
+    def ftp_REST(self, arg):
+        self.rest = int(arg)
+        self.reply(350, 'Restart position accepted ({}).'.format(arg))
+
+    def ftp_LIST(self, arg):
+        path = self.real_path(arg)
+        names = sorted(os.listdir(path)) if os.path.isdir(path) else []
+        lines = []
+        for name in names:
+            info = os.stat(os.path.join(path, name))
+            lines.append('{}rw-r--r--   1 ftp ftp {:>12} {} {}\r\n'.format(
+                'd' if stat.S_ISDIR(info.st_mode) else '-', info.st_size,
+                time.strftime('%b %d %H:%M', time.gmtime(info.st_mtime)),
+                name))
+        self.reply(150, 'Here comes the directory listing.')
+        with self.open_data_connection() as conn:
+            conn.sendall(''.join(lines).encode())
+        self.reply(226, 'Directory send OK.')
+
+    def mlsd_facts(self, path: str) -> str:
+        info = os.stat(path)
+        is_dir = stat.S_ISDIR(info.st_mode)
+        return 'type={};size={};modify={};perm={};'.format(
+            'dir' if is_dir else 'file', info.st_size,
+            time.strftime('%Y%m%d%H%M%S', time.gmtime(info.st_mtime)),
+            'flcdmpe' if is_dir else 'adfrw')
+
+    def ftp_MLSD(self, arg):
+        path = self.real_path(arg)
+        if not os.path.isdir(path):
+            self.reply(550, 'Failed to list directory.')
+            return
+        lines = ['type=cdir; .\r\n']
+        for name in sorted(os.listdir(path)):
+            lines.append('{} {}\r\n'.format(
+                self.mlsd_facts(os.path.join(path, name)), name))
+        self.reply(150, 'Here comes the directory listing.')
+        with self.open_data_connection() as conn:
+            conn.sendall(''.join(lines).encode())
+        self.reply(226, 'Directory send OK.')
+
+    def ftp_MLST(self, arg):
+        path = self.real_path(arg)
+        if not os.path.exists(path):
+            self.reply(550, 'No such file.')
+            return
+        self.reply(250, 'Listing {}\n {} {}\nEnd'.format(
+            arg, self.mlsd_facts(path), arg))
+
+    def ftp_RETR(self, arg):
+        path = self.real_path(arg)
+        if not os.path.isfile(path):
+            self.reply(550, 'Failed to open file.')
+            return
+        offset, self.rest = self.rest, 0
+        self.reply(150, 'Opening BINARY mode data connection.')
+        with open(path, 'rb') as file, self.open_data_connection() as conn:
+            try:
+                if self.mode == 'Z':
+                    file.seek(offset)
+                    conn.sendall(zlib.compress(file.read(), self.level))
+                else:
+                    conn.sendfile(file, offset)
+            except ConnectionError:
+                self.reply(426, 'Failure writing network stream.')
+                return
+        self.reply(226, 'Transfer complete.')
+
+    def _store(self, arg, mode):
+        path = self.real_path(arg)
+        offset, self.rest = self.rest, 0
+        self.reply(150, 'Ok to send data.')
+        with open(path, mode) as file, self.open_data_connection() as conn:
+            if offset:
+                file.seek(offset)
+                file.truncate()
+            decompressor = zlib.decompressobj() if self.mode == 'Z' else None
+            while True:
+                chunk = conn.recv(1024 ** 2)
+                if not chunk:
+                    break
+                if decompressor is not None:
+                    chunk = decompressor.decompress(chunk)
+                file.write(chunk)
+        self.reply(226, 'Transfer complete.')
+
+    def ftp_STOR(self, arg):
+        self._store(arg, 'r+b' if self.rest else 'wb')
+
+    def ftp_APPE(self, arg):
+        self._store(arg, 'ab')
+
+    def ftp_DELE(self, arg):
+        os.remove(self.real_path(arg))
+        self.reply(250, 'Delete operation successful.')
+
+    def ftp_MKD(self, arg):
+        os.mkdir(self.real_path(arg))
+        self.reply(257, '"{}" created'.format(arg))
+
+    def ftp_RMD(self, arg):
+        shutil.rmtree(self.real_path(arg))
+        self.reply(250, 'Remove directory operation successful.')
+
+    def ftp_RNFR(self, arg):
+        self.rename_from = self.real_path(arg)
+        self.reply(350, 'Ready for RNTO.')
+
+    def ftp_RNTO(self, arg):
+        os.rename(self.rename_from, self.real_path(arg))
+        self.reply(250, 'Rename successful.')
+
+
+class LocalFtpServer(socketserver.ThreadingTCPServer):
+    """FTP server on 127.0.0.1 which serves the root directory. Every client
+    is handled in a separate thread. Received commands are stored in the
+    "commands" list. "handler" may be a subclass of FtpHandler which changes
+    some commands
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root: str, features=('SIZE', 'REST STREAM'),
+                 handler=FtpHandler):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.root = root
+        self.features = list(features)
+        self.commands = []
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
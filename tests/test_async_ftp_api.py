@@ -0,0 +1,114 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ftp.async_ftp_api import AsyncFtpApi
+from ftp.errors import WrongResponse
+from tests.local_server import FtpHandler, LocalFtpServer
+
+
+class AsyncFtpTest(unittest.IsolatedAsyncioTestCase):
+    """AsyncFtpApi against the local FTP server
+    """
+    passive_mode = True
+
+    async def asyncSetUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.server = LocalFtpServer(self.root.name).__enter__()
+        self.api = await self.new_session()
+
+    async def asyncTearDown(self):
+        await self.api.quit()
+        self.server.__exit__()
+        self.root.cleanup()
+
+    async def new_session(self):
+        api = await AsyncFtpApi.connect('127.0.0.1', self.server.port,
+                                        verbose_input=False)
+        api.talker.passive_mode = self.passive_mode
+        await api.login('anonymous', 'pass')
+        return api
+
+    async def test_download_and_upload(self):
+        data = os.urandom(3 * 1024 ** 2 + 7)
+        self.assertEqual(await self.api.upload_file('file.bin', data),
+                         len(data))
+
+        chunks = [chunk async for chunk in self.api.get_file('file.bin')]
+        self.assertEqual(b''.join(chunks), data)
+        self.assertEqual(await self.api.try_get_size('file.bin'), len(data))
+
+    async def test_download_from_offset(self):
+        with open(os.path.join(self.root.name, 'file.bin'), 'wb') as file:
+            file.write(b'0123456789')
+
+        del self.server.commands[:]
+        chunks = [chunk async for chunk in self.api.get_file('file.bin', 6)]
+        self.assertEqual(b''.join(chunks), b'6789')
+        # REST is sent after the data connection is set up
+        self.assertEqual(self.server.commands[-3:],
+                         ['PASV' if self.passive_mode else 'PORT',
+                          'REST', 'RETR'])
+
+    async def test_upload_async_iterable(self):
+        async def chunks():
+            for i in range(10):
+                yield bytes([i]) * 1000
+
+        self.assertEqual(await self.api.upload_file('file.bin', chunks()),
+                         10000)
+        with open(os.path.join(self.root.name, 'file.bin'), 'rb') as file:
+            self.assertEqual(file.read(),
+                             b''.join(bytes([i]) * 1000 for i in range(10)))
+
+    async def test_listing(self):
+        os.mkdir(os.path.join(self.root.name, 'dir'))
+        for name in ('a.txt', 'b c.txt'):
+            with open(os.path.join(self.root.name, name), 'wb'):
+                pass
+
+        files = [entry async for entry in self.api.list_files()]
+        self.assertEqual(files, [('a.txt', True), ('b c.txt', True),
+                                 ('dir', False)])
+        self.assertIn('b c.txt', await self.api.list_files_raw())
+
+    async def test_missing_file(self):
+        with self.assertRaises(WrongResponse):
+            async for _ in self.api.get_file('missing.bin'):
+                pass
+        self.assertEqual(await self.api.get_current_location(),
+                         '"/" is the current directory')
+
+    async def test_failed_upload_reply(self):
+        def failed_stor(handler, arg):
+            handler.reply(150, 'Ok to send data.')
+            with handler.open_data_connection() as conn:
+                while conn.recv(1024 ** 2):
+                    pass
+            handler.reply(552, 'Exceeded storage allocation.')
+
+        with mock.patch.object(FtpHandler, 'ftp_STOR', failed_stor):
+            with self.assertRaises(WrongResponse) as error:
+                await self.api.upload_file('file.bin', b'data')
+        self.assertEqual(error.exception.response.code, 552)
+
+    async def test_concurrent_sessions(self):
+        for i in range(8):
+            with open(os.path.join(self.root.name, str(i)), 'wb') as file:
+                file.write(bytes([i]) * 100000)
+
+        async def download(name):
+            api = await self.new_session()
+            try:
+                return b''.join([c async for c in api.get_file(name)])
+            finally:
+                await api.quit()
+
+        results = await asyncio.gather(*(download(str(i)) for i in range(8)))
+        self.assertEqual(results, [bytes([i]) * 100000 for i in range(8)])
+
+
+class AsyncActiveModeFtpTest(AsyncFtpTest):
+    passive_mode = False
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from ftp.cache import MetadataCache
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.time_patch = mock.patch('ftp.cache.time.monotonic',
+                                     return_value=100)
+        self.time_mock = self.time_patch.start()
+        self.cache = MetadataCache(ttl=10, max_size=3)
+
+    def tearDown(self):
+        self.time_patch.stop()
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.cache.get('SIZE', 'a'), (False, None))
+        self.cache.put('SIZE', 'a', 5)
+        self.assertEqual(self.cache.get('SIZE', 'a'), (True, 5))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_entries_expire(self):
+        self.cache.put('SIZE', 'a', 5)
+        self.time_mock.return_value = 111
+        self.assertEqual(self.cache.get('SIZE', 'a'), (False, None))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for path in 'abc':
+            self.cache.put('SIZE', path, 1)
+        self.cache.get('SIZE', 'a')
+        self.cache.put('SIZE', 'd', 1)
+
+        self.assertFalse(self.cache.get('SIZE', 'b')[0])
+        self.assertTrue(self.cache.get('SIZE', 'a')[0])
+
+    def test_invalidation(self):
+        cache = MetadataCache()
+        cache.put('LIST', '.', 'root listing')
+        cache.put('LIST', 'dir', 'listing')
+        cache.put('SIZE', 'dir/file', 1)
+        cache.put('LIST', 'dir2', 'listing')
+
+        cache.invalidate('dir')
+
+        self.assertFalse(cache.get('LIST', '.')[0])
+        self.assertFalse(cache.get('LIST', 'dir')[0])
+        self.assertFalse(cache.get('SIZE', 'dir/file')[0])
+        self.assertTrue(cache.get('LIST', 'dir2')[0])
+
+    def test_invalidation_of_parent_mlsd_listing(self):
+        cache = MetadataCache()
+        cache.put('MLSD', '.', ['root entries'])
+        cache.put('MLSD', 'dir2', ['entries'])
+
+        cache.invalidate('new.bin')
+
+        self.assertFalse(cache.get('MLSD', '.')[0])
+        self.assertTrue(cache.get('MLSD', 'dir2')[0])
@@ -0,0 +1,36 @@
+import io
+import unittest
+import zlib
+from unittest import mock
+
+from ftp.checksum import (Crc32, hashing_reader, new_hash, parse_digest,
+                          update_from_file)
+
+
+class ChecksumTest(unittest.TestCase):
+    def test_parse_digest(self):
+        digest = '0123456789abcdef' * 2
+        self.assertEqual(parse_digest('MD5', digest.upper()), digest)
+        self.assertEqual(
+            parse_digest('MD5', 'MD5 0-1000 {} file name'.format(digest)),
+            digest)
+        self.assertIsNone(parse_digest('SHA-1', digest))
+
+    def test_crc32_without_leading_zeros(self):
+        self.assertEqual(parse_digest('CRC32', 'AB12'), '0000ab12')
+        crc = Crc32()
+        crc.update(b'12')
+        crc.update(b'34')
+        self.assertEqual(crc.hexdigest(),
+                         '{:08x}'.format(zlib.crc32(b'1234')))
+
+    def test_hashing_reader(self):
+        file = io.BytesIO(b'1234567')
+        digest = new_hash('SHA-1')
+        update_from_file(digest, file, 2)
+        with mock.patch('ftp.checksum.UPLOAD_BLOCK_SIZE', 3):
+            blocks = list(hashing_reader(file, digest))
+        self.assertEqual(blocks, [b'345', b'67'])
+        expected = new_hash('SHA-1')
+        expected.update(b'1234567')
+        self.assertEqual(digest.hexdigest(), expected.hexdigest())
@@ -1,7 +1,9 @@
+import io
 import unittest
 from time import sleep
 from unittest import mock
 
+from ftp.cache import MetadataCache
 from ftp.errors import WrongResponse
 from ftp.ftp_api import FtpApi
 from ftp.response import Response
@@ -12,6 +14,18 @@ def list_of_bytes(s):
     return list(map(lambda i: i.encode(), s))
 
 
+def recv_into_from(chunks):
+    """Make side effect for socket.recv_into which returns given chunks
+    """
+    chunks = iter(chunks)
+
+    def recv_into(buffer):
+        chunk = next(chunks)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+    return recv_into
+
+
 class FtpTest(unittest.TestCase):
     def setUp(self):
         self.response_patch = mock.patch.object(Talker, '_get_response')
@@ -49,6 +63,21 @@ class FtpTest(unittest.TestCase):
         with self.assertRaises(WrongResponse):
             self.api.login('hello', 'invalid_pass')
 
+    def test_shared_cache_is_cleared_for_another_user(self):
+        self.response_mock.return_value = Response(230, 'Login successful')
+        cache = MetadataCache()
+        self.api.cache = cache
+        self.api.login('user', 'pass')
+        cache.put('SIZE', 'file.txt', 10)
+
+        # one more session of the same user (e.g. from the session pool)
+        other = FtpApi(self.api.talker, cache)
+        other.login('user', 'pass')
+        self.assertTrue(cache.get('SIZE', 'file.txt')[0])
+
+        other.login('admin', 'pass')
+        self.assertFalse(cache.get('SIZE', 'file.txt')[0])
+
     def test_getting_valid_size(self):
         responses = [
             Response(200, 'Mode was switched to binary'),
@@ -67,6 +96,72 @@ class FtpTest(unittest.TestCase):
 
         self.assertEqual(self.api.try_get_size('file.txt'), -1)
 
+    def test_cached_size(self):
+        responses = [
+            Response(200, 'Mode was switched to binary'),
+            Response(213, '76861'),
+            Response(250, 'Directory successfully changed.'),
+            Response(250, 'Delete operation successful.'),
+            Response(213, '10')]
+        self.response_mock.side_effect = responses
+        self.api.cache = MetadataCache()
+
+        self.assertEqual(self.api.try_get_size('dir/file.txt'), 76861)
+        self.api.change_directory('dir')
+        self.assertEqual(self.api.try_get_size('file.txt'), 76861)
+        self.assertEqual(self.api.cache.hits, 1)
+
+        self.api.remove_file('file.txt')
+        self.assertEqual(self.api.try_get_size('file.txt'), 10)
+
+    def test_redundant_commands_are_skipped(self):
+        responses = [
+            Response(331, 'Password required'),
+            Response(230, 'Login successful'),
+            Response(250, 'Directory successfully changed.'),
+            Response(200, 'Type set to I'),
+            Response(213, '1'),
+            Response(213, '2')]
+        self.response_mock.side_effect = responses
+
+        self.api.login('user', 'pass')
+        self.api.login('user', 'pass')
+        self.api.change_directory('dir')
+        self.api.change_directory('../dir/')
+        self.api.try_get_size('a')
+        self.api.try_get_size('b')
+
+        self.assertEqual(self.api.state.cwd, 'dir')
+        self.assertEqual(self.api.state.transfer_type, 'I')
+        self.assertEqual(self.api.state.commands_saved, 4)
+        self.assertEqual(self.response_mock.call_count, 7)
+
+    def test_pipelined_sizes(self):
+        responses = [
+            Response(200, 'Type set to I'),
+            Response(213, '10'),
+            Response(550, 'Could not get file size.'),
+            Response(213, '30')]
+        self.response_mock.side_effect = responses
+
+        sizes = self.api.size_many(['a', 'b', 'c'], window=2)
+
+        self.assertEqual(sizes, {'a': 10, 'b': -1, 'c': 30})
+        self.assertEqual(self.socket_mock.sendall.call_args_list[-2:],
+                         [mock.call(b'SIZE a\r\nSIZE b\r\n'),
+                          mock.call(b'SIZE c\r\n')])
+
+    def test_pipelined_deletion(self):
+        responses = [
+            Response(250, 'Delete operation successful.'),
+            Response(550, 'Delete operation failed.')]
+        self.response_mock.side_effect = responses
+
+        errors = self.api.delete_many(['a', 'b'])
+
+        self.assertIsNone(errors['a'])
+        self.assertEqual(errors['b'].response.code, 550)
+
     def test_list_files_raw_in_active_mode(self):
         responses = [
             Response(200, 'PORT command successful'),
@@ -74,7 +169,8 @@ class FtpTest(unittest.TestCase):
             Response(200, 'End.')]
         self.response_mock.side_effect = responses
         self.socket_mock.getsockname.return_value = ('192.168.1.1', 666)
-        self.socket_mock.recv.side_effect = [b'sample listing', b'']
+        self.socket_mock.recv_into.side_effect = recv_into_from(
+            [b'sample listing', b''])
 
         self.assertEqual(self.api.list_files_raw(), 'sample listing')
 
@@ -84,7 +180,8 @@ class FtpTest(unittest.TestCase):
             Response(150, 'Opening ASCII mode data connection for file list'),
             Response(200, 'End.')]
         self.response_mock.side_effect = responses
-        self.socket_mock.recv.side_effect = [b'sample listing', b'']
+        self.socket_mock.recv_into.side_effect = recv_into_from(
+            [b'sample listing', b''])
 
         self.assertEqual(self.api.list_files_raw(), 'sample listing')
 
@@ -108,6 +205,30 @@ class FtpTest(unittest.TestCase):
 
             self.assertEqual(self.api.list_files(), expected)
 
+    def test_iter_files_with_lines_split_between_chunks(self):
+        responses = [
+            Response(150, 'Here comes the directory listing.'),
+            Response(226, 'Directory send OK.')]
+        self.response_mock.side_effect = responses
+        listing = ('-rw-rw-r--   1 ftp ftp 9967461 Dec 10  2007 a.mp3\r\n'
+                   'drw-rw-r--   1 ftp ftp 4096 Dec 10 08:00 '
+                   '\u0434\u0438\u0441\u043a\r\n'
+                   '-rw-rw-r--   1 ftp ftp 12 Dec 10 08:00 last').encode()
+        with mock.patch.object(Talker, '_open_data_connection',
+                               return_value=None):
+            with mock.patch.object(Talker, '_read_data') as data_mock:
+                # the cyrillic name is split in the middle of a character
+                split = listing.index('\u0434'.encode()) + 1
+                data_mock.return_value = (chunk for chunk in (
+                    listing[:30], listing[30:split], listing[split:]))
+
+                entries = list(self.api.iter_files())
+
+        self.assertEqual([(e.name, e.type, e.size) for e in entries],
+                         [('a.mp3', 'file', 9967461),
+                          ('\u0434\u0438\u0441\u043a', 'dir', 4096),
+                          ('last', 'file', 12)])
+
     def test_file_downloading(self):
         file_size = 100000
         responses = [
@@ -125,3 +246,109 @@ class FtpTest(unittest.TestCase):
                 actual = b''.join(self.api.get_file('file.txt'))
                 self.assertEqual(len(actual), file_size)
                 self.assertEqual(actual, b'x' * file_size)
+
+    def test_uploading_bytes(self):
+        responses = [
+            Response(200, 'Type set to I'),
+            Response(227, 'Entering Passive Mode (192,168,1,1,1,4)'),
+            Response(150, 'Ok to send data.'),
+            Response(226, 'Transfer complete.')]
+        self.response_mock.side_effect = responses
+        self.api.talker.passive_mode = True
+
+        self.assertEqual(self.api.upload_file('file.txt', b'data'), 4)
+        self.socket_mock.sendall.assert_called_with(b'data')
+
+    def test_uploading_file_object_by_blocks(self):
+        responses = [
+            Response(200, 'Type set to I'),
+            Response(227, 'Entering Passive Mode (192,168,1,1,1,4)'),
+            Response(150, 'Ok to send data.'),
+            Response(226, 'Transfer complete.')]
+        self.response_mock.side_effect = responses
+        self.api.talker.passive_mode = True
+
+        with mock.patch('ftp.talker.UPLOAD_BLOCK_SIZE', 3):
+            sent = self.api.upload_file('file.txt', io.BytesIO(b'1234567'))
+
+        self.assertEqual(sent, 7)
+        self.assertEqual(self.socket_mock.sendall.call_args_list[-3:],
+                         [mock.call(b'123'), mock.call(b'456'),
+                          mock.call(b'7')])
+
+    def test_uploading_iterable_of_chunks(self):
+        responses = [
+            Response(200, 'Type set to I'),
+            Response(227, 'Entering Passive Mode (192,168,1,1,1,4)'),
+            Response(150, 'Ok to send data.'),
+            Response(226, 'Transfer complete.')]
+        self.response_mock.side_effect = responses
+        self.api.talker.passive_mode = True
+
+        chunks = (bytes([i]) * 10 for i in range(5))
+        self.assertEqual(self.api.upload_file('file.txt', chunks), 50)
+        self.assertEqual(self.socket_mock.sendall.call_args_list[-5:],
+                         [mock.call(bytes([i]) * 10) for i in range(5)])
+
+    def test_hash_algorithm_selected_on_server(self):
+        self.api._features = {'HASH SHA-1*;SHA-256;MD5', 'XMD5'}
+        self.response_mock.side_effect = [
+            Response(213, 'SHA-1 0-3 ' + 'a' * 40 + ' file.txt')]
+
+        self.assertEqual(self.api.remote_hash('file.txt'),
+                         ('SHA-1', 'a' * 40))
+        self.assertEqual(self.socket_mock.sendall.call_args_list[-1],
+                         mock.call(b'HASH file.txt\r\n'))
+
+    def test_preferred_hash_algorithm_is_selected(self):
+        self.api._features = {'HASH MD5;SHA-256'}
+        self.response_mock.side_effect = [
+            Response(200, 'SHA-256'),
+            Response(213, 'SHA-256 0-3 ' + 'B' * 64 + ' file.txt')]
+
+        self.assertEqual(self.api.remote_hash('file.txt'),
+                         ('SHA-256', 'b' * 64))
+        self.assertEqual(self.socket_mock.sendall.call_args_list[-2],
+                         mock.call(b'OPTS HASH SHA-256\r\n'))
+
+    def test_hash_by_x_command(self):
+        self.api._features = {'XCRC', 'XMD5'}
+        self.response_mock.side_effect = [
+            Response(250, 'file.txt ' + 'c' * 32)]
+
+        self.assertEqual(self.api.remote_hash('file.txt'),
+                         ('MD5', 'c' * 32))
+
+    def test_hash_is_not_supported(self):
+        self.api._features = {'SIZE'}
+        self.assertIsNone(self.api.hash_algorithm())
+        self.assertIsNone(self.api.remote_hash('file.txt'))
+
+    def test_set_directory_of_another_session(self):
+        self.response_mock.side_effect = [
+            Response(250, 'Directory successfully changed.')]
+        self.api.state.cwd = 'a/b'
+
+        self.api.set_directory('a/c')
+        self.api.set_directory('a/c/')
+
+        self.assertEqual(self.socket_mock.sendall.call_args_list[-1],
+                         mock.call(b'CWD ../c\r\n'))
+        self.assertEqual(self.api.state.cwd, 'a/c')
+        self.assertEqual(self.api.state.commands_saved, 1)
+
+    def test_set_directory_from_absolute_directory(self):
+        self.response_mock.side_effect = [
+            Response(331, 'Password required'),
+            Response(230, 'Login successful'),
+            Response(250, 'Directory successfully changed.')]
+        self.api.credentials = ('user', 'pass')
+        self.api.state.cwd = '/pub'
+
+        self.api.set_directory('a')
+
+        self.assertEqual(
+            self.socket_mock.sendall.call_args_list[-3:],
+            [mock.call(b'USER user\r\n'), mock.call(b'PASS pass\r\n'),
+             mock.call(b'CWD a\r\n')])
+        self.assertEqual(self.api.state.cwd, 'a')
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+
+from ftp.ftp_api import FtpApi
+from ftp.index import RemoteIndex
+from ftp.talker import Talker
+from tests.local_server import LocalFtpServer
+
+
+class RemoteIndexTest(unittest.TestCase):
+    """Index of the local FTP server tree
+    """
+    features = ('SIZE', 'REST STREAM', 'MLST type*;size*;modify*;perm*;')
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.server = LocalFtpServer(self.root.name,
+                                     self.features).__enter__()
+        self.api = FtpApi(Talker('127.0.0.1', self.server.port,
+                                 verbose_input=False))
+        self.api.talker.passive_mode = True
+        self.api.login('anonymous', 'pass')
+        self.index = RemoteIndex(':memory:', 'localhost:21')
+
+        for directory in ('tree', 'tree/a', 'tree/a/b', 'tree/c'):
+            os.mkdir(os.path.join(self.root.name, directory))
+            self.remote_file(directory + '/file.txt', b'x' * 10)
+        self.remote_file('tree/a/b/data_1.bin', b'x' * 100)
+        self.set_mtime('tree', 'tree/a', 'tree/a/b', 'tree/c')
+
+    def tearDown(self):
+        self.index.close()
+        self.api.quit()
+        self.server.__exit__()
+        self.root.cleanup()
+
+    def remote_file(self, name, data):
+        with open(os.path.join(self.root.name, name), 'wb') as file:
+            file.write(data)
+
+    def set_mtime(self, *directories, mtime=1000000):
+        for directory in directories:
+            os.utime(os.path.join(self.root.name, directory), (mtime, mtime))
+
+    def test_queries(self):
+        self.assertEqual(self.index.refresh(self.api, 'tree'), 4)
+
+        self.assertEqual(self.index.du('tree'), (5, 140))
+        self.assertEqual(self.index.du('tree/a/'), (3, 120))
+        self.assertEqual(self.index.find('*.bin'), ['tree/a/b/data_1.bin'])
+        self.assertEqual(self.index.find('file.txt', 'tree/a'),
+                         ['tree/a/b/file.txt', 'tree/a/file.txt'])
+        self.assertEqual([e.name for e in self.index.children('tree')],
+                         ['a', 'c', 'file.txt'])
+        self.assertEqual(sorted(self.index.tree('tree/a')),
+                         ['b', 'b/data_1.bin', 'b/file.txt', 'file.txt'])
+
+    def test_like_wildcards_in_path(self):
+        os.mkdir(os.path.join(self.root.name, 'tree_'))
+        self.remote_file('tree_/file.txt', b'x')
+        self.index.refresh(self.api, '.')
+
+        self.assertEqual(self.index.du('tree_'), (1, 1))
+
+    def test_incremental_refresh(self):
+        self.index.refresh(self.api, 'tree')
+        # the unchanged root is checked by MLST too
+        self.assertEqual(self.index.refresh(self.api, 'tree'), 0)
+
+        os.remove(os.path.join(self.root.name, 'tree/a/b/data_1.bin'))
+        self.set_mtime('tree/a/b', mtime=2000000)
+        self.set_mtime('tree/a', mtime=2000000)
+
+        self.assertEqual(self.index.refresh(self.api, 'tree'), 2)
+        self.assertEqual(self.index.find('*.bin'), [])
+        self.assertEqual(self.index.refresh(self.api, 'tree', full=True), 4)
+
+    def test_nested_change(self):
+        self.index.refresh(self.api, 'tree')
+        self.remote_file('tree/a/b/data_2.bin', b'x' * 5)
+        self.set_mtime('tree/a/b', mtime=2000000)
+
+        # "tree" and "tree/a" are the same, "tree/a/b" is found by MLST
+        self.assertEqual(self.index.refresh(self.api, 'tree'), 1)
+        self.assertEqual(self.index.find('*.bin'),
+                         ['tree/a/b/data_1.bin', 'tree/a/b/data_2.bin'])
+
+    def test_removed_directory(self):
+        self.index.refresh(self.api, 'tree')
+        for name in ('file.txt', 'data_1.bin'):
+            os.remove(os.path.join(self.root.name, 'tree/a/b', name))
+        os.rmdir(os.path.join(self.root.name, 'tree/a/b'))
+
+        self.index.refresh(self.api, 'tree')
+
+        self.assertEqual(self.index.du('tree'), (3, 30))
+        self.assertIsNone(self.index.get('tree/a/b/file.txt'))
+
+    def test_removed_file_in_root(self):
+        self.remote_file('gone.txt', b'x' * 7)
+        self.index.refresh(self.api)
+        self.assertEqual(self.index.du(), (6, 147))
+
+        os.remove(os.path.join(self.root.name, 'gone.txt'))
+        self.index.refresh(self.api, '.', full=True)
+
+        self.assertIsNone(self.index.get('gone.txt'))
+        self.assertEqual(self.index.du(), (5, 140))
+        self.assertNotIn('gone.txt', self.index.tree('.'))
+
+    def test_paths_dont_depend_on_working_directory(self):
+        self.api.change_directory('tree/a')
+        self.index.refresh(self.api)
+        self.api.change_directory('../c')
+        self.index.refresh(self.api, '.')
+
+        self.assertEqual(self.index.find('file.txt'),
+                         ['tree/a/b/file.txt', 'tree/a/file.txt',
+                          'tree/c/file.txt'])
+        self.assertEqual([e.name for e in self.index.children('tree/a')],
+                         ['b', 'file.txt'])
+        self.assertEqual(self.index.children('.'), [])
+
+
+class ListIndexTest(RemoteIndexTest):
+    features = ('SIZE', 'REST STREAM')
+
+    def test_incremental_refresh(self):
+        self.index.refresh(self.api, 'tree')
+        self.assertEqual(self.index.refresh(self.api, 'tree'), 4)
+
+    def test_nested_change(self):
+        self.index.refresh(self.api, 'tree')
+        self.remote_file('tree/a/b/data_2.bin', b'x' * 5)
+
+        # without MLST every directory is listed
+        self.assertEqual(self.index.refresh(self.api, 'tree'), 4)
+        self.assertEqual(len(self.index.find('*.bin')), 2)
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import os
+import socket
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from ftp.client import Client
+from ftp.ftp_api import FtpApi
+from ftp.keeper import SessionKeeper
+from ftp.mode import Mode
+from ftp.talker import Talker
+from tests.local_server import LocalFtpServer
+
+
+class SessionKeeperTest(unittest.TestCase):
+    """Restoring of the session with the local FTP server
+    """
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.root.name, 'dir'))
+        self.server = LocalFtpServer(self.root.name).__enter__()
+        self.api = FtpApi(Talker('127.0.0.1', self.server.port,
+                                 verbose_input=False))
+        self.api.talker.passive_mode = True
+        self.api.login('user', 'secret')
+        self.sleeps = []
+        self.keeper = SessionKeeper(self.api, keepalive=0,
+                                    sleep=self.sleeps.append)
+
+    def tearDown(self):
+        self.keeper.close()
+        self.keeper.api.talker.close_connection()
+        self.server.__exit__()
+        self.root.cleanup()
+
+    def drop_connection(self, api):
+        api.talker._command_socket.shutdown(socket.SHUT_RDWR)
+
+    def test_state_is_restored(self):
+        self.api.change_directory('dir')
+        self.api.switch_mode(Mode.Binary)
+        self.drop_connection(self.api)
+        del self.server.commands[:]
+
+        api = self.keeper.restore()
+
+        self.assertEqual(self.server.commands, ['USER', 'PASS', 'CWD', 'TYPE'])
+        self.assertTrue(api.talker.passive_mode)
+        self.assertEqual(api.credentials, ('user', 'secret'))
+        self.assertEqual(api.state.cwd, 'dir')
+        self.assertEqual(api.state.transfer_type, 'I')
+        self.assertIn('"/dir"', api.get_current_location())
+        self.assertEqual(self.keeper.reconnects, 1)
+
+    def test_backoff(self):
+        original = Talker.__init__
+        failures = [ConnectionRefusedError()] * 3
+
+        def connect(talker, *args, **kwargs):
+            if failures:
+                raise failures.pop()
+            original(talker, *args, **kwargs)
+
+        with mock.patch.object(Talker, '__init__', connect):
+            self.keeper.restore()
+        self.assertEqual(self.sleeps, [0.5, 1.0, 2.0])
+
+        failures.extend([ConnectionRefusedError()] * 5)
+        with mock.patch.object(Talker, '__init__', connect):
+            with self.assertRaises(ConnectionRefusedError):
+                self.keeper.restore()
+        self.assertTrue(self.keeper.broken)
+
+    def test_keepalive(self):
+        self.keeper.keepalive = 0.05
+        self.keeper.start()
+        deadline = time.monotonic() + 5
+        while ('NOOP' not in self.server.commands and
+               time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertIn('NOOP', self.server.commands)
+
+        # the lost connection is found by keepalive and restored before
+        # the next command
+        self.drop_connection(self.api)
+        while not self.keeper.broken and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with self.keeper.busy() as api:
+            self.assertIsNot(api, self.api)
+            self.assertEqual(api.credentials, ('user', 'secret'))
+
+    def test_command_is_repeated_after_reconnect(self):
+        self.api.change_directory('dir')
+        self.drop_connection(self.api)
+        output = io.StringIO()
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'keeper', self.keeper), \
+                contextlib.redirect_stdout(output):
+            Client.run_command('pwd', [])
+            self.assertIs(Client.ftp, self.keeper.api)
+        self.assertIn('Reconnected', output.getvalue())
+        self.assertIn('"/dir"', output.getvalue())
@@ -0,0 +1,35 @@
+import unittest
+
+from ftp.listing import Entry, parse_list_line, parse_mlsd_line, parse_modify
+
+
+class ListingTest(unittest.TestCase):
+    def test_mlsd_file(self):
+        entry = parse_mlsd_line(
+            'type=file;size=1830;modify=20190102030405;perm=adfrw; a b.txt')
+        self.assertEqual(entry, Entry('a b.txt', 'file', 1830, 1546398245,
+                                      'adfrw'))
+        self.assertTrue(entry.is_file)
+
+    def test_mlsd_directory(self):
+        entry = parse_mlsd_line('Type=dir;Modify=20190102030405.5; dir')
+        self.assertTrue(entry.is_dir)
+        self.assertEqual(entry.modify, 1546398245.5)
+        self.assertIsNone(entry.size)
+
+    def test_mlsd_current_and_parent_directories(self):
+        self.assertIsNone(parse_mlsd_line('type=cdir;perm=el; .'))
+        self.assertIsNone(parse_mlsd_line('type=pdir;perm=el; ..'))
+
+    def test_invalid_modify(self):
+        self.assertIsNone(parse_modify('yesterday'))
+
+    def test_list_line(self):
+        self.assertEqual(
+            parse_list_line('-rw-rw-r--   1 ftp      ftp       5525649 Dec '
+                            '10  2007 02   Gospoda demokraty.mp3'),
+            Entry('02   Gospoda demokraty.mp3', 'file', 5525649, None, None))
+        self.assertEqual(
+            parse_list_line('drw-rw-r--   1 ftp ftp 4096 Dec 11 10:00 dir'),
+            Entry('dir', 'dir', 4096, None, None))
+        self.assertIsNone(parse_list_line('total 8'))
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import unittest
+
+from ftp.ftp_api import FtpApi
+from ftp.metrics import Histogram, Metrics
+from ftp.talker import Talker
+from tests.local_server import LocalFtpServer
+
+
+class MetricsTest(unittest.TestCase):
+    def test_histogram(self):
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [2, 3])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 5.65)
+
+    def test_events(self):
+        metrics = Metrics()
+        metrics('command', {'command': 'SIZE'})
+        metrics('reply', {'command': 'SIZE', 'code': 213, 'latency': 0.002})
+        metrics('transfer', {'direction': 'received', 'size': 1000,
+                             'seconds': 0.5})
+        metrics('unknown', {})
+
+        result = metrics.to_dict()
+        self.assertEqual(result['counters'],
+                         {'ftp_commands_total{command="SIZE"}': 1,
+                          'ftp_replies_total{code="213"}': 1,
+                          'ftp_transfer_bytes_total{direction="received"}':
+                              1000,
+                          'ftp_transfer_seconds_total{direction="received"}':
+                              0.5,
+                          'ftp_transfers_total{direction="received"}': 1})
+        self.assertEqual(result['throughput'], {'received': 2000, 'sent': 0})
+        self.assertEqual(
+            result['histograms']['ftp_command_latency_seconds'
+                                 '{command="SIZE"}']['buckets']['0.005'], 1)
+
+    def test_prometheus(self):
+        metrics = Metrics()
+        metrics('reply', {'command': 'NOOP', 'code': 200, 'latency': 0.5})
+
+        lines = metrics.to_prometheus().splitlines()
+        self.assertIn('# TYPE ftp_command_latency_seconds histogram', lines)
+        self.assertIn('ftp_command_latency_seconds_bucket'
+                      '{command="NOOP",le="0.25"} 0', lines)
+        self.assertIn('ftp_command_latency_seconds_bucket'
+                      '{command="NOOP",le="+Inf"} 1', lines)
+        self.assertIn('ftp_command_latency_seconds_count'
+                      '{command="NOOP"} 1', lines)
+        self.assertIn('ftp_replies_total{code="200"} 1', lines)
+
+
+class TalkerEventsTest(unittest.TestCase):
+    """Events which are emitted by the session with the local FTP server
+    """
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.server = LocalFtpServer(self.root.name).__enter__()
+        self.metrics = Metrics()
+        self.api = FtpApi(Talker('127.0.0.1', self.server.port,
+                                 verbose_input=False))
+        self.api.talker.passive_mode = True
+        self.api.talker.listeners.append(self.metrics)
+        self.api.login('anonymous', 'pass')
+
+    def tearDown(self):
+        self.api.quit()
+        self.server.__exit__()
+        self.root.cleanup()
+
+    def test_transfer_events(self):
+        with open(os.path.join(self.root.name, 'file.bin'), 'wb') as file:
+            file.write(b'x' * 1000)
+
+        b''.join(self.api.get_file('file.bin', 1000, show_progress=False))
+        self.api.upload_file('copy.bin', b'y' * 10, show_progress=False)
+        self.api.size_many(['file.bin', 'missing'])
+
+        counters = json.loads(self.metrics.to_json())['counters']
+        self.assertEqual(counters['ftp_commands_total{command="RETR"}'], 1)
+        self.assertEqual(counters['ftp_commands_total{command="SIZE"}'], 2)
+        self.assertEqual(counters['ftp_replies_total{code="550"}'], 1)
+        self.assertEqual(
+            counters['ftp_transfer_bytes_total{direction="received"}'], 1000)
+        self.assertEqual(
+            counters['ftp_transfer_bytes_total{direction="sent"}'], 10)
+        self.assertEqual(self.metrics.histograms[
+            'ftp_data_connection_seconds', (('mode', 'passive'),)].count, 2)
+        self.assertIn('RETR: 1 times', str(self.metrics))
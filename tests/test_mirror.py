@@ -0,0 +1,49 @@
+import unittest
+
+from ftp.listing import Entry
+from ftp.mirror import Action, make_plan
+
+
+def file_entry(name, size, modify):
+    return Entry(name, 'file', size, modify, None)
+
+
+def dir_entry(name):
+    return Entry(name, 'dir', None, None, None)
+
+
+class MirrorPlanTest(unittest.TestCase):
+    def test_new_and_changed_files(self):
+        source = {'a': dir_entry('a'),
+                  'a/new': file_entry('new', 1, 100),
+                  'same': file_entry('same', 5, 100),
+                  'resized': file_entry('resized', 5, 100),
+                  'newer': file_entry('newer', 5, 200)}
+        target = {'same': file_entry('same', 5, 100.5),
+                  'resized': file_entry('resized', 6, 300),
+                  'newer': file_entry('newer', 5, 100)}
+
+        self.assertEqual(make_plan(source, target, 'get'),
+                         [Action('mkdir', 'a', None),
+                          Action('get', 'a/new', 1),
+                          Action('get', 'newer', 5),
+                          Action('get', 'resized', 5)])
+
+    def test_unknown_values_are_not_compared(self):
+        source = {'file': file_entry('file', None, 200)}
+        target = {'file': file_entry('file', 5, None)}
+
+        self.assertEqual(make_plan(source, target, 'put'), [])
+
+    def test_delete_deepest_first(self):
+        target = {'a': dir_entry('a'),
+                  'a/b': dir_entry('b'),
+                  'a/b/file': file_entry('file', 1, 1),
+                  'kept': file_entry('kept', 1, 1)}
+        source = {'kept': file_entry('kept', 1, 1)}
+
+        self.assertEqual(make_plan(source, target, 'get'), [])
+        self.assertEqual(make_plan(source, target, 'get', delete=True),
+                         [Action('delete', 'a/b/file', None),
+                          Action('rmdir', 'a/b', None),
+                          Action('rmdir', 'a', None)])
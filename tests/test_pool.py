@@ -0,0 +1,131 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from ftp.errors import PoolTimeout, WrongResponse
+from ftp.parallel import TaskPool
+from ftp.pool import FtpSessionPool
+from ftp.response import Response
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.sessions = []
+        self.time_patch = mock.patch('ftp.pool.time.monotonic',
+                                     return_value=100)
+        self.time_mock = self.time_patch.start()
+
+    def tearDown(self):
+        self.time_patch.stop()
+
+    def factory(self):
+        session = mock.Mock()
+        self.sessions.append(session)
+        return session
+
+    def test_sessions_are_reused(self):
+        pool = FtpSessionPool(self.factory, max_size=2)
+        with pool.session() as first:
+            pass
+        with pool.session() as second:
+            self.assertIs(first, second)
+        self.assertEqual(len(self.sessions), 1)
+
+    def test_min_size_sessions_are_opened_at_start(self):
+        pool = FtpSessionPool(self.factory, min_size=3, max_size=5)
+        self.assertEqual(len(self.sessions), 3)
+        self.assertEqual(pool.idle, 3)
+
+    def test_checkout_waits_for_free_session(self):
+        pool = FtpSessionPool(self.factory, max_size=1)
+        session = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(timeout=0)
+
+        threading.Timer(0.05, pool.release, args=(session,)).start()
+        self.assertIs(pool.acquire(timeout=5), session)
+
+    def test_stale_session_is_checked_with_noop(self):
+        pool = FtpSessionPool(self.factory, check_after=15, idle_timeout=60)
+        with pool.session() as first:
+            first.talker.run_command.side_effect = ConnectionResetError()
+        self.time_mock.return_value = 120
+
+        with pool.session() as second:
+            self.assertIsNot(first, second)
+        first.talker.run_command.assert_called_once_with(
+            'NOOP', printin=False, printout=False)
+        self.assertEqual(pool.size, 1)
+
+    def test_idle_sessions_are_evicted(self):
+        pool = FtpSessionPool(self.factory, min_size=1, max_size=3,
+                              idle_timeout=60)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        self.time_mock.return_value = 200
+
+        pool.evict_idle()
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(sum(s.quit.called for s in self.sessions), 1)
+
+    def test_broken_session_is_discarded(self):
+        pool = FtpSessionPool(self.factory)
+        with self.assertRaises(WrongResponse):
+            with pool.session():
+                raise WrongResponse(Response(421, 'Timeout'))
+        with self.assertRaises(ConnectionError):
+            with pool.session():
+                raise ConnectionResetError()
+        self.assertEqual(pool.size, 0)
+        self.assertEqual(len(self.sessions), 2)
+
+    def test_session_is_kept_after_error_response(self):
+        pool = FtpSessionPool(self.factory)
+        with self.assertRaises(WrongResponse):
+            with pool.session():
+                raise WrongResponse(Response(550, 'No such file'))
+        self.assertEqual(pool.idle, 1)
+
+    def test_checked_out_session_is_prepared(self):
+        prepared = []
+        pool = FtpSessionPool(self.factory, max_size=1,
+                              prepare=prepared.append)
+        session = pool.acquire()
+        self.assertEqual(prepared, [session])
+
+        pool.release(session)
+        pool.prepare = mock.Mock(
+            side_effect=WrongResponse(Response(550, 'No such directory')))
+        with self.assertRaises(WrongResponse):
+            pool.acquire()
+        # the session is fine, it's returned to the pool
+        self.assertEqual(pool.idle, 1)
+
+
+class TaskPoolTest(unittest.TestCase):
+    def test_exception_cancels_queued_tasks(self):
+        running = threading.Event()
+        done = []
+
+        def task(api, depth):
+            time.sleep(0.01)
+            done.append(depth)
+            if len(done) == 5:
+                running.set()
+            if depth < 6:
+                for _ in range(3):
+                    tasks.submit('task', task, depth + 1)
+
+        with self.assertRaises(KeyboardInterrupt):
+            with TaskPool(FtpSessionPool(mock.Mock), 2) as tasks:
+                tasks.submit('root', task, 0)
+                running.wait(5)
+                raise KeyboardInterrupt
+
+        # only the running tasks were finished, the rest of 1093 was dropped
+        finished = len(done)
+        self.assertLess(finished, 10)
+        tasks.submit('late', task, 0)
+        self.assertEqual(len(done), finished)
@@ -0,0 +1,48 @@
+import io
+import time
+import unittest
+
+from ftp.progress import ProgressReporter, TransferProgress
+
+
+class ProgressTest(unittest.TestCase):
+    def test_render(self):
+        transfer = TransferProgress('file.bin', 4 * 1024 ** 2)
+        transfer.start -= 1
+        transfer.update(1024 ** 2)
+
+        line = transfer.render(time.monotonic())
+
+        self.assertTrue(line.startswith('file.bin 25% '))
+        self.assertIn('(avg 1.0MB/s)', line)
+        self.assertTrue(line.endswith('ETA 0:00:03'))
+
+    def test_render_without_total(self):
+        transfer = TransferProgress('', None)
+        transfer.update(3 * 1024 ** 2)
+
+        self.assertTrue(transfer.render(time.monotonic()).startswith('3.0MB '))
+
+    def test_disabled_for_non_terminal(self):
+        reporter = ProgressReporter(io.StringIO())
+
+        self.assertIsNone(reporter.start('file.bin', 10))
+        reporter.finish(None)
+
+    def test_concurrent_transfers(self):
+        stream = io.StringIO()
+        reporter = ProgressReporter(stream, interval=0.01, enabled=True)
+        first = reporter.start('a', 10)
+        second = reporter.start('b')
+        first.update(5)
+        time.sleep(0.1)
+        reporter.finish(first)
+        reporter.finish(second)
+        output = stream.getvalue()
+
+        self.assertIn('a 50% ', output)
+        self.assertIn(' | b 0.0MB ', output)
+        # the line is cleared when the last transfer is finished
+        self.assertTrue(output.endswith('\r'))
+        time.sleep(0.05)
+        self.assertIsNone(reporter._thread)
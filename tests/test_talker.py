@@ -0,0 +1,39 @@
+import unittest
+from unittest import mock
+
+from ftp.talker import CONTROL_BUFFER_SIZE, Talker
+
+
+class TalkerTest(unittest.TestCase):
+    def setUp(self):
+        self.socket_patch = mock.patch('ftp.talker.socket.socket',
+                                       autospec=True)
+        self.socket_mock = self.socket_patch.start()()
+        self.talker = Talker(None, None)
+
+    def tearDown(self):
+        self.socket_patch.stop()
+
+    def test_multiline_response_is_read_by_blocks(self):
+        self.socket_mock.recv.side_effect = [
+            b'211-Features:\r\n MDTM\r\n SIZE\r\n211 End\r\n']
+
+        response = self.talker._get_response()
+
+        self.assertEqual(response.code, 211)
+        self.assertEqual(response.message, 'Features:\n MDTM\n SIZE\nEnd')
+        self.socket_mock.recv.assert_called_once_with(CONTROL_BUFFER_SIZE)
+
+    def test_line_split_between_blocks(self):
+        self.socket_mock.recv.side_effect = [
+            b'220 Serv', b'ice ready\r', b'\n331 Password required\r\n']
+
+        self.assertEqual(self.talker._get_response().code, 220)
+        self.assertEqual(self.talker._get_response().code, 331)
+        self.assertEqual(self.socket_mock.recv.call_count, 3)
+
+    def test_closed_connection(self):
+        self.socket_mock.recv.side_effect = [b'']
+
+        with self.assertRaises(ConnectionError):
+            self.talker._get_response()
@@ -0,0 +1,738 @@
+import os
+import socket
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+from ftp.cache import MetadataCache
+from ftp.client import Client
+from ftp.errors import ChecksumMismatch, WrongResponse
+from ftp.ftp_api import FtpApi
+from ftp.index import RemoteIndex
+from ftp.pool import FtpSessionPool
+from ftp.segmented import download_segmented, split_ranges
+from ftp.talker import Talker
+from tests.local_server import FtpHandler, LocalFtpServer
+
+
+class TransfersTest(unittest.TestCase):
+    """Transfers against the local FTP server
+    """
+    features = ('SIZE', 'REST STREAM')
+    compress_level = None
+    handler = FtpHandler
+    passive_mode = True
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.local = tempfile.TemporaryDirectory()
+        self.server = LocalFtpServer(self.root.name, self.features,
+                                     self.handler).__enter__()
+        self.api = self.new_session()
+        self.pool = FtpSessionPool(self.new_session)
+
+    def new_session(self):
+        api = FtpApi(Talker('127.0.0.1', self.server.port,
+                            verbose_input=False),
+                     compress_level=self.compress_level)
+        api.talker.passive_mode = self.passive_mode
+        api.login('anonymous', 'pass')
+        return api
+
+    def tearDown(self):
+        self.pool.close()
+        self.api.quit()
+        self.server.__exit__()
+        self.root.cleanup()
+        self.local.cleanup()
+
+    def remote_file(self, name, data):
+        with open(os.path.join(self.root.name, name), 'wb') as file:
+            file.write(data)
+
+    def test_download_overwrites_local_file(self):
+        data = os.urandom(300000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(b'x' * 500000)
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True):
+            Client.download_file('file.bin', local_path)
+
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_kept_chunks_of_download(self):
+        data = os.urandom(3 * 1024 ** 2 + 7)
+        self.remote_file('file.bin', data)
+
+        chunks = list(self.api.get_file('file.bin', show_progress=False))
+        self.assertEqual(b''.join(chunks), data)
+        chunks = list(self.api.get_file_range('file.bin', 1000, 2000000))
+        self.assertEqual(b''.join(chunks), data[1000:2001000])
+
+    def test_upload_from_path(self):
+        data = os.urandom(300000)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(data)
+
+        self.assertEqual(self.api.upload_file('file.bin', local_path),
+                         len(data))
+        with open(os.path.join(self.root.name, 'file.bin'), 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_segmented_download(self):
+        data = os.urandom(1000003)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+
+        size = download_segmented(self.api, self.pool, 'file.bin',
+                                  local_path, 4)
+
+        self.assertEqual(size, len(data))
+        self.assertEqual(self.server.commands.count('REST'), 4)
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_failed_segment(self):
+        data = os.urandom(400000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        retrieve_range = FtpApi._retrieve_range
+
+        def fail_third_segment(api, path, offset, length):
+            if offset == 200000:
+                raise ConnectionError('Connection reset')
+            return retrieve_range(api, path, offset, length)
+
+        with mock.patch.object(FtpApi, '_retrieve_range',
+                               fail_third_segment):
+            if 'REST STREAM' in self.features:
+                with self.assertRaises(ConnectionError):
+                    download_segmented(self.api, self.pool, 'file.bin',
+                                       local_path, 4)
+                # the last segment was received, but there is a gap before it
+                self.assertEqual(os.path.getsize(local_path), 200000)
+            else:
+                download_segmented(self.api, self.pool, 'file.bin',
+                                   local_path, 4)
+        with open(local_path, 'rb') as file:
+            self.assertTrue(data.startswith(file.read()))
+
+    def test_failed_segmented_download_keeps_local_file(self):
+        self.remote_file('file.bin', os.urandom(400000))
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(b'local copy')
+
+        def failed_retr(handler, arg):
+            handler.reply(550, 'Failed to open file.')
+
+        with mock.patch.object(FtpHandler, 'ftp_RETR', failed_retr):
+            with self.assertRaises(WrongResponse):
+                download_segmented(self.api, self.pool, 'file.bin',
+                                   local_path, 4)
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), b'local copy')
+
+    def test_split_ranges(self):
+        self.assertEqual(split_ranges(10, 3), [(0, 3), (3, 3), (6, 4)])
+        self.assertEqual(split_ranges(2, 4), [(0, 1), (1, 1)])
+
+    def test_parallel_directory_download(self):
+        files = {}
+        for directory in ('tree', 'tree/a', 'tree/a/b', 'tree/c'):
+            os.mkdir(os.path.join(self.root.name, directory))
+            for i in range(3):
+                name = '{}/file{}.bin'.format(directory, i)
+                files[name] = os.urandom(1000 * i)
+                self.remote_file(name, files[name])
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool):
+            Client.download_directory('tree', self.local.name, jobs=3)
+
+        for name, data in files.items():
+            with open(os.path.join(self.local.name, name), 'rb') as file:
+                self.assertEqual(file.read(), data)
+
+    def test_wildcard_download(self):
+        os.mkdir(os.path.join(self.root.name, 'logs'))
+        files = {}
+        for i in range(6):
+            name = 'day{}.{}'.format(i, 'csv' if i % 2 else 'gz')
+            files[name] = os.urandom(100 * i)
+            self.remote_file('logs/' + name, files[name])
+        del self.server.commands[:]
+
+        local_path = os.path.join(self.local.name, 'csv')
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool):
+            self.assertEqual(
+                Client.download_many('logs/*.csv', local_path, jobs=3), 3)
+
+        self.assertEqual(sorted(os.listdir(local_path)),
+                         ['day1.csv', 'day3.csv', 'day5.csv'])
+        for name in os.listdir(local_path):
+            with open(os.path.join(local_path, name), 'rb') as file:
+                self.assertEqual(file.read(), files[name])
+        listings = [c for c in self.server.commands if c in ('LIST', 'MLSD')]
+        self.assertEqual(len(listings), 1)
+
+    def test_wildcard_upload(self):
+        for name in ('a.gz', 'b.gz', 'c.txt'):
+            with open(os.path.join(self.local.name, name), 'wb') as file:
+                file.write(name.encode())
+        os.mkdir(os.path.join(self.root.name, 'logs'))
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool):
+            self.assertEqual(Client.upload_many(
+                os.path.join(self.local.name, '*.gz'), 'logs', jobs=2), 2)
+            self.assertEqual(Client.upload_many(
+                os.path.join(self.local.name, '*.csv'), 'logs'), 0)
+
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.root.name, 'logs'))),
+            ['a.gz', 'b.gz'])
+
+    def test_parallel_transfers_in_working_directory(self):
+        os.makedirs(os.path.join(self.root.name, 'sub', 'dir'))
+        self.remote_file('sub/a.csv', b'a' * 1000)
+        self.remote_file('sub/dir/b.bin', b'b' * 10)
+        local_dir = os.path.join(self.local.name, 'up')
+        os.mkdir(local_dir)
+        with open(os.path.join(local_dir, 'c.txt'), 'wb') as file:
+            file.write(b'c')
+        pool = FtpSessionPool(self.new_session,
+                              prepare=Client.prepare_session)
+        self.api.change_directory('sub')
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', pool):
+            Client.download_many('*.csv', self.local.name, jobs=2)
+            Client.download_directory('dir', self.local.name, jobs=2)
+            download_segmented(self.api, pool, 'a.csv',
+                               os.path.join(self.local.name, 'seg'), 2)
+            Client.upload_directory(local_dir, '.', jobs=2)
+        pool.close()
+
+        for name, data in (('a.csv', b'a' * 1000), ('seg', b'a' * 1000),
+                           ('dir/b.bin', b'b' * 10)):
+            with open(os.path.join(self.local.name, name), 'rb') as file:
+                self.assertEqual(file.read(), data)
+        with open(os.path.join(self.root.name, 'sub', 'up', 'c.txt'),
+                  'rb') as file:
+            self.assertEqual(file.read(), b'c')
+
+    def test_pooled_session_follows_main_session(self):
+        os.mkdir(os.path.join(self.root.name, 'sub'))
+        pool = FtpSessionPool(self.new_session,
+                              prepare=Client.prepare_session)
+        self.api.change_directory('/sub')
+        with mock.patch.object(Client, 'ftp', self.api, create=True):
+            with pool.session() as session:
+                self.assertIn('"/sub"', session.get_current_location())
+
+            self.api.login('other', 'secret')
+            self.api.talker.passive_mode = not self.passive_mode
+            with pool.session() as session:
+                self.assertEqual(session.credentials, ('other', 'secret'))
+                self.assertEqual(session.talker.passive_mode,
+                                 not self.passive_mode)
+                self.assertEqual(session.state.cwd, '')
+                self.assertIn('"/"', session.get_current_location())
+        pool.close()
+
+    def test_resume_download(self):
+        data = os.urandom(300000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(data[:100000])
+
+        received = Client.receive_file(self.api, 'file.bin', local_path,
+                                       show_progress=False, resume=True)
+
+        rest = 'REST STREAM' in self.features
+        self.assertEqual(received, 200000 if rest else 300000)
+        self.assertEqual('REST' in self.server.commands, rest)
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_resume_after_interrupted_download(self):
+        data = os.urandom(300000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+
+        def interrupted_retr(handler, arg):
+            handler.reply(150, 'Opening BINARY mode data connection.')
+            half = data[:len(data) // 2]
+            with handler.open_data_connection() as conn:
+                conn.sendall(zlib.compress(half) if handler.mode == 'Z'
+                             else half)
+            handler.request.shutdown(socket.SHUT_RDWR)
+
+        api = self.new_session()
+        with mock.patch.object(FtpHandler, 'ftp_RETR', interrupted_retr):
+            with self.assertRaises(ConnectionError):
+                Client.receive_file(api, 'file.bin', local_path,
+                                    show_progress=False)
+        api.talker.close_connection()
+        # the preallocated tail isn't left in the file
+        self.assertEqual(os.path.getsize(local_path), len(data) // 2)
+
+        Client.receive_file(self.api, 'file.bin', local_path,
+                            show_progress=False, resume=True)
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_failed_transfer_reply(self):
+        self.remote_file('file.bin', b'data')
+
+        def failed_stor(handler, arg):
+            handler.reply(150, 'Ok to send data.')
+            with handler.open_data_connection() as conn:
+                while conn.recv(1024 ** 2):
+                    pass
+            handler.reply(552, 'Exceeded storage allocation.')
+
+        def failed_retr(handler, arg):
+            handler.reply(150, 'Opening BINARY mode data connection.')
+            with handler.open_data_connection():
+                pass
+            handler.reply(451, 'Local error in processing.')
+
+        with mock.patch.object(FtpHandler, 'ftp_STOR', failed_stor), \
+                mock.patch.object(FtpHandler, 'ftp_RETR', failed_retr):
+            with self.assertRaises(WrongResponse) as error:
+                self.api.upload_file('new.bin', b'data', show_progress=False)
+            self.assertEqual(error.exception.response.code, 552)
+            with self.assertRaises(WrongResponse) as error:
+                b''.join(self.api.get_file('file.bin', show_progress=False))
+            self.assertEqual(error.exception.response.code, 451)
+
+        # the session is usable after the failed transfers
+        self.assertEqual(b''.join(self.api.get_file(
+            'file.bin', show_progress=False)), b'data')
+
+    def test_failed_download_keeps_local_file(self):
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(b'local copy')
+
+        with self.assertRaises(WrongResponse):
+            Client.receive_file(self.api, 'missing.bin', local_path,
+                                show_progress=False, file_size=100)
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), b'local copy')
+
+    def test_empty_file_download(self):
+        self.remote_file('empty.bin', b'')
+        local_path = os.path.join(self.local.name, 'empty.bin')
+        Client.receive_file(self.api, 'empty.bin', local_path,
+                            show_progress=False)
+        self.assertEqual(os.path.getsize(local_path), 0)
+
+    def test_resume_upload(self):
+        data = os.urandom(300000)
+        self.remote_file('file.bin', data[:100000])
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(data)
+
+        sent = Client.send_file(self.api, local_path, 'file.bin',
+                                resume=True)
+
+        self.assertEqual(sent, 200000)
+        command = 'STOR' if 'REST STREAM' in self.features else 'APPE'
+        self.assertIn(command, self.server.commands)
+        with open(os.path.join(self.root.name, 'file.bin'), 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_resume_of_complete_file(self):
+        data = os.urandom(1000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(data)
+
+        self.assertEqual(Client.send_file(self.api, local_path, 'file.bin',
+                                          resume=True), 0)
+        self.assertNotIn('STOR', self.server.commands)
+
+    def test_list_entries(self):
+        os.mkdir(os.path.join(self.root.name, 'dir'))
+        self.remote_file('file.bin', b'x' * 10)
+
+        entries = self.api.list_entries()
+
+        self.assertEqual([(e.name, e.type, e.size) for e in entries],
+                         [('dir', 'dir', entries[0].size),
+                          ('file.bin', 'file', 10)])
+        self.assertEqual(self.api.stat('file.bin').size, 10)
+        mlst = self.api.supports_mlst()
+        self.assertEqual('MLSD' in self.server.commands, mlst)
+        if mlst:
+            self.assertIsNotNone(entries[1].modify)
+
+    def test_abandoned_listing(self):
+        for i in range(1000):
+            self.remote_file('file{}.bin'.format(i), b'')
+
+        files = self.api.iter_files('.')
+        first = next(files)
+        files.close()
+
+        self.assertEqual(first.name, 'file0.bin')
+        self.assertEqual(len(list(self.api.iter_files('.'))), 1000)
+
+    def test_pipelined_commands(self):
+        for i in range(50):
+            self.remote_file(str(i), b'x' * i)
+
+        sizes = self.api.size_many([str(i) for i in range(51)], window=8)
+        times = self.api.modify_time_many(['1', 'missing'])
+        errors = self.api.delete_many([str(i) for i in range(0, 51, 2)])
+
+        self.assertEqual(sizes, dict([(str(i), i) for i in range(50)] +
+                                     [('50', -1)]))
+        self.assertIsNotNone(times['1'])
+        self.assertIsNone(times['missing'])
+        self.assertEqual([p for p, e in errors.items() if e], ['50'])
+        self.assertEqual(len(os.listdir(self.root.name)), 25)
+        self.assertEqual(self.api.get_current_location(),
+                         '"/" is the current directory')
+
+    def test_parallel_directory_upload(self):
+        files = {}
+        for directory in ('tree', 'tree/a', 'tree/a/b', 'tree/c'):
+            os.mkdir(os.path.join(self.local.name, directory))
+            for i in range(3):
+                name = '{}/file{}.bin'.format(directory, i)
+                files[name] = os.urandom(1000 * i)
+                with open(os.path.join(self.local.name, name), 'wb') as file:
+                    file.write(files[name])
+        os.mkdir(os.path.join(self.root.name, 'tree'))
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool):
+            Client.upload_directory(os.path.join(self.local.name, 'tree'),
+                                    '.', jobs=3)
+
+        for name, data in files.items():
+            with open(os.path.join(self.root.name, name), 'rb') as file:
+                self.assertEqual(file.read(), data)
+
+    def test_mirror_transfers_only_changes(self):
+        os.makedirs(os.path.join(self.root.name, 'tree', 'sub'))
+        self.remote_file('tree/same.bin', b'same')
+        self.remote_file('tree/sub/new.bin', b'new')
+        os.makedirs(os.path.join(self.local.name, 'extra'))
+        with open(os.path.join(self.local.name, 'same.bin'), 'wb') as file:
+            file.write(b'same')
+        with open(os.path.join(self.local.name, 'extra', 'old'), 'wb') as file:
+            file.write(b'old')
+        os.utime(os.path.join(self.root.name, 'tree', 'same.bin'), (0, 0))
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool):
+            Client.mirror('tree', self.local.name, delete=True)
+            retrieved = self.server.commands.count('RETR')
+            Client.mirror('tree', self.local.name, delete=True)
+
+        self.assertEqual(retrieved, 1)
+        self.assertEqual(self.server.commands.count('RETR'), 1)
+        self.assertEqual(sorted(os.listdir(self.local.name)),
+                         ['same.bin', 'sub'])
+        with open(os.path.join(self.local.name, 'sub', 'new.bin'),
+                  'rb') as file:
+            self.assertEqual(file.read(), b'new')
+
+    def test_mirror_upload(self):
+        with open(os.path.join(self.local.name, 'file.bin'), 'wb') as file:
+            file.write(b'data')
+        os.mkdir(os.path.join(self.root.name, 'tree'))
+        self.remote_file('tree/old.bin', b'old')
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool):
+            Client.mirror('tree', self.local.name, upload=True, delete=True)
+
+        self.assertEqual(os.listdir(os.path.join(self.root.name, 'tree')),
+                         ['file.bin'])
+
+    def test_mirror_into_missing_directory(self):
+        os.makedirs(os.path.join(self.root.name, 'tree', 'sub'))
+        self.remote_file('tree/sub/file.bin', b'data')
+        local_path = os.path.join(self.local.name, 'new')
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool):
+            Client.mirror('tree', local_path)
+            Client.mirror('copy', local_path, upload=True)
+
+        for path in (os.path.join(local_path, 'sub', 'file.bin'),
+                     os.path.join(self.root.name, 'copy', 'sub', 'file.bin')):
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), b'data')
+
+    def test_mirror_with_index(self):
+        os.mkdir(os.path.join(self.root.name, 'tree'))
+        self.remote_file('tree/file.bin', b'data')
+        index = RemoteIndex(':memory:', 'localhost')
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool), \
+                mock.patch.object(Client, 'index', index):
+            Client.mirror('tree', self.local.name)
+        index.close()
+
+        with open(os.path.join(self.local.name, 'file.bin'), 'rb') as file:
+            self.assertEqual(file.read(), b'data')
+
+    def test_mirror_with_index_finds_changed_file(self):
+        os.makedirs(os.path.join(self.root.name, 'tree', 'sub'))
+        self.remote_file('tree/sub/f.txt', b'old')
+        index = RemoteIndex(':memory:', 'localhost')
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool), \
+                mock.patch.object(Client, 'index', index):
+            Client.mirror('tree', self.local.name)
+            # the file is replaced, the time of "tree" doesn't change
+            self.remote_file('tree/sub/f.txt', b'new content')
+            os.utime(os.path.join(self.root.name, 'tree', 'sub'),
+                     (2000000000, 2000000000))
+            Client.mirror('tree', self.local.name)
+        index.close()
+
+        with open(os.path.join(self.local.name, 'sub', 'f.txt'),
+                  'rb') as file:
+            self.assertEqual(file.read(), b'new content')
+
+
+class NoRestTransfersTest(TransfersTest):
+    features = ('SIZE',)
+
+    def test_segmented_download(self):
+        data = os.urandom(100000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+
+        download_segmented(self.api, self.pool, 'file.bin',
+                           local_path, 4)
+
+        self.assertNotIn('REST', self.server.commands)
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+
+class MlstTransfersTest(TransfersTest):
+    features = ('SIZE', 'REST STREAM', 'MLST type*;size*;modify*;perm*;')
+
+    def test_parallel_directory_download(self):
+        super().test_parallel_directory_download()
+        self.assertNotIn('SIZE', self.server.commands)
+
+    def test_cached_listing_after_upload(self):
+        self.api.cache = MetadataCache()
+        self.assertEqual(self.api.list_entries(''), [])
+
+        self.api.upload_file('new.bin', b'data', show_progress=False)
+
+        self.assertEqual([e.name for e in self.api.list_entries('')],
+                         ['new.bin'])
+
+    def test_mirror_with_index_lists_only_changes(self):
+        os.makedirs(os.path.join(self.root.name, 'tree', 'sub'))
+        self.remote_file('tree/sub/f.txt', b'data')
+        index = RemoteIndex(':memory:', 'localhost')
+
+        with mock.patch.object(Client, 'ftp', self.api, create=True), \
+                mock.patch.object(Client, 'pool', self.pool), \
+                mock.patch.object(Client, 'index', index):
+            Client.mirror('tree', self.local.name)
+            del self.server.commands[:]
+            Client.mirror('tree', self.local.name)
+        index.close()
+
+        # the unchanged directories are only checked by MLST
+        self.assertNotIn('MLSD', self.server.commands)
+        self.assertEqual(self.server.commands.count('MLST'), 2)
+
+
+class ActiveTransfersTest(TransfersTest):
+    passive_mode = False
+
+    def test_listener_is_reused(self):
+        self.remote_file('file.bin', b'data')
+        for _ in range(3):
+            b''.join(self.api.get_file('file.bin', show_progress=False))
+        listener = self.api.talker._listener
+        self.api.upload_file('copy.bin', b'data', show_progress=False)
+
+        self.assertIs(self.api.talker._listener, listener)
+        self.assertEqual(self.server.commands.count('EPRT'), 4)
+        self.assertNotIn('PORT', self.server.commands)
+
+    def test_transfer_after_failed_command(self):
+        with self.assertRaises(WrongResponse):
+            b''.join(self.api.get_file('missing.bin', 10,
+                                       show_progress=False))
+        self.remote_file('file.bin', b'data')
+
+        self.assertEqual(b''.join(self.api.get_file(
+            'file.bin', show_progress=False)), b'data')
+
+
+class LegacyHandler(FtpHandler):
+    ftp_EPSV = ftp_EPRT = None
+
+
+class LegacyPassiveTransfersTest(TransfersTest):
+    """Server without EPSV/EPRT
+    """
+    handler = LegacyHandler
+
+    def test_fallback_to_legacy_commands(self):
+        self.remote_file('file.bin', b'data')
+        for _ in range(2):
+            b''.join(self.api.get_file('file.bin', show_progress=False))
+
+        self.assertEqual(self.server.commands.count('EPSV'), 1)
+        self.assertEqual(self.server.commands.count('PASV'), 2)
+
+
+class LegacyActiveTransfersTest(LegacyPassiveTransfersTest):
+    passive_mode = False
+
+    def test_fallback_to_legacy_commands(self):
+        self.remote_file('file.bin', b'data')
+        for _ in range(2):
+            b''.join(self.api.get_file('file.bin', show_progress=False))
+
+        self.assertEqual(self.server.commands.count('EPRT'), 1)
+        self.assertEqual(self.server.commands.count('PORT'), 2)
+
+
+class RefusingModeZHandler(FtpHandler):
+    def ftp_MODE(self, arg):
+        self.reply(504, 'Bad MODE command.')
+
+
+class CompressedTransfersTest(TransfersTest):
+    """All transfers in MODE Z (listings are still in stream mode)
+    """
+    features = ('SIZE', 'REST STREAM', 'MODE Z')
+    compress_level = 9
+
+    def test_compressed_round_trip(self):
+        data = b'date,value\n' + b'2019-01-01,1\n' * 100000
+        self.remote_file('log.csv', data)
+
+        received = b''.join(self.api.get_file(
+            'log.csv', show_progress=False))
+        sent = self.api.upload_file('copy.csv', data, show_progress=False)
+
+        self.assertEqual(received, data)
+        self.assertEqual(sent, len(data))
+        with open(os.path.join(self.root.name, 'copy.csv'), 'rb') as file:
+            self.assertEqual(file.read(), data)
+        self.assertEqual(self.server.commands.count('MODE'), 1)
+        self.assertEqual(self.server.commands.count('OPTS'), 1)
+
+        self.api.list_files('.')
+        self.assertEqual(self.api.state.transfer_mode, 'S')
+
+
+class RefusedCompressionTransfersTest(CompressedTransfersTest):
+    handler = RefusingModeZHandler
+
+    def test_compressed_round_trip(self):
+        self.api.upload_file('file.bin', b'data', show_progress=False)
+        self.api.upload_file('file.bin', b'data', show_progress=False)
+
+        self.assertIsNone(self.api.compress_level)
+        self.assertEqual(self.server.commands.count('MODE'), 1)
+        with open(os.path.join(self.root.name, 'file.bin'), 'rb') as file:
+            self.assertEqual(file.read(), b'data')
+
+
+class ChecksumTransfersTest(TransfersTest):
+    features = ('SIZE', 'REST STREAM', 'HASH SHA-1*;SHA-256;MD5;CRC32')
+
+    def setUp(self):
+        super().setUp()
+        self.verify_patch = mock.patch.object(Client, 'verify', True)
+        self.verify_patch.start()
+
+    def tearDown(self):
+        self.verify_patch.stop()
+        super().tearDown()
+
+    def test_skip_identical(self):
+        data = os.urandom(1000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(data)
+
+        self.assertEqual(Client.receive_file(
+            self.api, 'file.bin', local_path, skip_identical=True), 0)
+        self.assertNotIn('RETR', self.server.commands)
+
+        with open(local_path, 'wb') as file:
+            file.write(data[::-1])
+        self.assertEqual(Client.receive_file(
+            self.api, 'file.bin', local_path, skip_identical=True), 1000)
+        with open(local_path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_verified_transfers(self):
+        data = os.urandom(3000)
+        self.remote_file('file.bin', data)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(data[:1000])
+
+        Client.receive_file(self.api, 'file.bin', local_path, resume=True)
+        Client.send_file(self.api, local_path, 'copy.bin')
+
+        self.assertEqual(self.server.commands.count('HASH'), 2)
+        # SHA-1 is already selected on the server
+        self.assertNotIn('OPTS', self.server.commands)
+        with open(os.path.join(self.root.name, 'copy.bin'), 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_checksum_mismatch(self):
+        file_digest = FtpHandler.file_digest
+        local_path = os.path.join(self.local.name, 'file.bin')
+        with open(local_path, 'wb') as file:
+            file.write(b'data')
+
+        with mock.patch.object(
+                FtpHandler, 'file_digest',
+                lambda *args: '0' * len(file_digest(*args))):
+            with self.assertRaises(ChecksumMismatch):
+                Client.send_file(self.api, local_path, 'file.bin')
+            # the same size, but different checksum
+            with self.assertRaises(ChecksumMismatch):
+                Client.receive_file(self.api, 'file.bin', local_path,
+                                    skip_identical=True)
+
+
+class CrcTransfersTest(ChecksumTransfersTest):
+    features = ('SIZE', 'REST STREAM', 'XCRC', 'XMD5')
+
+    def test_verified_transfers(self):
+        self.assertEqual(self.api.hash_algorithm(), 'MD5')
+        self.api._features.discard('XMD5')
+        self.assertEqual(self.api.hash_algorithm(), 'CRC32')
+        self.remote_file('file.bin', b'\x00' * 10)
+        local_path = os.path.join(self.local.name, 'file.bin')
+        Client.receive_file(self.api, 'file.bin', local_path)
+        self.assertIn('XCRC', self.server.commands)
@@ -0,0 +1,113 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ftp.client import Client
+from ftp.ftp_api import FtpApi
+from ftp.listing import Entry
+from ftp.pool import FtpSessionPool
+from ftp.talker import Talker
+from ftp.walk import Walker, aggregate_sizes
+from tests.local_server import LocalFtpServer
+
+
+class WalkerTest(unittest.TestCase):
+    """Parallel walk of the local FTP server tree
+    """
+    features = ('SIZE', 'MLST type*;size*;modify*;perm*;')
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.server = LocalFtpServer(self.root.name,
+                                     self.features).__enter__()
+        self.pool = FtpSessionPool(self.new_session, max_size=4)
+
+        for directory in ('tree', 'tree/a', 'tree/a/b', 'tree/c'):
+            os.mkdir(os.path.join(self.root.name, directory))
+            self.remote_file(directory + '/file.txt', b'x' * 10)
+        self.remote_file('tree/a/b/data_1.bin', b'x' * 100)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.__exit__()
+        self.root.cleanup()
+
+    def new_session(self):
+        api = FtpApi(Talker('127.0.0.1', self.server.port,
+                            verbose_input=False))
+        api.talker.passive_mode = True
+        api.login('anonymous', 'pass')
+        return api
+
+    def remote_file(self, name, data):
+        with open(os.path.join(self.root.name, name), 'wb') as file:
+            file.write(data)
+
+    def test_walk(self):
+        walker = Walker(self.pool, jobs=3)
+        paths = {path: entry.is_dir for path, entry in walker.walk('tree/')}
+        self.assertEqual(paths, {
+            'tree/a': True, 'tree/c': True, 'tree/file.txt': False,
+            'tree/a/b': True, 'tree/a/file.txt': False,
+            'tree/a/b/file.txt': False, 'tree/a/b/data_1.bin': False,
+            'tree/c/file.txt': False})
+        self.assertEqual(walker.directories, 4)
+        self.assertEqual(walker.failures, [])
+
+    def test_aggregate_sizes(self):
+        walker = Walker(self.pool, jobs=2, frontier=1)
+        totals = aggregate_sizes(walker.walk('tree'), 'tree')
+        self.assertEqual(totals, {'tree': [5, 140], 'tree/a': [3, 120],
+                                  'tree/a/b': [2, 110], 'tree/c': [1, 10]})
+
+    def test_walk_can_be_stopped(self):
+        for i in range(50):
+            os.mkdir(os.path.join(self.root.name, 'tree', 'd{}'.format(i)))
+        walker = Walker(self.pool, jobs=4)
+        entries = walker.walk('tree')
+        next(entries)
+        entries.close()
+        self.assertEqual(self.pool.size - self.pool.idle, 0)
+
+    def test_failures(self):
+        walker = Walker(self.pool, jobs=2)
+        self.assertEqual(list(walker.walk('missing')), [])
+        self.assertEqual([name for name, _ in walker.failures], ['missing'])
+
+    def test_du_and_find_commands(self):
+        output = io.StringIO()
+        with mock.patch.object(Client, 'pool', self.pool), \
+                contextlib.redirect_stdout(output):
+            Client.du_handler(['--depth', '1', '--jobs', '2', 'tree'])
+            Client.find_handler(['*.bin', 'tree'])
+        self.assertEqual(output.getvalue().splitlines(), [
+            '140\t5 files\ttree', '120\t3 files\ttree/a',
+            '10\t1 files\ttree/c', 'tree/a/b/data_1.bin'])
+
+    def test_du_and_find_in_working_directory(self):
+        api = self.new_session()
+        api.change_directory('tree/a')
+        pool = FtpSessionPool(self.new_session,
+                              prepare=Client.prepare_session)
+        output = io.StringIO()
+        with mock.patch.object(Client, 'ftp', api, create=True), \
+                mock.patch.object(Client, 'pool', pool), \
+                contextlib.redirect_stdout(output):
+            Client.du_handler([])
+            Client.find_handler(['*.bin'])
+        pool.close()
+        api.quit()
+        self.assertEqual(output.getvalue().splitlines(), [
+            '120\t3 files\t.', 'b/data_1.bin'])
+
+
+class AggregateSizesTest(unittest.TestCase):
+    def test_working_directory(self):
+        entries = [('a', Entry('a', 'dir', None, None, None)),
+                   ('a/x', Entry('x', 'file', 5, None, None)),
+                   ('y', Entry('y', 'file', None, None, None))]
+        self.assertEqual(aggregate_sizes(entries, '.'),
+                         {'': [2, 5], 'a': [1, 5]})